@@ -16,9 +16,94 @@ class Settings(BaseSettings):
     groq_api_key: str | None = Field(default=None, alias="GROQ_API_KEY")
     groq_model: str = Field(default="llama-3.1-8b-instant", alias="GROQ_MODEL")
 
+    # Upstream HTTP pool shared by all LLM providers
+    llm_pool_max_connections: int = Field(default=100, alias="LLM_POOL_MAX_CONNECTIONS")
+    llm_pool_max_keepalive: int = Field(default=20, alias="LLM_POOL_MAX_KEEPALIVE")
+    llm_keepalive_expiry: float = Field(default=60.0, alias="LLM_KEEPALIVE_EXPIRY")
+    llm_request_timeout: float = Field(default=60.0, alias="LLM_REQUEST_TIMEOUT")
+    openrouter_max_concurrency: int = Field(default=16, alias="OPENROUTER_MAX_CONCURRENCY")
+    groq_max_concurrency: int = Field(default=16, alias="GROQ_MAX_CONCURRENCY")
+
+    # Provider routing (latency-aware selection, hedging, circuit breaking)
+    llm_hedge_enabled: bool = Field(default=False, alias="LLM_HEDGE_ENABLED")
+    llm_hedge_min_delay_ms: float = Field(default=250.0, alias="LLM_HEDGE_MIN_DELAY_MS")
+    llm_hedge_max_delay_ms: float = Field(default=8000.0, alias="LLM_HEDGE_MAX_DELAY_MS")
+    llm_default_latency_ms: float = Field(default=2000.0, alias="LLM_DEFAULT_LATENCY_MS")
+    llm_latency_window: int = Field(default=100, alias="LLM_LATENCY_WINDOW")
+    llm_breaker_failure_threshold: int = Field(default=3, alias="LLM_BREAKER_FAILURE_THRESHOLD")
+    llm_breaker_cooldown_s: float = Field(default=30.0, alias="LLM_BREAKER_COOLDOWN_S")
+
     # Local models
     phi2_model_path: str | None = Field(default=None, alias="PHI2_MODEL_PATH")
     emotion_model: str = Field(default="distilbert-base-uncased-finetuned-sst-2-english", alias="EMOTION_MODEL")
+    emotion_batch_max_size: int = Field(default=16, alias="EMOTION_BATCH_MAX_SIZE")
+    emotion_batch_max_wait_ms: float = Field(default=10.0, alias="EMOTION_BATCH_MAX_WAIT_MS")
+    emotion_text_export: bool = Field(default=False, alias="EMOTION_TEXT_EXPORT")
+    emotion_aggregate_cache_users: int = Field(default=256, alias="EMOTION_AGGREGATE_CACHE_USERS")
+    similarity_model: str = Field(default="sentence-transformers/all-MiniLM-L6-v2", alias="SIMILARITY_MODEL")
+    tokenizer_path: str = Field(default=str(BASE_DIR.parent / "tokenizer.json"), alias="TOKENIZER_PATH")
+    token_cache_size: int = Field(default=20000, alias="TOKEN_CACHE_SIZE")
+
+    # Conversation context assembly
+    context_max_tokens: int = Field(default=3000, alias="CONTEXT_MAX_TOKENS")
+    context_summary_max_tokens: int = Field(default=400, alias="CONTEXT_SUMMARY_MAX_TOKENS")
+    context_cache_size: int = Field(default=500, alias="CONTEXT_CACHE_SIZE")
+    context_cache_ttl_s: float = Field(default=900.0, alias="CONTEXT_CACHE_TTL_S")
+
+    # Streaming output: defaults for clients that opt in to coalesced frames
+    stream_coalesce_window_ms: float = Field(default=40.0, alias="STREAM_COALESCE_WINDOW_MS")
+    stream_coalesce_max_bytes: int = Field(default=512, alias="STREAM_COALESCE_MAX_BYTES")
+
+    # Notes
+    topic_cache_size: int = Field(default=2000, alias="TOPIC_CACHE_SIZE")
+    import_concurrency: int = Field(default=4, alias="IMPORT_CONCURRENCY")
+    import_batch_size: int = Field(default=25, alias="IMPORT_BATCH_SIZE")
+    import_max_files: int = Field(default=1000, alias="IMPORT_MAX_FILES")
+    import_max_file_bytes: int = Field(default=2_000_000, alias="IMPORT_MAX_FILE_BYTES")
+    import_max_upload_bytes: int = Field(default=50_000_000, alias="IMPORT_MAX_UPLOAD_BYTES")  # per bulk upload (zip)
+    import_max_total_bytes: int = Field(default=100_000_000, alias="IMPORT_MAX_TOTAL_BYTES")  # all files of one import, unpacked
+    organize_section_concurrency: int = Field(default=4, alias="ORGANIZE_SECTION_CONCURRENCY")
+    # Duplicate notes: skip | merge | version | off; similarity is estimated Jaccard over word 3-grams
+    dedup_policy: str = Field(default="skip", alias="DEDUP_POLICY")
+    dedup_threshold: float = Field(default=0.8, alias="DEDUP_THRESHOLD")
+    dedup_conversation_policy: str = Field(default="merge", alias="DEDUP_CONVERSATION_POLICY")
+    dedup_conversation_threshold: float = Field(default=0.5, alias="DEDUP_CONVERSATION_THRESHOLD")
+    # Local keyphrase topics; confident results skip the LLM
+    organize_prefer_local: bool = Field(default=True, alias="ORGANIZE_PREFER_LOCAL")
+    keyphrase_min_corpus_docs: int = Field(default=20, alias="KEYPHRASE_MIN_CORPUS_DOCS")
+    keyphrase_max_users: int = Field(default=64, alias="KEYPHRASE_MAX_USERS")
+    keyphrase_cache_size: int = Field(default=5000, alias="KEYPHRASE_CACHE_SIZE")
+
+    # WebSocket chat sessions
+    ws_max_inflight_turns: int = Field(default=4, alias="WS_MAX_INFLIGHT_TURNS")
+    ws_auth_timeout_s: float = Field(default=10.0, alias="WS_AUTH_TIMEOUT_S")
+
+    # Chat persistence: one transaction per turn, optionally write-behind
+    chat_write_behind: bool = Field(default=False, alias="CHAT_WRITE_BEHIND")
+    write_behind_max_queue: int = Field(default=1000, alias="WRITE_BEHIND_MAX_QUEUE")
+    write_behind_batch_size: int = Field(default=100, alias="WRITE_BEHIND_BATCH_SIZE")
+    write_behind_flush_ms: float = Field(default=50.0, alias="WRITE_BEHIND_FLUSH_MS")
+
+    # Background jobs (automatic conversation notes)
+    job_workers: int = Field(default=2, alias="JOB_WORKERS")
+    job_checkpoint_s: float = Field(default=5.0, alias="JOB_CHECKPOINT_S")
+    note_jobs_every_turns: int = Field(default=6, alias="NOTE_JOBS_EVERY_TURNS")
+    note_jobs_idle_s: float = Field(default=120.0, alias="NOTE_JOBS_IDLE_S")
+
+    # Semantic index over notes and messages (memory-mapped vectors on disk)
+    vector_index_enabled: bool = Field(default=True, alias="VECTOR_INDEX_ENABLED")
+    vector_index_dir: str = Field(default=str(BASE_DIR / "vector_index"), alias="VECTOR_INDEX_DIR")
+    vector_index_dtype: str = Field(default="float32", alias="VECTOR_INDEX_DTYPE")  # float32 | int8
+    vector_embed_batch_size: int = Field(default=64, alias="VECTOR_EMBED_BATCH_SIZE")
+    vector_sync_interval_s: float = Field(default=30.0, alias="VECTOR_SYNC_INTERVAL_S")
+    vector_coarse_min_rows: int = Field(default=20000, alias="VECTOR_COARSE_MIN_ROWS")
+    vector_coarse_nprobe: int = Field(default=8, alias="VECTOR_COARSE_NPROBE")
+    # Chat response cache (exact + semantic tiers)
+    response_cache_enabled: bool = Field(default=True, alias="RESPONSE_CACHE_ENABLED")
+    response_cache_max_entries: int = Field(default=2000, alias="RESPONSE_CACHE_MAX_ENTRIES")
+    response_cache_ttl_s: float = Field(default=3600.0, alias="RESPONSE_CACHE_TTL_S")
+    response_cache_semantic: bool = Field(default=True, alias="RESPONSE_CACHE_SEMANTIC")
+    response_cache_similarity: float = Field(default=0.92, alias="RESPONSE_CACHE_SIMILARITY")
 
     # App
     allowed_origins: str = Field(default="http://localhost:5173,http://localhost:4173,https://classy-begonia-426c14.netlify.app", alias="ALLOWED_ORIGINS")
@@ -39,6 +124,8 @@ class Settings(BaseSettings):
     SECRET_KEY: str = Field(default="change-this-in-production")
     ALGORITHM: str = Field(default="HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = Field(default=30)
+    # Comma-separated emails allowed to use cross-user endpoints (usage reports, rebuilds)
+    admin_emails: str = Field(default="", alias="ADMIN_EMAILS")
 
     # Rate limiting / logging
     RATE_LIMIT_PER_MINUTE: int = Field(default=100)
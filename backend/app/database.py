@@ -9,7 +9,20 @@ engine = create_engine(
 SessionLocal = sessionmaker(autoflush=False, autocommit=False, bind=engine)
 Base = declarative_base()
 
+
+def ensure_column(table: str, column: str, ddl: str, bind=None) -> bool:
+    """Add `column` to an existing table if it is missing (create_all never alters tables).
+    Runs against `bind` (default: the app engine). Returns True when the column was added."""
+    from sqlalchemy import inspect, text
+    bind = bind or engine
+    insp = inspect(bind)
+    if not insp.has_table(table) or column in {c["name"] for c in insp.get_columns(table)}:
+        return False
+    with bind.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    return True
+
 # CLI: create tables
 if __name__ == "__main__":
-    from app.models import user as _user, note as _note, conversation as _conv, message as _msg  # ensure models are imported
+    from app.models import user as _user, note as _note, conversation as _conv, message as _msg, job as _job, usage as _usage, organize as _organize, keyphrase as _keyphrase, dedup as _dedup, emotion as _emotion  # ensure models are imported
     Base.metadata.create_all(bind=engine)
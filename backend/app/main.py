@@ -43,8 +43,10 @@ except Exception as e:
 
 try:
     from app.database import Base, engine  # type: ignore
-    from app.models import user as _user, note as _note, conversation as _conv, message as _msg  # ensure models imported
+    from app.models import user as _user, note as _note, conversation as _conv, message as _msg, job as _job, usage as _usage, organize as _organize, keyphrase as _keyphrase, dedup as _dedup, emotion as _emotion  # ensure models imported
     Base.metadata.create_all(bind=engine)
+    from app.services.search_index import ensure_search_schema
+    ensure_search_schema(engine)
 except Exception as e:
     print(f"[startup] DB init failed: {e}")
 
@@ -83,6 +85,10 @@ _include_router("app.routers.notes")
 _include_router("app.routers.conversations")
 _include_router("app.routers.emotion")
 _include_router("app.routers.voice")
+_include_router("app.routers.jobs")
+_include_router("app.routers.usage")
+_include_router("app.routers.ws")
+_include_router("app.routers.search")
 
 # Initialize LLM services on startup
 @app.on_event("startup")
@@ -111,6 +117,52 @@ async def startup_event():
         log.warning(f"Groq init skipped: {e}")
         app.state.groq = None
     
+    from app.services.provider_router import ProviderRouter
+    llm_router = ProviderRouter()
+    for name in ("openrouter", "groq"):
+        svc = getattr(app.state, name, None)
+        if svc is not None:
+            llm_router.register(name, svc)
+    app.state.llm_router = llm_router if llm_router.providers else None
+
+    from app.config import settings
+    from app.services.response_cache import ResponseCache
+    app.state.response_cache = ResponseCache() if settings.response_cache_enabled else None
+
+    from app.services.chat_persistence import get_chat_store
+    await get_chat_store().start()
+
+    from app.services.job_queue import get_job_queue
+    from app.services.conversation_notes import JOB_KIND as NOTES_JOB, generate_conversation_notes
+    jobs = get_job_queue()
+    jobs.register(
+        NOTES_JOB,
+        lambda payload: generate_conversation_notes(app.state.llm_router, payload["conversation_id"]),
+        every=settings.note_jobs_every_turns,
+        idle_s=settings.note_jobs_idle_s,
+    )
+    jobs.capacity_check = lambda: app.state.llm_router is None or app.state.llm_router.has_spare_capacity()
+    await jobs.start()
+
+    # Notes saved before duplicate detection existed need signatures to be found
+    import asyncio
+    from app.services.dedup import backfill_signatures
+    app.state.dedup_backfill = asyncio.create_task(asyncio.to_thread(backfill_signatures))
+
+    # Emotion entries stored before the daily counters and search index existed
+    from app.services.emotion_store import get_emotion_store
+    app.state.emotion_backfill = asyncio.create_task(asyncio.to_thread(get_emotion_store().backfill))
+
+    if settings.vector_index_enabled:
+        from app.services.vector_index import get_semantic_index
+        get_semantic_index().start()
+
+    # Pre-open pooled keep-alive connections so the first chat skips TCP/TLS setup
+    providers = [svc for svc in (app.state.openrouter, app.state.groq) if svc is not None]
+    if providers:
+        warmed = await asyncio.gather(*(svc.warm_up() for svc in providers), return_exceptions=True)
+        log.info(f"LLM connection warm-up: {sum(1 for w in warmed if w is True)}/{len(providers)} ready")
+
     try:
         from app.services.phi2_service import Phi2Service
         app.state.phi2 = Phi2Service()
@@ -119,6 +171,37 @@ async def startup_event():
         log.warning(f"Phi2 init skipped: {e}")
         app.state.phi2 = None
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    phi2 = getattr(app.state, "phi2", None)
+    if phi2 is not None:
+        await phi2.close()
+    try:
+        from app.services.bulk_import import get_bulk_importer
+        await get_bulk_importer().shutdown()
+    except Exception as e:
+        print(f"[shutdown] Bulk import cancel failed: {e}")
+    try:
+        from app.services.vector_index import get_semantic_index
+        await get_semantic_index().stop()
+    except Exception as e:
+        print(f"[shutdown] Semantic index stop failed: {e}")
+    try:
+        from app.services.job_queue import get_job_queue
+        await get_job_queue().stop()
+    except Exception as e:
+        print(f"[shutdown] Job queue stop failed: {e}")
+    try:
+        from app.services.chat_persistence import get_chat_store
+        await get_chat_store().stop()
+    except Exception as e:
+        print(f"[shutdown] Chat write-behind drain failed: {e}")
+    try:
+        from app.services.http_client import close_http_client
+        await close_http_client()
+    except Exception as e:
+        print(f"[shutdown] HTTP pool close failed: {e}")
+
 # Fallback minimal endpoints if routers are unavailable (avoid 404s)
 from fastapi import Body
 from typing import Any, Dict
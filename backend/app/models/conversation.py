@@ -10,3 +10,13 @@ class Conversation(Base):
     role = Column(String)  # 'user' or 'assistant'
     content = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ConversationSummary(Base):
+    """Rolling summary of the turns that no longer fit in the prompt budget."""
+    __tablename__ = "conversation_summaries"
+    conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"), primary_key=True)
+    summary = Column(Text, nullable=False, default="")
+    upto_message_id = Column(Integer, nullable=False, default=0)  # last message folded into the summary
+    tokens = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, BigInteger, String, LargeBinary, DateTime, ForeignKey, Index
+from datetime import datetime
+from app.database import Base
+
+class NoteSignature(Base):
+    """Content fingerprints of a note, used to find exact and near duplicates."""
+    __tablename__ = "note_signatures"
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, nullable=False, default=0)  # 0 for notes without an owner
+    content_hash = Column(String(64), nullable=False)  # sha256 of the normalised text
+    minhash = Column(LargeBinary, nullable=False)  # NUM_PERM little-endian uint32 values
+    version_of = Column(Integer, nullable=True, index=True)  # first note of a version chain
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (Index("ix_note_signatures_user_hash", "user_id", "content_hash"),)
+
+class NoteBucket(Base):
+    """One LSH band of a note's MinHash; notes sharing a bucket are duplicate candidates."""
+    __tablename__ = "note_lsh_buckets"
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True)
+    band = Column(Integer, primary_key=True)
+    bucket = Column(BigInteger, nullable=False, index=True)
@@ -0,0 +1,53 @@
+from sqlalchemy import Column, Integer, Float, String, Text, Date, DateTime, ForeignKey, Index, LargeBinary
+from app.database import Base
+
+class EmotionEntry(Base):
+    """One organized message; rows are only ever appended."""
+    __tablename__ = "emotion_entries"
+    id = Column(Integer, primary_key=True)
+    user_key = Column(String, nullable=False)  # EmotionOrganizer user ids are free-form strings
+    emotion = Column(String, nullable=False)
+    confidence = Column(String, nullable=True)  # as reported by the analyzer, e.g. "85"
+    intensity = Column(String, nullable=True)
+    intent = Column(String, nullable=True)
+    message = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    day = Column(Date, nullable=False)
+
+    __table_args__ = (
+        Index("ix_emotion_entries_user_day", "user_key", "day"),
+        Index("ix_emotion_entries_user_emotion_day", "user_key", "emotion", "day"),
+    )
+
+class EmotionEntryCategory(Base):
+    """Category an entry was filed under (the folders of the old text layout)."""
+    __tablename__ = "emotion_entry_categories"
+    entry_id = Column(Integer, ForeignKey("emotion_entries.id", ondelete="CASCADE"), primary_key=True)
+    category = Column(String, primary_key=True)  # e.g. "Feelings/Positive", "Ideas"
+    user_key = Column(String, nullable=False)
+    day = Column(Date, nullable=False)
+
+    __table_args__ = (Index("ix_emotion_entry_categories_user_cat_day", "user_key", "category", "day"),)
+
+class EmotionDaily(Base):
+    """Per-user, per-day counters for one emotion, kept in step with emotion_entries."""
+    __tablename__ = "emotion_daily"
+    user_key = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    emotion = Column(String, primary_key=True)
+    feeling = Column(String, nullable=True)  # Feelings sub-category the entries were filed under, e.g. "Positive"
+    entries = Column(Integer, nullable=False, default=0)
+    intensity_sum = Column(Integer, nullable=False, default=0)  # low=1, medium=2, high=3
+    intensity_n = Column(Integer, nullable=False, default=0)
+    confidence_sum = Column(Float, nullable=False, default=0.0)
+    confidence_n = Column(Integer, nullable=False, default=0)
+
+class EmotionPosting(Base):
+    """Inverted index: where a token occurs in one entry, keyed by user first."""
+    __tablename__ = "emotion_postings"
+    user_key = Column(String, primary_key=True)
+    token = Column(String, primary_key=True)
+    entry_id = Column(Integer, primary_key=True)
+    offsets = Column(LargeBinary, nullable=False)  # varint deltas of character offsets into the entry
+
+    __table_args__ = ({"sqlite_with_rowid": False},)
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Float
+from datetime import datetime
+from app.database import Base
+
+class PendingJob(Base):
+    """Debounced background work not yet run; restored into the job queue on startup."""
+    __tablename__ = "pending_jobs"
+    key = Column(String, primary_key=True)  # one pending job per key, e.g. 'conversation_notes:42'
+    kind = Column(String, nullable=False, index=True)
+    payload = Column(JSON, nullable=False, default=dict)
+    turns = Column(Integer, default=0)
+    due_at = Column(Float, nullable=False)  # wall-clock epoch seconds
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
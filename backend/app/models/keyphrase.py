@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from datetime import datetime
+from app.database import Base
+
+class TermStat(Base):
+    """Number of a user's notes containing a term, updated as notes are saved."""
+    __tablename__ = "term_stats"
+    user_id = Column(Integer, primary_key=True)  # 0 for notes without an owner
+    term = Column(String, primary_key=True)
+    df = Column(Integer, default=0)
+
+class CorpusStat(Base):
+    """Size of a user's note corpus for the document frequencies in term_stats."""
+    __tablename__ = "corpus_stats"
+    user_id = Column(Integer, primary_key=True)
+    documents = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
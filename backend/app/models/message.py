@@ -8,6 +8,6 @@ class Message(Base):
     conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"), index=True)
     role = Column(String, nullable=False)  # 'system' | 'user' | 'assistant'
     content = Column(Text, nullable=False)
-    tokens_in = Column(Integer, default=0)
-    tokens_out = Column(Integer, default=0)
+    tokens_in = Column(Integer, default=0)  # user: own tokens; assistant: prompt tokens sent for this reply
+    tokens_out = Column(Integer, default=0)  # assistant: reply tokens
     created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
@@ -15,6 +15,7 @@ class Note(Base):
     id = Column(Integer, primary_key=True)
     path = Column(String, nullable=True, index=True)
     content = Column(Text, nullable=False)
+    user_id = Column(Integer, nullable=True, index=True)  # NULL for notes created before ownership was tracked
     created_at = Column(DateTime, default=datetime.utcnow)
 
     topics = relationship("Topic", secondary=note_topic, back_populates="notes")
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, DateTime, JSON
+from datetime import datetime
+from app.database import Base
+
+class OrganizeCache(Base):
+    """Structured organize results keyed by a hash of the note text (and prompt version)."""
+    __tablename__ = "organize_cache"
+    content_hash = Column(String(64), primary_key=True)
+    headings = Column(JSON, nullable=False, default=list)
+    topics = Column(JSON, nullable=False, default=list)
+    categories = Column(JSON, nullable=False, default=list)
+    model = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, Date, DateTime
+from datetime import datetime
+from app.database import Base
+
+class UsageDaily(Base):
+    """Token usage per user, UTC day and model, updated incrementally as turns are saved."""
+    __tablename__ = "usage_daily"
+    user_id = Column(Integer, primary_key=True)  # 0 for anonymous requests
+    day = Column(Date, primary_key=True, index=True)
+    model = Column(String, primary_key=True)
+    requests = Column(Integer, default=0)
+    cached_requests = Column(Integer, default=0)  # served from the response cache, no tokens billed
+    tokens_in = Column(Integer, default=0)  # prompt tokens sent to the model
+    tokens_out = Column(Integer, default=0)  # completion tokens received
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,13 +1,25 @@
-from fastapi import APIRouter, Request, Depends, HTTPException
+from contextlib import aclosing
+import anyio
+from fastapi import APIRouter, Request, Response, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-import json
+import logging
 from app.schemas.chat import ChatRequest, ChatResponse, ReliefChatRequest
 from app.database import SessionLocal
-from app.models.conversation import Conversation
-from app.models.message import Message
+from app.services.chat_persistence import get_chat_store
+from app.services.chat_pipeline import (
+    ChatPipeline, ChatTurn, ContextStage, CrisisStage, EmotionStage, LLMStage, NotifyStage, Parallel, PersistStage, Stage,
+)
+from app.services.context_builder import get_context_builder
+from app.services.response_cache import SHARED_SCOPE
+from app.services.conversation_notes import JOB_KIND as NOTES_JOB
+from app.services.stream_framing import FrameEncoder, StreamOptions, coalesce
+from app.services.streaming import StreamStats, iter_tokens
+from app.services.tokens import get_token_counter
+from app.services.usage import TurnUsage
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
+logger = logging.getLogger(__name__)
 
 def get_db():
     db = SessionLocal()
@@ -28,226 +40,140 @@ async def optional_get_current_user(request: Request, db: Session = Depends(get_
         # Return None if authentication fails
         return None
 
+def _cache_scope(user: Optional[User], conversation_id: Optional[str], relief: bool = False) -> Optional[str]:
+    """Cache scope of a turn; None means the turn must not use the cache.
+    Only fresh, authenticated small talk shares replies across users (exact
+    matches only, see response_cache). Relief turns are never shared."""
+    if not conversation_id and not relief:
+        return SHARED_SCOPE if user is not None else None
+    if user is not None:
+        return f"user:{user.id}"
+    return f"conversation:{conversation_id}" if conversation_id else None
+
+
+def _conversation_id(value: Optional[str]) -> Optional[int]:
+    return int(value) if value and str(value).isdigit() else None
+
+
+class ReliefEnrichStage(Stage):
+    """Append a gentle reflection of the detected emotion and, when needed, crisis resources."""
+
+    name = "enrich"
+
+    async def run(self, turn: ChatTurn) -> None:
+        emotion = turn.emotion
+        if emotion and isinstance(emotion, dict) and emotion.get('label'):
+            turn.response += f"\n\nIt sounds like you might be feeling {emotion.get('label').lower()}. I'm here to listen."
+        # Crisis resources text (non-exhaustive, US-focused)
+        if turn.crisis:
+            turn.response += (
+                "\n\nI’m concerned for your safety. If you’re in immediate danger or thinking about harming yourself, please seek immediate help. "
+                "In the U.S., you can call or text 988 (Suicide & Crisis Lifeline) or use 911 for emergencies. "
+                "If outside the U.S., please check local emergency numbers or visit findahelpline.com."
+            )
+
+
+BUDDY_PROMPT = "You are Buddy, a warm and helpful AI assistant."
+RELIEF_PROMPT = (
+    "You are a compassionate, non-judgmental listener.\n"
+    "Goals: actively listen, reflect feelings, validate emotions, avoid rushing to solutions.\n"
+    "Use gentle, human language and phrases like 'It sounds like you're feeling...'.\n"
+    "Offer coping suggestions only after validating, and keep them optional.\n"
+    "If you detect extreme distress or self-harm risk, encourage seeking immediate help and provide crisis resources."
+)
+
+# Emotion detection only needs the user's message, so it overlaps the LLM call.
+# The turn is persisted in one go after the reply (even when llm is unavailable).
+CHAT_PIPELINE = ChatPipeline([
+    ContextStage(),
+    Parallel(
+        LLMStage(error_text="I'm experiencing technical difficulties. Error: {error}"),
+        EmotionStage(),
+        name="generate",
+    ),
+    PersistStage(),
+    # Automatic note generation is debounced per conversation and runs in the background
+    NotifyStage(NOTES_JOB),
+], name="chat")
+
+RELIEF_PIPELINE = ChatPipeline([
+    ContextStage(),
+    Parallel(
+        # Groq is the historical default here; the router only overrides it when it has evidence
+        LLMStage(
+            prefer="groq",
+            params={"temperature": 0.8, "max_tokens": 300},
+            empty_text="I'm here with you. I wasn't able to generate a response right now. Could we try again?",
+        ),
+        EmotionStage(),
+        CrisisStage(),
+        name="generate",
+    ),
+    PersistStage(),
+    ReliefEnrichStage(),
+], name="relief")
+
+
+def _respond(turn: ChatTurn, response: Response, conversation_id: str) -> ChatResponse:
+    response.headers["Server-Timing"] = turn.server_timing()
+    return ChatResponse(
+        response=turn.response,
+        emotion=turn.emotion,
+        conversation_id=conversation_id,
+        model=turn.model,
+        timings=turn.timings,
+    )
+
 # Endpoints with authentication
 @router.post("/", response_model=ChatResponse)
-async def chat(payload: ChatRequest, req: Request, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    llm = getattr(req.app.state, 'openrouter', None) or getattr(req.app.state, 'groq', None)
-    phi2 = getattr(req.app.state, 'phi2', None)
-
-    messages = [
-        {"role": "system", "content": "You are Buddy, a warm and helpful AI assistant."},
-        {"role": "user", "content": payload.message}
-    ]
-
-    # Persist conversation/messages (even when llm is unavailable)
-    conv_id = None
-    if payload.conversation_id and str(payload.conversation_id).isdigit():
-        conv_id = int(payload.conversation_id)
-    else:
-        conv = Conversation(user_id=None)
-        db.add(conv)
-        db.commit()
-        db.refresh(conv)
-        conv_id = conv.id
-
-    db.add(Message(conversation_id=conv_id, role='user', content=payload.message))
-    db.commit()
-
-    # Generate response with best-effort fallbacks
-    import logging
-    logger = logging.getLogger(__name__)
-    response_text = ""
-    try:
-        if llm and getattr(llm, 'chat_completion', None):
-            logger.info(f"Calling LLM: {llm.__class__.__name__}")
-            response_text = await llm.chat_completion(messages)
-            if not response_text:
-                logger.warning("LLM returned empty response")
-                response_text = "I received your message but couldn't generate a response. Please try again."
-        else:
-            logger.warning("No LLM service available (llm is None or has no chat_completion method)")
-            response_text = "Sorry, the AI service is not currently available. Please try again later."
-    except Exception as e:
-        # Log the actual error
-        logger.error(f"LLM call failed: {str(e)}", exc_info=True)
-        # Return a user-friendly message instead of just echoing
-        response_text = f"I'm experiencing technical difficulties. Error: {str(e)[:100]}"
-
-    emotion = None
-    try:
-        if phi2 and payload.detect_emotion:
-            emotion = phi2.detect_emotion(payload.message)
-    except Exception:
-        emotion = None
-
-    db.add(Message(conversation_id=conv_id, role='assistant', content=response_text))
-    db.commit()
-
-    # Automatic Note Generation (Family Tree / Key Info)
-    # We'll use a background task or just fire-and-forget logic if possible, 
-    # but for simplicity and reliability in this setup, we'll do it inline or via a helper.
-    # To avoid blocking the response too long, we should ideally use BackgroundTasks.
-    # But since I can't easily change the signature to add BackgroundTasks without potentially breaking other things (though I can),
-    # I'll just do a quick check.
-    
-    try:
-        # Only analyze if we have a valid conversation ID and response
-        if conv_id and response_text and llm:
-            # We need to get the conversation history to analyze context
-            # But to save tokens, maybe just analyze the last few turns or the whole thing if short.
-            # Let's define a helper function to do this asynchronously if possible, but here we are in an async function.
-            
-            # We'll trigger a "fire and forget" task effectively by not awaiting it? 
-            # No, in asyncio we should create a task.
-            import asyncio
-            async def analyze_and_save_notes():
-                try:
-                    # Re-acquire db session in new task if needed, or use a fresh one.
-                    # Since we are in the same process, we can use a new session.
-                    from app.database import SessionLocal
-                    from app.models.note import Note, Topic
-                    
-                    db_note = SessionLocal()
-                    try:
-                        # Fetch recent messages
-                        msgs = db_note.query(Message).filter(Message.conversation_id == conv_id).order_by(Message.created_at.desc()).limit(10).all()
-                        msgs.reverse()
-                        history_text = "\n".join([f"{m.role}: {m.content}" for m in msgs])
-                        
-                        prompt = [
-                            {"role": "system", "content": "You are a helpful assistant that extracts key information from conversations to build a 'Family Tree' and structured notes. Extract names, relationships, key facts, and important context. Return the result as a concise summary formatted as a Markdown note with headings like # Family Tree, # Key Facts, # Context."},
-                            {"role": "user", "content": f"Analyze this conversation and extract key notes:\n\n{history_text}"}
-                        ]
-                        
-                        note_content = await llm.chat_completion(prompt)
-                        
-                        if note_content:
-                            # Check if a note for this conversation already exists
-                            # We can use a naming convention or a specific tag.
-                            # Let's just create a new note or append to a daily one.
-                            # For "Family Tree", maybe we want a single persistent note?
-                            # Let's create a note titled "Conversation Notes - {Date}"
-                            from datetime import datetime
-                            title = f"Conversation Notes - {datetime.now().strftime('%Y-%m-%d %H:%M')}"
-                            
-                            # Create the note
-                            note = Note(path=title, content=note_content)
-                            
-                            # Extract topics (simple heuristic or use LLM again)
-                            # Let's just add a "Family Tree" topic
-                            topic = db_note.query(Topic).filter(Topic.name == "Family Tree").first()
-                            if not topic:
-                                topic = Topic(name="Family Tree")
-                                db_note.add(topic)
-                            
-                            note.topics = [topic]
-                            db_note.add(note)
-                            db_note.commit()
-                    finally:
-                        db_note.close()
-                except Exception as e:
-                    print(f"Error in automatic note generation: {e}")
-
-            # Schedule the task
-            asyncio.create_task(analyze_and_save_notes())
-
-    except Exception as e:
-        logger.error(f"Failed to trigger note generation: {e}")
-
-    model_name = getattr(llm, 'model', 'unavailable') if llm else 'unavailable'
-    return ChatResponse(
-        response=response_text,
-        emotion=emotion,
-        conversation_id=str(conv_id),
-        model=model_name
+async def chat(payload: ChatRequest, req: Request, response: Response, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    scope = _cache_scope(user, payload.conversation_id)
+    turn = ChatTurn(
+        message=payload.message,
+        system_prompt=BUDDY_PROMPT,
+        db=db,
+        llm=getattr(req.app.state, 'llm_router', None),
+        phi2=getattr(req.app.state, 'phi2', None),
+        cache=getattr(req.app.state, 'response_cache', None) if (payload.use_cache and scope) else None,
+        cache_scope=scope or SHARED_SCOPE,
+        conversation_id=_conversation_id(payload.conversation_id),
+        user_id=user.id,
+        detect_emotion=payload.detect_emotion,
     )
+    await CHAT_PIPELINE.run(turn)
+    return _respond(turn, response, str(turn.conversation_id))
 
 @router.post("/relief", response_model=ChatResponse)
-async def chat_relief(payload: ReliefChatRequest, req: Request, db: Session = Depends(get_db), user: Optional[User] = Depends(optional_get_current_user)):
+async def chat_relief(payload: ReliefChatRequest, req: Request, response: Response, db: Session = Depends(get_db), user: Optional[User] = Depends(optional_get_current_user)):
     # Allow relief chat even without authentication for demo mode
     # Production should enforce authentication
-    llm = getattr(req.app.state, 'groq', None) or getattr(req.app.state, 'openrouter', None)
-    phi2 = getattr(req.app.state, 'phi2', None)
+    llm = getattr(req.app.state, 'llm_router', None)
     if not llm:
         raise HTTPException(status_code=503, detail="LLM provider not configured")
 
-    system_prompt = (
-        "You are a compassionate, non-judgmental listener.\n"
-        "Goals: actively listen, reflect feelings, validate emotions, avoid rushing to solutions.\n"
-        "Use gentle, human language and phrases like 'It sounds like you're feeling...'.\n"
-        "Offer coping suggestions only after validating, and keep them optional.\n"
-        "If you detect extreme distress or self-harm risk, encourage seeking immediate help and provide crisis resources."
+    # Conversation persistence controlled by save_memory; private
+    # (save_memory=False) sessions never enter the cache
+    scope = _cache_scope(user, payload.conversation_id, relief=True)
+    turn = ChatTurn(
+        message=payload.message,
+        system_prompt=RELIEF_PROMPT,
+        db=db,
+        llm=llm,
+        phi2=getattr(req.app.state, 'phi2', None),
+        cache=getattr(req.app.state, 'response_cache', None) if (payload.use_cache and payload.save_memory and scope) else None,
+        cache_scope=scope or SHARED_SCOPE,
+        conversation_id=_conversation_id(payload.conversation_id) if payload.save_memory else None,
+        user_id=user.id if user else None,
+        detect_emotion=payload.detect_emotion,
+        persist=payload.save_memory,
     )
-
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": payload.message}
-    ]
-
-    # Conversation persistence controlled by save_memory
-    conv_id: int | None = None
-    if payload.save_memory:
-        if payload.conversation_id and str(payload.conversation_id).isdigit():
-            conv_id = int(payload.conversation_id)
-        else:
-            conv = Conversation(user_id=None)
-            db.add(conv)
-            db.commit()
-            db.refresh(conv)
-            conv_id = conv.id
-        db.add(Message(conversation_id=conv_id, role='user', content=payload.message))
-        db.commit()
-
-    import logging
-    logger = logging.getLogger(__name__)
     try:
-        response_text = await llm.chat_completion(messages, temperature=0.8, max_tokens=300)
-        if not response_text:
-            response_text = "I'm here with you. I wasn't able to generate a response right now. Could we try again?"
+        await RELIEF_PIPELINE.run(turn)
     except Exception as e:
-        logger.error(f"Relief LLM error: {e}")
+        logger.error(f"Relief pipeline error: {e}")
         raise HTTPException(status_code=500, detail="LLM error")
-
-    # Gentle emotion analysis
-    emotion = None
-    try:
-        if phi2 and payload.detect_emotion:
-            emotion = phi2.detect_emotion(payload.message)
-    except Exception:
-        emotion = None
-
-    # Simple crisis detection (non-diagnostic)
-    crisis = False
-    text_low = payload.message.lower()
-    crisis_keywords = ["suicide", "kill myself", "end it", "can't go on", "harm myself", "overdose"]
-    for kw in crisis_keywords:
-        if kw in text_low:
-            crisis = True
-            break
-
-    if payload.save_memory and conv_id is not None:
-        db.add(Message(conversation_id=conv_id, role='assistant', content=response_text))
-        db.commit()
-
-    # Append gentle reflection with emotion if present
-    if emotion and isinstance(emotion, dict) and emotion.get('label'):
-        response_text += f"\n\nIt sounds like you might be feeling {emotion.get('label').lower()}. I'm here to listen."
-
-    # Crisis resources text (non-exhaustive, US-focused)
-    if crisis:
-        response_text += (
-            "\n\nI’m concerned for your safety. If you’re in immediate danger or thinking about harming yourself, please seek immediate help. "
-            "In the U.S., you can call or text 988 (Suicide & Crisis Lifeline) or use 911 for emergencies. "
-            "If outside the U.S., please check local emergency numbers or visit findahelpline.com."
-        )
-
-    model_name = getattr(llm, 'model', 'unavailable')
-    return ChatResponse(
-        response=response_text,
-        emotion=emotion,
-        conversation_id=str(conv_id) if conv_id is not None else "private",
-        model=model_name,
-    )
+    conversation_id = str(turn.conversation_id) if turn.conversation_id is not None else "private"
+    return _respond(turn, response, conversation_id)
 
 # Optional dev-mode endpoints (no auth) for quick diagnostics – toggle via env BUDDY_DEV_MODE=true
 import os
@@ -258,75 +184,105 @@ def require_dev_mode():
         raise HTTPException(status_code=404, detail="Not found (enable with BUDDY_DEV_MODE=true)")
 
 if DEV_MODE:
+    # No history and no summary folding, just a single exchange that is still persisted
+    DEV_PIPELINE = ChatPipeline([
+        ContextStage(history=False),
+        Parallel(LLMStage(error_text="I'm experiencing technical difficulties. Error: {error}"), EmotionStage(), name="generate"),
+        PersistStage(),
+    ], name="dev_chat")
+
     @router.post("/dev/chat")
-    async def dev_chat(payload: ChatRequest, req: Request, db: Session = Depends(get_db)):
-        llm = getattr(req.app.state, 'openrouter', None) or getattr(req.app.state, 'groq', None)
-        phi2 = getattr(req.app.state, 'phi2', None)
-        messages = [
-            {"role": "system", "content": "You are Buddy, a warm and helpful AI assistant."},
-            {"role": "user", "content": payload.message}
-        ]
-        # Persist conversation/messages (even when llm is unavailable)
-        conv_id = None
-        if payload.conversation_id and str(payload.conversation_id).isdigit():
-            conv_id = int(payload.conversation_id)
-        else:
-            conv = Conversation(user_id=None)
-            db.add(conv)
-            db.commit()
-            db.refresh(conv)
-            conv_id = conv.id
-        db.add(Message(conversation_id=conv_id, role='user', content=payload.message))
-        db.commit()
-        import logging
-        logger = logging.getLogger(__name__)
-        response_text = ""
-        try:
-            if llm and getattr(llm, 'chat_completion', None):
-                logger.info(f"Calling LLM: {llm.__class__.__name__}")
-                response_text = await llm.chat_completion(messages)
-                if not response_text:
-                    response_text = "I received your message but couldn't generate a response. Please try again."
-            else:
-                response_text = "Sorry, the AI service is not currently available. Please try again later."
-        except Exception as e:
-            logger.error(f"LLM error: {e}")
-            response_text = f"I'm experiencing technical difficulties. Error: {str(e)[:100]}"
-        emotion = None
-        try:
-            if phi2 and payload.detect_emotion:
-                emotion = phi2.detect_emotion(payload.message)
-        except Exception:
-            emotion = None
-        db.add(Message(conversation_id=conv_id, role='assistant', content=response_text))
-        db.commit()
-        model_name = getattr(llm, 'model', 'unavailable') if llm else 'unavailable'
-        return ChatResponse(
-            response=response_text,
-            emotion=emotion,
-            conversation_id=str(conv_id),
-            model=model_name,
+    async def dev_chat(payload: ChatRequest, req: Request, response: Response, db: Session = Depends(get_db)):
+        turn = ChatTurn(
+            message=payload.message,
+            system_prompt=BUDDY_PROMPT,
+            db=db,
+            llm=getattr(req.app.state, 'llm_router', None),
+            phi2=getattr(req.app.state, 'phi2', None),
+            conversation_id=_conversation_id(payload.conversation_id),
+            detect_emotion=payload.detect_emotion,
         )
+        await DEV_PIPELINE.run(turn)
+        return _respond(turn, response, str(turn.conversation_id))
+
+@router.get("/providers")
+async def provider_stats(req: Request):
+    llm = getattr(req.app.state, 'llm_router', None)
+    return llm.stats() if llm else {"hedge": False, "providers": {}}
+
+
+@router.get("/persistence/stats")
+async def persistence_stats():
+    return get_chat_store().stats()
+
+
+@router.get("/cache/stats")
+async def cache_stats(req: Request):
+    cache = getattr(req.app.state, 'response_cache', None)
+    return cache.stats() if cache else {"enabled": False}
+
 
 @router.post("/stream")
-async def chat_stream(payload: ChatRequest, req: Request):
-    llm = req.app.state.openrouter or req.app.state.groq
+async def chat_stream(payload: ChatRequest, req: Request, db: Session = Depends(get_db)):
+    llm = getattr(req.app.state, 'llm_router', None)
+
+    builder = get_context_builder()
+    store = get_chat_store()
+    conv_id = None
+    if payload.conversation_id and str(payload.conversation_id).isdigit():
+        conv_id = int(payload.conversation_id)
+    # Unauthenticated: only anonymous conversations can be continued here
+    conv_id = builder.authorize(db, conv_id, None)
+    messages = builder.build(db, conv_id, "You are Buddy, a helpful AI assistant.", payload.message)
+    # The id goes out in a header before streaming starts, so a new conversation is created now
+    conv_id = store.open_conversation(db, conv_id)
+
 
-    messages = [
-        {"role": "system", "content": "You are Buddy, a helpful AI assistant."},
-        {"role": "user", "content": payload.message}
-    ]
+    options = StreamOptions.from_request(req)
+    encoder = FrameEncoder(options)
 
     async def generate():
         if not llm:
-            yield f"data: {json.dumps({'error':'LLM provider not configured'})}\n\n"
+            yield encoder.event({'error': 'LLM provider not configured'}) + encoder.end()
             return
-        stream = await llm.chat_completion(messages, stream=True)
-        for chunk in stream:
-            delta = getattr(chunk.choices[0], 'delta', None)
-            token = getattr(delta, 'content', None) if delta else None
-            if token:
-                yield f"data: {json.dumps({'token': token})}\n\n"
-        yield "data: [DONE]\n\n"
-
-    return StreamingResponse(generate(), media_type="text/event-stream")
+        stats = StreamStats()
+        parts: list[str] = []
+        frames = 0
+        try:
+            async with aclosing(iter_tokens(llm, messages, stats, should_stop=req.is_disconnected)) as tokens:
+                async with aclosing(coalesce(tokens, window_ms=options.window_ms, max_bytes=options.max_bytes)) as chunks:
+                    async for chunk in chunks:
+                        parts.append(chunk)
+                        frames += 1
+                        yield encoder.event({'token': chunk})
+            if not stats.cancelled:
+                yield encoder.event({'done': True, 'conversation_id': str(conv_id), 'frames': frames, **stats.as_dict()})
+                yield encoder.end()
+        except Exception as e:
+            logger.error(f"Streaming LLM call failed: {e}", exc_info=True)
+            yield encoder.event({'error': 'LLM error'}) + encoder.end()
+        finally:
+            # Runs on completion, error and client disconnect alike. The user message
+            # is saved even when nothing was generated; the assistant reply only if any.
+            logger.info(f"chat_stream conversation={conv_id} {stats.as_dict()}")
+            turn = [builder.message('user', payload.message)]
+            usage = None
+            if parts:
+                turn.append(builder.message('assistant', "".join(parts)))
+                usage = TurnUsage(llm.model, get_token_counter().count_messages(messages), turn[1].tokens)
+            with anyio.CancelScope(shield=True):
+                db_stream = SessionLocal()
+                try:
+                    await store.save_turn(db_stream, conv_id, turn, usage=usage)
+                    builder.append(conv_id, turn)
+                except Exception as e:
+                    logger.error(f"Failed to persist streamed turn: {e}")
+                finally:
+                    db_stream.close()
+            builder.maybe_fold(conv_id, llm)
+
+    return StreamingResponse(
+        generate(),
+        media_type=options.media_type,
+        headers={**options.headers(), "X-Conversation-Id": str(conv_id)},
+    )
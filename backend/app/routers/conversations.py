@@ -4,9 +4,10 @@ from typing import List
 from datetime import datetime
 
 from app.database import SessionLocal
-from app.models.conversation import Conversation
+from app.models.conversation import Conversation, ConversationSummary
 from app.models.message import Message
 from app.schemas.conversation import ConversationBrief, ConversationDetail, MessageOut
+from app.services.context_builder import get_context_builder
 
 router = APIRouter(prefix="/api/conversations", tags=["conversations"])
 
@@ -67,6 +68,8 @@ def get_conversation(conversation_id: int, db: Session = Depends(get_db)):
 @router.delete("/{conversation_id}", status_code=204)
 def delete_conversation(conversation_id: int, db: Session = Depends(get_db)):
     db.query(Message).filter(Message.conversation_id == conversation_id).delete()
+    db.query(ConversationSummary).filter(ConversationSummary.conversation_id == conversation_id).delete()
+    get_context_builder().forget(conversation_id)
     deleted = db.query(Conversation).filter(Conversation.id == conversation_id).delete()
     db.commit()
     if not deleted:
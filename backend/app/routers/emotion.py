@@ -1,3 +1,5 @@
+import asyncio
+
 from fastapi import APIRouter, Query, HTTPException
 from pydantic import BaseModel
 from typing import Optional
@@ -9,7 +11,7 @@ router = APIRouter(prefix="/api/emotion", tags=["emotion"])
 organizer = EmotionOrganizer(base_path="./user_data")
 
 from fastapi import Depends, Request
-from app.utils.auth import get_current_user
+from app.utils.auth import get_current_user, is_admin
 from app.models.user import User
 
 
@@ -37,6 +39,29 @@ async def summary(user_id: str = Query(...), days: int = Query(7, ge=1, le=365),
     return await organizer.get_emotion_summary(user_id=user_id, days=days)
 
 
+@router.get("/trends")
+async def trends(
+    user_id: str = Query(...),
+    days: int = Query(30, ge=1, le=365),
+    window: int = Query(7, ge=1, le=90),
+    _: User = Depends(get_current_user),
+):
+    from app.services.emotion_trends import np
+    if np is None:
+        raise HTTPException(status_code=501, detail="Emotion trends require numpy")
+    return await organizer.get_emotion_trends(user_id=user_id, days=days, window=window)
+
+
+@router.post("/aggregates/rebuild")
+async def rebuild_aggregates(user_id: Optional[str] = Query(None), user: User = Depends(get_current_user)):
+    """Recompute the daily counters from the stored entries (after a backfill or manual edit).
+    Admins only (ADMIN_EMAILS): emotion user keys are not tied to accounts."""
+    if not is_admin(user):
+        raise HTTPException(status_code=403, detail="Not allowed to rebuild emotion aggregates")
+    rows = await asyncio.to_thread(organizer.store.rebuild_aggregates, user_id)
+    return {"user_id": user_id, "rows": rows, **organizer.store.aggregate_stats()}
+
+
 @router.get("/categories")
 async def categories(user_id: str = Query(...), _: User = Depends(get_current_user)):
     return await organizer.get_category_list(user_id)
@@ -44,4 +69,10 @@ async def categories(user_id: str = Query(...), _: User = Depends(get_current_us
 
 @router.get("/search")
 async def search(user_id: str = Query(...), keyword: str = Query(...), category: Optional[str] = Query(None), _: User = Depends(get_current_user)):
-    return await organizer.search_notes(user_id=user_id, keyword=keyword, category=category)
\ No newline at end of file
+    return await organizer.search_notes(user_id=user_id, keyword=keyword, category=category)
+
+
+@router.get("/engine/stats")
+async def engine_stats(request: Request):
+    phi2 = getattr(request.app.state, 'phi2', None)
+    return phi2.stats() if phi2 else {"enabled": False}
@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+
+from app.services.job_queue import get_job_queue
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+
+@router.get("/stats")
+async def job_stats():
+    return get_job_queue().stats()
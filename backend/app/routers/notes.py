@@ -1,9 +1,18 @@
-from typing import List
+import asyncio
+import time
+import zipfile
+from typing import List, Tuple
 from fastapi import APIRouter, Depends, Request, UploadFile, File, HTTPException
 from sqlalchemy.orm import Session
+from app.config import settings
 from app.database import SessionLocal
-from app.models.note import Note, Topic
 from app.schemas.note import NoteOrganizeRequest, NoteOrganizeResponse
+from app.services.bulk_import import expand_upload, get_bulk_importer
+from app.services.dedup import get_deduplicator
+from app.services.ingest import UploadTooLarge, read_upload, read_upload_text
+from app.services.keyphrases import get_keyphrase_engine
+from app.services.note_organizer import get_note_organizer
+from app.services.topic_repository import get_topic_repository
 
 router = APIRouter(prefix="/api/notes", tags=["notes"])
 
@@ -21,79 +30,108 @@ from app.models.user import User
 
 @router.post("/organize", response_model=NoteOrganizeResponse)
 async def organize(req: NoteOrganizeRequest, request: Request, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    llm = request.app.state.openrouter or request.app.state.groq
+    llm = getattr(request.app.state, 'llm_router', None)
     phi2 = request.app.state.phi2
 
-    import asyncio
-    if not llm:
-        return NoteOrganizeResponse(headings=[], topics=[], categories=[], emotions=None, processing_time_ms=0)
-    headings_task = llm.generate_headings(req.text)
-    topics_task = llm.extract_topics(req.text)
-    categories_task = llm.categorize_note(req.text)
-
-    headings, topics, categories = await asyncio.gather(headings_task, topics_task, categories_task)
+    started = time.perf_counter()
+    result = await get_note_organizer().organize_document(db, llm, req.text, use_cache=req.use_cache, user_id=user.id)
 
     emotions = None
     if phi2 and req.detect_emotion:
-        emotions = phi2.detect_emotion(req.text)
+        emotions = await phi2.detect_emotion(req.text)
 
     if req.save:
-        note = Note(path=req.path, content=req.text)
-        topic_objs: List[Topic] = []
-        for t in topics:
-            existing = db.query(Topic).filter(Topic.name == t).first()
-            if not existing:
-                existing = Topic(name=t)
-                db.add(existing)
-                db.flush()
-            topic_objs.append(existing)
-        note.topics = topic_objs
-        db.add(note)
-        db.commit()
-
-    return NoteOrganizeResponse(headings=headings, topics=topics, categories=categories, emotions=emotions, processing_time_ms=50)
+        await asyncio.to_thread(get_topic_repository().add_note, db, req.path, req.text, result.topics, user_id=user.id)
+
+    return _response(result, emotions, started)
 
 
 @router.post("/import", response_model=NoteOrganizeResponse)
-async def import_file(request: Request, file: UploadFile = File(...), db: Session = Depends(get_db)):
-    llm = request.app.state.openrouter or request.app.state.groq
+async def import_file(request: Request, file: UploadFile = File(...), use_cache: bool = True, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    llm = getattr(request.app.state, 'llm_router', None)
     phi2 = request.app.state.phi2
-    if not llm:
-        raise HTTPException(status_code=503, detail="LLM provider not configured")
 
-    raw = await file.read()
-    text = None
-    # Try UTF-8 then fallback
-    for enc in ("utf-8", "utf-16", "latin-1"):
-        try:
-            text = raw.decode(enc)
-            break
-        except Exception:
-            continue
-    if not text:
+    try:
+        text = await read_upload_text(file, settings.import_max_file_bytes)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    if not text.strip():
         raise HTTPException(status_code=400, detail="Unable to decode file")
 
-    import asyncio
-    headings_task = llm.generate_headings(text)
-    topics_task = llm.extract_topics(text)
-    categories_task = llm.categorize_note(text)
-
-    headings, topics, categories = await asyncio.gather(headings_task, topics_task, categories_task)
+    started = time.perf_counter()
+    result = await get_note_organizer().organize_document(db, llm, text, use_cache=use_cache, user_id=user.id)
     emotions = None
     if phi2:
-        emotions = phi2.detect_emotion(text[:5000])
-
-    note = Note(path=file.filename, content=text)
-    topic_objs: List[Topic] = []
-    for t in topics:
-        existing = db.query(Topic).filter(Topic.name == t).first()
-        if not existing:
-            existing = Topic(name=t)
-            db.add(existing)
-            db.flush()
-        topic_objs.append(existing)
-    note.topics = topic_objs
-    db.add(note)
-    db.commit()
-
-    return NoteOrganizeResponse(headings=headings, topics=topics, categories=categories, emotions=emotions, processing_time_ms=50)
+        emotions = await phi2.detect_emotion(text[:5000])
+
+    await asyncio.to_thread(get_topic_repository().add_note, db, file.filename, text, result.topics, user_id=user.id)
+
+    return _response(result, emotions, started)
+
+
+@router.post("/import/bulk", status_code=202)
+async def import_bulk(request: Request, files: List[UploadFile] = File(...), user: User = Depends(get_current_user)):
+    """Queue many files (or zip archives of text files) for import; returns a job id to poll."""
+    items: List[Tuple[str, bytes]] = []
+    total = 0  # unpacked bytes held for the job
+    for upload in files:
+        remaining = settings.import_max_total_bytes - total
+        if remaining <= 0:
+            raise HTTPException(status_code=413, detail=f"Import exceeds {settings.import_max_total_bytes} bytes in total")
+        if len(items) >= settings.import_max_files:
+            raise HTTPException(status_code=413, detail=f"At most {settings.import_max_files} files per import")
+        try:
+            raw = await read_upload(upload, min(settings.import_max_upload_bytes, remaining))
+            expanded = expand_upload(upload.filename or "upload", raw, max_bytes=remaining, max_files=settings.import_max_files - len(items))
+            del raw
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except (ValueError, zipfile.BadZipFile) as e:
+            raise HTTPException(status_code=400, detail=f"{upload.filename}: {e}")
+        total += sum(len(data) for _, data in expanded)
+        items.extend(expanded)
+    if not items:
+        raise HTTPException(status_code=400, detail="No importable files")
+    job = get_bulk_importer().submit(items, getattr(request.app.state, 'llm_router', None), user_id=user.id)
+    return job.progress()
+
+
+def _own_job(job_id: str, user: User):
+    job = get_bulk_importer().get(job_id)
+    if job is None or job.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+
+@router.get("/import/jobs/{job_id}")
+async def import_progress(job_id: str, user: User = Depends(get_current_user)):
+    return _own_job(job_id, user).progress()
+
+
+@router.get("/import/jobs/{job_id}/result")
+async def import_result(job_id: str, user: User = Depends(get_current_user)):
+    job = _own_job(job_id, user)
+    return {**job.progress(), "results": job.results}
+
+
+@router.delete("/import/jobs/{job_id}")
+async def cancel_import(job_id: str, user: User = Depends(get_current_user)):
+    _own_job(job_id, user)
+    return {"cancelled": get_bulk_importer().cancel(job_id)}
+
+
+def _response(result, emotions, started: float) -> NoteOrganizeResponse:
+    return NoteOrganizeResponse(
+        headings=result.headings,
+        topics=result.topics,
+        categories=result.categories,
+        emotions=emotions,
+        processing_time_ms=int((time.perf_counter() - started) * 1000),
+        source=result.source,
+        cached=result.cached,
+    )
+
+
+@router.get("/organize/stats")
+async def organize_stats():
+    return {**get_note_organizer().stats(), "keyphrases": get_keyphrase_engine().stats(), "dedup": get_deduplicator().stats()}
@@ -0,0 +1,145 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.conversation import Conversation
+from app.models.message import Message
+from app.models.note import Note
+from app.models.user import User
+from app.services import search_index, vector_index
+from app.utils.auth import get_current_user
+
+router = APIRouter(prefix="/api/search", tags=["search"])
+
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@router.get("")
+def search(
+    q: str = Query(..., min_length=1, max_length=500),
+    scope: str = Query("all", pattern="^(all|notes|messages)$"),
+    mode: str = Query("all", pattern="^(all|any|phrase)$"),
+    topic: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Ranked full-text search over the caller's notes and chat messages."""
+    if not search_index.available():
+        raise HTTPException(status_code=501, detail="Full-text search requires SQLite FTS5")
+    match = search_index.build_match(q, mode)
+    if match is None:
+        return {"query": q, "notes": [], "messages": []}
+    result = {"query": q, "notes": [], "messages": []}
+    if scope in ("all", "notes"):
+        hits = search_index.search_notes(db, match, user_id=user.id, topic=topic, since=since, until=until, limit=limit, offset=offset)
+        result["notes"] = [h.as_dict() for h in hits]
+    # Messages have no topics, so a topic filter restricts the search to notes
+    if scope in ("all", "messages") and not topic:
+        hits = search_index.search_messages(db, match, user_id=user.id, since=since, until=until, limit=limit, offset=offset)
+        result["messages"] = [h.as_dict() for h in hits]
+    return result
+
+
+def _semantic_index():
+    if not (settings.vector_index_enabled and vector_index.available()):
+        raise HTTPException(status_code=501, detail="Semantic search requires numpy and sentence-transformers")
+    return vector_index.get_semantic_index()
+
+
+def _preview(text: str, size: int = 200) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= size else text[:size].rsplit(" ", 1)[0] + "…"
+
+
+def _note_hits(db: Session, scored):
+    notes = {n.id: n for n in db.query(Note).filter(Note.id.in_([i for i, _ in scored]))} if scored else {}
+    return [
+        {"kind": "note", "id": i, "score": score, "path": notes[i].path, "preview": _preview(notes[i].content),
+         "created_at": notes[i].created_at.isoformat() if notes[i].created_at else None}
+        for i, score in scored if i in notes
+    ]
+
+
+def _message_hits(db: Session, scored):
+    msgs = {m.id: m for m in db.query(Message).filter(Message.id.in_([i for i, _ in scored]))} if scored else {}
+    return [
+        {"kind": "message", "id": i, "score": score, "conversation_id": msgs[i].conversation_id, "role": msgs[i].role,
+         "preview": _preview(msgs[i].content), "created_at": msgs[i].created_at.isoformat() if msgs[i].created_at else None}
+        for i, score in scored if i in msgs
+    ]
+
+
+@router.get("/semantic")
+def semantic_search(
+    q: str = Query(..., min_length=1, max_length=2000),
+    scope: str = Query("notes", pattern="^(all|notes|messages)$"),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Notes and messages closest in meaning to `q`, not just sharing its words."""
+    index = _semantic_index()
+    query = index.embed_query(q)
+    if query is None:
+        raise HTTPException(status_code=503, detail="Embedding model unavailable")
+    result = {"query": q, "notes": [], "messages": []}
+    if scope in ("all", "notes"):
+        scored = index.search("notes", query, limit, allowed=vector_index.owned_note_ids(db, user.id))
+        result["notes"] = _note_hits(db, scored)
+    if scope in ("all", "messages"):
+        scored = index.search("messages", query, limit, allowed=vector_index.owned_message_ids(db, user.id))
+        result["messages"] = _message_hits(db, scored)
+    return result
+
+
+@router.get("/related/conversations/{conversation_id}")
+def notes_related_to_conversation(
+    conversation_id: int,
+    limit: int = Query(5, ge=1, le=50),
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Notes related to what the conversation has been about lately."""
+    index = _semantic_index()
+    conv = db.query(Conversation).filter(Conversation.id == conversation_id, Conversation.user_id == user.id).first()
+    if conv is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    query = index.conversation_vector(db, conversation_id)
+    scored = index.search("notes", query, limit, allowed=vector_index.owned_note_ids(db, user.id)) if query is not None else []
+    return {"conversation_id": conversation_id, "notes": _note_hits(db, scored)}
+
+
+@router.get("/related/notes/{note_id}")
+def notes_related_to_note(
+    note_id: int,
+    limit: int = Query(5, ge=1, le=50),
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    index = _semantic_index()
+    note = db.query(Note).filter(Note.id == note_id).first()
+    if note is None or note.user_id not in (None, user.id):
+        raise HTTPException(status_code=404, detail="Note not found")
+    query = index.embed_query(note.content)
+    allowed = vector_index.owned_note_ids(db, user.id)
+    scored = index.search("notes", query, limit, allowed=allowed, exclude=[note_id]) if query is not None else []
+    return {"note_id": note_id, "notes": _note_hits(db, scored)}
+
+
+@router.get("/semantic/stats")
+def semantic_stats(user: User = Depends(get_current_user)):
+    return _semantic_index().stats()
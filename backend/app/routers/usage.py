@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.database import SessionLocal
+from app.models.conversation import Conversation
+from app.models.user import User
+from app.services.tokens import get_token_counter
+from app.services.usage import conversation_usage, daily_usage
+from app.utils.auth import get_current_user, is_admin
+
+router = APIRouter(prefix="/api/usage", tags=["usage"])
+
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def _totals(rows: list) -> dict:
+    keys = ("requests", "cached_requests", "tokens_in", "tokens_out")
+    return {k: sum(r[k] for r in rows) for k in keys}
+
+
+@router.get("")
+def my_usage(days: int = Query(30, ge=1, le=366), model: Optional[str] = None, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    rows = daily_usage(db, user_id=user.id, days=days, model=model)
+    return {"user_id": user.id, "days": days, "totals": _totals(rows), "daily": rows}
+
+
+@router.get("/daily")
+def all_usage(
+    days: int = Query(30, ge=1, le=366),
+    model: Optional[str] = None,
+    user_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Usage across users (or one user) per day and model, for capacity planning.
+    Admins only (ADMIN_EMAILS); everyone else gets their own usage."""
+    if not is_admin(user):
+        if user_id is not None and user_id != user.id:
+            raise HTTPException(status_code=403, detail="Not allowed to read other users' usage")
+        user_id = user.id
+    rows = daily_usage(db, user_id=user_id, days=days, model=model)
+    return {"days": days, "totals": _totals(rows), "daily": rows}
+
+
+@router.get("/conversations/{conversation_id}")
+def usage_for_conversation(conversation_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    owner = db.query(Conversation.id, Conversation.user_id).filter(Conversation.id == conversation_id).first()
+    if owner is None or (owner.user_id != user.id and not is_admin(user)):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return conversation_usage(db, conversation_id)
+
+
+@router.get("/tokenizer")
+def tokenizer_stats():
+    return get_token_counter().stats()
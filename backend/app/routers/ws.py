@@ -0,0 +1,242 @@
+"""
+WebSocket chat: one authenticated connection carries many turns.
+
+Connect to /ws/chat with `?token=<jwt>` (or an Authorization header), or send
+{"type": "auth", "token": "..."} as the first message. Add `?coalesce=true`
+to group tokens into fewer frames (see stream_framing).
+
+Client messages:
+    {"type": "chat", "id": "t1", "message": "...", "conversation_id": "42"?, "detect_emotion": true?}
+    {"type": "cancel", "id": "t1"}
+    {"type": "reset"}        start a new conversation with the next turn
+    {"type": "ping"}
+
+Server messages:
+    {"type": "ready", "user_id": 1, "conversation_id": null}
+    {"type": "token", "id": "t1", "token": "..."}
+    {"type": "done", "id": "t1", "conversation_id": "42", "emotion": {...}, "stats": {...}}
+    {"type": "cancelled", "id": "t1"} / {"type": "error", "id": "t1"?, "detail": "..."} / {"type": "pong"}
+
+Several turns may be in flight at once; each one is streamed, persisted and
+cancellable on its own. The user is resolved once per connection and the
+conversation id is remembered between turns.
+"""
+import asyncio
+import logging
+import uuid
+from contextlib import aclosing
+from typing import Any, Dict, Optional
+
+import anyio
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+
+from app.config import settings
+from app.database import SessionLocal
+from app.services.chat_persistence import get_chat_store
+from app.services.context_builder import get_context_builder
+from app.services.conversation_notes import JOB_KIND as NOTES_JOB
+from app.services.job_queue import get_job_queue
+from app.services.stream_framing import StreamOptions, coalesce
+from app.services.streaming import StreamStats, iter_tokens
+from app.services.tokens import get_token_counter
+from app.services.usage import TurnUsage
+from app.utils.auth import user_from_token
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["ws"])
+
+SYSTEM_PROMPT = "You are Buddy, a warm and helpful AI assistant."
+POLICY_VIOLATION = 4401
+
+
+class ChatSession:
+    """Per-connection state shared by the connection's turns."""
+
+    def __init__(self, websocket: WebSocket, user_id: int) -> None:
+        self.websocket = websocket
+        self.user_id = user_id
+        self.conversation_id: Optional[int] = None
+        self.options = StreamOptions.from_request(websocket)
+        self.turns: Dict[str, asyncio.Task] = {}
+        self.closing = False
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, message: Dict[str, Any]) -> None:
+        if self.closing:
+            return
+        async with self._send_lock:
+            try:
+                await self.websocket.send_json(message)
+            except Exception:
+                self.closing = True  # connection is gone; turns still persist
+
+
+async def _authenticate(websocket: WebSocket, db) -> Optional[int]:
+    token = websocket.query_params.get("token")
+    auth = websocket.headers.get("authorization", "")
+    if not token and auth.startswith("Bearer "):
+        token = auth.split(" ", 1)[1]
+    if not token:
+        try:
+            first = await asyncio.wait_for(websocket.receive_json(), settings.ws_auth_timeout_s)
+        except (asyncio.TimeoutError, ValueError):
+            first = {}
+        if isinstance(first, dict) and first.get("type") == "auth":
+            token = first.get("token")
+    try:
+        return user_from_token(db, token).id
+    except HTTPException as e:
+        await websocket.send_json({"type": "error", "detail": e.detail})
+        await websocket.close(code=POLICY_VIOLATION)
+        return None
+
+
+async def _run_turn(session: ChatSession, turn_id: str, text: str, conversation_id: Optional[int], detect_emotion: bool) -> None:
+    app_state = session.websocket.app.state
+    llm = getattr(app_state, "llm_router", None)
+    phi2 = getattr(app_state, "phi2", None)
+    builder = get_context_builder()
+    store = get_chat_store()
+
+    # Turns of one socket run concurrently, so each gets its own session: a failed
+    # flush in one turn must not poison the others
+    db = SessionLocal()
+    try:
+        conv_id = conversation_id if conversation_id is not None else session.conversation_id
+        conv_id = builder.authorize(db, conv_id, session.user_id)
+        messages = builder.build(db, conv_id, SYSTEM_PROMPT, text)
+        conv_id = store.open_conversation(db, conv_id, session.user_id)
+    except Exception as e:
+        db.close()
+        # Nobody awaits the turn task: report here or the client never hears back
+        if isinstance(e, PermissionError):
+            detail = "forbidden: conversation belongs to another user"
+        else:
+            logger.error(f"WebSocket turn {turn_id} could not start: {e}", exc_info=True)
+            detail = "could not start turn"
+        await session.send({"type": "error", "id": turn_id, "detail": detail})
+        return
+    session.conversation_id = conv_id
+
+    emotion_task = asyncio.ensure_future(phi2.detect_emotion(text)) if (phi2 and detect_emotion) else None
+    stats = StreamStats()
+    parts: list[str] = []
+    try:
+        if not llm:
+            await session.send({"type": "error", "id": turn_id, "detail": "LLM provider not configured"})
+            return
+        async with aclosing(iter_tokens(llm, messages, stats)) as tokens:
+            async with aclosing(coalesce(tokens, window_ms=session.options.window_ms, max_bytes=session.options.max_bytes)) as chunks:
+                async for chunk in chunks:
+                    parts.append(chunk)
+                    await session.send({"type": "token", "id": turn_id, "token": chunk})
+        emotion = None
+        if emotion_task is not None:
+            try:
+                emotion = await emotion_task
+            except Exception:
+                emotion = None
+        await session.send({
+            "type": "done", "id": turn_id, "conversation_id": str(conv_id), "emotion": emotion, "stats": stats.as_dict(),
+        })
+    except asyncio.CancelledError:
+        stats.cancelled = True
+        raise
+    except Exception as e:
+        logger.error(f"WebSocket turn {turn_id} failed: {e}", exc_info=True)
+        await session.send({"type": "error", "id": turn_id, "detail": "LLM error"})
+    finally:
+        if emotion_task is not None and not emotion_task.done():
+            emotion_task.cancel()
+        # Same rules as the SSE endpoint: the user message is always saved,
+        # the reply only if anything was generated.
+        turn = [builder.message("user", text)]
+        usage = None
+        if parts:
+            turn.append(builder.message("assistant", "".join(parts)))
+            usage = TurnUsage(llm.model, get_token_counter().count_messages(messages), turn[1].tokens)
+        with anyio.CancelScope(shield=True):
+            try:
+                await store.save_turn(db, conv_id, turn, user_id=session.user_id, usage=usage)
+                builder.append(conv_id, turn)
+            except Exception as e:
+                logger.error(f"Failed to persist WebSocket turn: {e}")
+            finally:
+                db.close()
+        builder.maybe_fold(conv_id, llm)
+        if parts and not stats.cancelled:
+            try:
+                get_job_queue().notify(NOTES_JOB, conv_id, {"conversation_id": conv_id})
+            except Exception as e:
+                logger.error(f"Failed to schedule note generation: {e}")
+
+
+def _start_turn(session: ChatSession, data: Dict[str, Any]) -> Optional[str]:
+    """Start a turn task; returns an error message if the turn was refused."""
+    turn_id = str(data.get("id") or uuid.uuid4().hex[:8])
+    text = (data.get("message") or "").strip()
+    if not text:
+        return "message is required"
+    if turn_id in session.turns:
+        return f"turn {turn_id} is already in flight"
+    if len(session.turns) >= settings.ws_max_inflight_turns:
+        return "too many turns in flight"
+    raw_conv = data.get("conversation_id")
+    conversation_id = int(raw_conv) if raw_conv is not None and str(raw_conv).isdigit() else None
+    task = asyncio.create_task(_run_turn(session, turn_id, text, conversation_id, bool(data.get("detect_emotion", True))))
+    session.turns[turn_id] = task
+    task.add_done_callback(lambda _t, tid=turn_id: session.turns.pop(tid, None))
+    return None
+
+
+@router.websocket("/ws/chat")
+async def ws_chat(websocket: WebSocket):
+    await websocket.accept()
+    session: Optional[ChatSession] = None
+    try:
+        db = SessionLocal()
+        try:
+            user_id = await _authenticate(websocket, db)
+        finally:
+            db.close()
+        if user_id is None:
+            return
+        session = ChatSession(websocket, user_id)
+        await session.send({"type": "ready", "user_id": user_id, "conversation_id": None})
+        while True:
+            try:
+                data = await websocket.receive_json()
+            except ValueError:
+                await session.send({"type": "error", "detail": "invalid JSON"})
+                continue
+            kind = data.get("type") if isinstance(data, dict) else None
+            if kind == "chat":
+                error = _start_turn(session, data)
+                if error:
+                    await session.send({"type": "error", "id": data.get("id"), "detail": error})
+            elif kind == "cancel":
+                turn_id = str(data.get("id"))
+                task = session.turns.get(turn_id)
+                if task is not None:
+                    task.cancel()
+                    # Wait for the turn to close its upstream stream and persist
+                    await asyncio.wait([task])
+                    await session.send({"type": "cancelled", "id": turn_id})
+            elif kind == "reset":
+                session.conversation_id = None
+            elif kind == "ping":
+                await session.send({"type": "pong"})
+            else:
+                await session.send({"type": "error", "detail": f"unknown message type {kind!r}"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if session is not None:
+            session.closing = True
+            tasks = list(session.turns.values())
+            for task in tasks:
+                task.cancel()
+            # Let the turns persist what they generated before the session closes
+            with anyio.CancelScope(shield=True):
+                await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,19 +1,22 @@
 from pydantic import BaseModel
-from typing import Optional, Any
+from typing import Optional, Any, Dict
 
 class ChatRequest(BaseModel):
     message: str
     conversation_id: Optional[str] = None
     detect_emotion: bool = True
+    use_cache: bool = True  # opt out of the response cache for this request
 
 class ChatResponse(BaseModel):
     response: str
     emotion: Optional[Any] = None
     conversation_id: str
     model: str
+    timings: Optional[Dict[str, float]] = None  # per-stage durations in ms
 
 class ReliefChatRequest(BaseModel):
     message: str
     conversation_id: Optional[str] = None
     detect_emotion: bool = True
     save_memory: bool = True  # allow private mode when False
+    use_cache: bool = True
@@ -6,14 +6,22 @@ class NoteOrganizeRequest(BaseModel):
     save: bool = False
     path: Optional[str] = None
     detect_emotion: bool = False
+    use_cache: bool = True  # False forces a fresh organize
 
 class Heading(BaseModel):
     level: int
     text: str
 
+class OrganizeResult(BaseModel):
+    headings: List[Heading]
+    topics: List[str]
+    categories: List[str] = []
+
 class NoteOrganizeResponse(BaseModel):
     headings: List[Heading]
     topics: List[str]
     categories: List[str]
     emotions: Optional[Any] = None
     processing_time_ms: int
+    source: Optional[str] = None  # 'llm', 'local' or 'heuristic'
+    cached: bool = False
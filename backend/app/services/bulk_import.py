@@ -0,0 +1,222 @@
+"""
+Bulk note import.
+A bulk import is a job: the uploaded files (or the text files inside a zip)
+are organized with bounded concurrency, so throughput is set by the LLM
+providers rather than the client's request rate, and the resulting notes
+are written in batched transactions. Jobs live in memory; progress and
+results are polled by job id.
+"""
+from __future__ import annotations
+
+import asyncio
+import io
+import logging
+import time
+import uuid
+import zipfile
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.database import SessionLocal
+from app.services.ingest import UploadTooLarge, decode_bytes
+from app.services.note_organizer import get_note_organizer
+from app.services.topic_repository import get_topic_repository
+
+logger = logging.getLogger(__name__)
+
+TEXT_EXTENSIONS = (".md", ".markdown", ".txt", ".text", ".org", ".rst")
+
+
+def expand_upload(name: str, raw: bytes, max_bytes: Optional[int] = None, max_files: Optional[int] = None) -> List[Tuple[str, bytes]]:
+    """A plain upload as-is, or the text files inside a zip archive. `max_bytes` and
+    `max_files` are what is left of the import's budget; decompression stops as soon
+    as either runs out, so a small archive cannot unpack into more than that."""
+    max_bytes = settings.import_max_total_bytes if max_bytes is None else max_bytes
+    max_files = settings.import_max_files if max_files is None else max_files
+    if not (name.lower().endswith(".zip") or raw[:4] == b"PK\x03\x04"):
+        if len(raw) > settings.import_max_file_bytes:
+            raise UploadTooLarge(f"{name} exceeds {settings.import_max_file_bytes} bytes")
+        if len(raw) > max_bytes:
+            raise UploadTooLarge(f"{name} exceeds the {max_bytes} bytes left for this import")
+        if max_files < 1:
+            raise UploadTooLarge("Too many files in this import")
+        return [(name, raw)]
+    files: List[Tuple[str, bytes]] = []
+    left = max_bytes
+    with zipfile.ZipFile(io.BytesIO(raw)) as archive:
+        for info in archive.infolist():
+            base = info.filename.rsplit("/", 1)[-1]
+            if info.is_dir() or info.filename.startswith("__MACOSX/") or base.startswith("."):
+                continue
+            if not base.lower().endswith(TEXT_EXTENSIONS):
+                continue
+            if len(files) >= max_files:
+                raise UploadTooLarge(f"{name} holds more files than this import allows")
+            if info.file_size > settings.import_max_file_bytes:
+                raise ValueError(f"{info.filename} exceeds {settings.import_max_file_bytes} bytes")
+            with archive.open(info) as member:
+                # Never trust the declared size of a compressed member
+                data = member.read(min(settings.import_max_file_bytes, left) + 1)
+            if len(data) > settings.import_max_file_bytes:
+                raise ValueError(f"{info.filename} exceeds {settings.import_max_file_bytes} bytes")
+            if len(data) > left:
+                raise UploadTooLarge(f"{name} unpacks to more than the {max_bytes} bytes left for this import")
+            left -= len(data)
+            files.append((info.filename, data))
+    return files
+
+
+@dataclass
+class ImportJob:
+    id: str
+    user_id: Optional[int]
+    files: List[Tuple[str, bytes]]
+    total: int = 0
+    status: str = "queued"  # queued | running | done | failed | cancelled
+    processed: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    results: List[Dict[str, Any]] = field(default_factory=list)
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    task: Optional[asyncio.Task] = None
+
+    def progress(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "total": self.total,
+            "processed": self.processed,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "elapsed_s": round(end - self.created_at, 2),
+            "error": self.error,
+        }
+
+
+class BulkImporter:
+    def __init__(self, concurrency: Optional[int] = None, batch_size: Optional[int] = None, keep_jobs: int = 100) -> None:
+        self.concurrency = concurrency or settings.import_concurrency
+        self.batch_size = batch_size or settings.import_batch_size
+        self.keep_jobs = keep_jobs
+        self._jobs: Dict[str, ImportJob] = {}
+
+    def get(self, job_id: str) -> Optional[ImportJob]:
+        return self._jobs.get(job_id)
+
+    def submit(self, files: List[Tuple[str, bytes]], llm, user_id: Optional[int] = None) -> ImportJob:
+        job = ImportJob(id=uuid.uuid4().hex, user_id=user_id, files=files, total=len(files))
+        job.results = [{"file": name} for name, _ in files]
+        self._jobs[job.id] = job
+        self._prune()
+        job.task = asyncio.create_task(self._run(job, llm))
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        job = self._jobs.get(job_id)
+        if job is None or job.task is None or job.task.done():
+            return False
+        job.task.cancel()
+        return True
+
+    async def shutdown(self) -> None:
+        tasks = [j.task for j in self._jobs.values() if j.task is not None and not j.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _prune(self) -> None:
+        finished = [j for j in self._jobs.values() if j.finished_at is not None]
+        for job in sorted(finished, key=lambda j: j.finished_at)[: max(0, len(self._jobs) - self.keep_jobs)]:
+            del self._jobs[job.id]
+
+    async def _run(self, job: ImportJob, llm) -> None:
+        job.status = "running"
+        organizer = get_note_organizer()
+        repo = get_topic_repository()
+        limiter = asyncio.Semaphore(self.concurrency)
+        pending: List[Tuple[Dict[str, Any], str, str, List[str]]] = []
+        flush_lock = asyncio.Lock()
+
+        def save(batch: List[Tuple[Dict[str, Any], str, str, List[str]]]) -> None:
+            db = SessionLocal()
+            try:
+                saved = repo.save_notes(db, [(path, text, topics) for _, path, text, topics in batch], user_id=job.user_id)
+                for (result, *_), entry in zip(batch, saved):
+                    result["note_id"] = entry.note.id
+                    if entry.action != "created":
+                        result.update(dedup=entry.action, duplicate_of=entry.duplicate_of)
+                job.succeeded += len(batch)
+            except Exception as e:
+                logger.error(f"Bulk import {job.id}: batch of {len(batch)} notes failed: {e}")
+                for result, *_ in batch:
+                    result["error"] = "database error"
+                job.failed += len(batch)
+            finally:
+                db.close()
+
+        async def flush() -> None:
+            # Saving may bootstrap the keyphrase corpus, so it runs off the event loop; one batch at a time
+            batch = list(pending)
+            pending.clear()
+            async with flush_lock:
+                await asyncio.to_thread(save, batch)
+
+        async def organize_one(index: int, name: str, raw: bytes) -> None:
+            result = job.results[index]
+            text = decode_bytes(raw)
+            if not text or not text.strip():
+                result["error"] = "unable to decode file" if text is None else "empty file"
+                job.failed += 1
+                job.processed += 1
+                return
+            try:
+                async with limiter:
+                    # One session per file: a Session is not safe to share between concurrent tasks
+                    db = SessionLocal()
+                    try:
+                        outcome = await organizer.organize_document(db, llm, text, user_id=job.user_id)
+                    finally:
+                        db.close()
+            except Exception as e:
+                logger.error(f"Bulk import {job.id}: organizing {name} failed: {e}")
+                result["error"] = "organize failed"
+                job.failed += 1
+                job.processed += 1
+                return
+            result.update(topics=outcome.topics, categories=outcome.categories, source=outcome.source, cached=outcome.cached)
+            job.processed += 1
+            pending.append((result, name, text, outcome.topics))
+            if len(pending) >= self.batch_size:
+                await flush()
+
+        try:
+            await asyncio.gather(*(organize_one(i, name, raw) for i, (name, raw) in enumerate(job.files)))
+            if pending:
+                await flush()
+            job.status = "done"
+        except asyncio.CancelledError:
+            if pending:
+                await flush()  # keep what was already organized
+            job.status = "cancelled"
+        except Exception as e:
+            logger.error(f"Bulk import {job.id} failed: {e}", exc_info=True)
+            job.status = "failed"
+            job.error = str(e)[:200]
+        finally:
+            job.finished_at = time.time()
+            job.files = []  # release the upload buffers
+            logger.info(f"Bulk import {job.id} {job.status}: {job.succeeded} saved, {job.failed} failed")
+
+
+_importer: Optional[BulkImporter] = None
+
+
+def get_bulk_importer() -> BulkImporter:
+    global _importer
+    if _importer is None:
+        _importer = BulkImporter()
+    return _importer
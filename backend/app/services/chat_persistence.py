@@ -0,0 +1,209 @@
+"""
+Persistence for chat turns.
+A turn (conversation row if new, user message, assistant message) is written
+in a single transaction. With CHAT_WRITE_BEHIND the messages are instead put
+on a bounded in-process queue and inserted in bulk by a background writer,
+which drains the queue on shutdown.
+Messages are stored with their token counts and the turn's usage is added to
+the daily aggregates in the same transaction.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.conversation import Conversation
+from app.models.message import Message
+from app.services.context_builder import TurnMessage
+from app.services.usage import TurnUsage, record_usage
+
+logger = logging.getLogger(__name__)
+
+_Batch = List[Tuple[int, List[TurnMessage], Optional[int], Optional[TurnUsage]]]
+
+
+def _row(conversation_id: int, m: TurnMessage, usage: Optional[TurnUsage]) -> Message:
+    # User messages count their own tokens as input; the assistant reply carries
+    # the prompt it was generated from (tokens_in) and its own length (tokens_out).
+    if m.role == "assistant":
+        tokens_in, tokens_out = (usage.prompt_tokens if usage else 0), m.tokens
+    else:
+        tokens_in, tokens_out = m.tokens, 0
+    return Message(conversation_id=conversation_id, role=m.role, content=m.content, tokens_in=tokens_in, tokens_out=tokens_out)
+
+
+class ChatStore:
+    def __init__(
+        self,
+        write_behind: Optional[bool] = None,
+        max_queue: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        flush_interval_ms: Optional[float] = None,
+    ) -> None:
+        self.write_behind = settings.chat_write_behind if write_behind is None else write_behind
+        self.max_queue = max_queue or settings.write_behind_max_queue
+        self.batch_size = batch_size or settings.write_behind_batch_size
+        self.flush_interval = (flush_interval_ms or settings.write_behind_flush_ms) / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self.flushed_batches = 0
+        self.flushed_messages = 0
+        self.failed_messages = 0
+
+    @property
+    def running(self) -> bool:
+        return self._writer is not None and not self._writer.done()
+
+    @staticmethod
+    def _check_owner(db: Session, conversation_id: int, user_id: Optional[int]) -> None:
+        row = db.query(Conversation.user_id).filter(Conversation.id == conversation_id).first()
+        if row is None or row.user_id != user_id:
+            raise PermissionError(f"Conversation {conversation_id} does not belong to the caller")
+
+    def open_conversation(self, db: Session, conversation_id: Optional[int], user_id: Optional[int] = None) -> int:
+        """Return `conversation_id`, creating (and committing) a conversation when it is None.
+        Only needed when the id must be known before the turn is saved. Raises
+        PermissionError for a conversation of another user."""
+        if conversation_id is not None:
+            self._check_owner(db, conversation_id, user_id)
+            return conversation_id
+        try:
+            conv = Conversation(user_id=user_id)
+            db.add(conv)
+            db.flush()
+            conv_id = conv.id
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return conv_id
+
+    async def save_turn(
+        self,
+        db: Session,
+        conversation_id: Optional[int],
+        messages: List[TurnMessage],
+        user_id: Optional[int] = None,
+        usage: Optional[TurnUsage] = None,
+    ) -> int:
+        """Persist a turn and return its conversation id. Message ids are set on `messages`
+        once they are written (immediately, or when the write-behind batch flushes).
+        `usage` is the LLM call behind the reply, if there was one. Raises PermissionError
+        for a conversation of another user."""
+        if self.running:
+            conversation_id = self.open_conversation(db, conversation_id, user_id)
+            await self._queue.put((conversation_id, messages, user_id, usage))  # blocks when full: bounded memory
+            return conversation_id
+        try:
+            if conversation_id is None:
+                conv = Conversation(user_id=user_id)
+                db.add(conv)
+                db.flush()
+                conversation_id = conv.id
+            else:
+                self._check_owner(db, conversation_id, user_id)
+            rows = [_row(conversation_id, m, usage) for m in messages]
+            db.add_all(rows)
+            db.flush()
+            for m, row in zip(messages, rows):
+                m.id = row.id
+            if usage is not None:
+                record_usage(db, [(user_id, usage)])
+            db.commit()
+        except Exception:
+            # Leave the caller's (request or socket) session usable for the next turn
+            db.rollback()
+            for m in messages:
+                m.id = None
+            raise
+        return conversation_id
+
+    async def start(self) -> None:
+        if not self.write_behind or self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._writer = asyncio.create_task(self._run())
+        logger.info(f"Chat write-behind enabled (queue={self.max_queue}, batch={self.batch_size})")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Drain pending writes, then stop the writer."""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Write-behind drain timed out with {self._queue.qsize()} turns pending")
+        self._writer.cancel()
+        try:
+            await self._writer
+        except asyncio.CancelledError:
+            pass
+        self._writer = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: _Batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await asyncio.to_thread(self._flush, batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _flush(self, batch: _Batch, attempts: int = 3) -> None:
+        count = sum(len(msgs) for _, msgs, _, _ in batch)
+        for attempt in range(1, attempts + 1):
+            db = SessionLocal()
+            try:
+                pairs = [(m, _row(conv_id, m, usage)) for conv_id, msgs, _, usage in batch for m in msgs]
+                db.add_all([row for _, row in pairs])
+                db.flush()
+                for m, row in pairs:
+                    m.id = row.id
+                record_usage(db, [(user_id, usage) for _, _, user_id, usage in batch if usage is not None])
+                db.commit()
+                self.flushed_batches += 1
+                self.flushed_messages += count
+                return
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Write-behind flush attempt {attempt}/{attempts} failed: {e}")
+                time.sleep(0.05 * attempt)  # on the writer thread, not the event loop
+            finally:
+                db.close()
+        self.failed_messages += count
+        logger.error(f"Dropped {count} chat messages after {attempts} failed flushes")
+
+    def stats(self) -> dict:
+        return {
+            "write_behind": self.running,
+            "queued_turns": self._queue.qsize() if self._queue is not None else 0,
+            "flushed_batches": self.flushed_batches,
+            "flushed_messages": self.flushed_messages,
+            "failed_messages": self.failed_messages,
+        }
+
+
+_store: Optional[ChatStore] = None
+
+
+def get_chat_store() -> ChatStore:
+    global _store
+    if _store is None:
+        _store = ChatStore()
+    return _store
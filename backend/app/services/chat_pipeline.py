@@ -0,0 +1,248 @@
+"""
+Chat request pipeline.
+A chat turn is a `ChatTurn` passed through a list of stages (context build,
+LLM, emotion, crisis check, persistence, enrichment). Stages grouped in
+`Parallel` run concurrently, e.g. emotion detection alongside the LLM call.
+Every stage's wall time is recorded in `turn.timings` (milliseconds), which
+the endpoints expose as a Server-Timing header.
+"""
+from __future__ import annotations
+
+import abc
+import asyncio
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.services.chat_persistence import get_chat_store
+from app.services.context_builder import get_context_builder
+from app.services.job_queue import get_job_queue
+from app.services.response_cache import SHARED_SCOPE
+from app.services.tokens import get_token_counter
+from app.services.usage import TurnUsage
+from app.utils.text_matcher import TextMatcher
+
+logger = logging.getLogger(__name__)
+
+# Whole-word phrases, with their inflections spelled out: TextMatcher never
+# matches inside a longer word
+CRISIS_MATCHER = TextMatcher({
+    "crisis": [
+        "kill myself", "killing myself", "killed myself",
+        "harm myself", "harming myself", "hurt myself", "hurting myself",
+        "end it", "end it all", "ending it", "ending it all",
+        "can't go on", "can’t go on", "cannot go on",
+        "want to die", "wanna die",
+    ],
+})
+# Stems whose every continuation is a crisis term: "suicidal", "overdosed", "self-harming"
+_CRISIS_STEMS = re.compile(r"(?<!\w)(?:suicid|overdos|self[-\s]?harm)", re.IGNORECASE)
+
+
+def is_crisis(text: str) -> bool:
+    return bool(text) and (CRISIS_MATCHER.contains(text) or _CRISIS_STEMS.search(text) is not None)
+
+
+@dataclass
+class ChatTurn:
+    message: str
+    system_prompt: str
+    db: Session
+    llm: Any = None
+    phi2: Any = None
+    cache: Any = None
+    cache_scope: str = SHARED_SCOPE
+    conversation_id: Optional[int] = None
+    user_id: Optional[int] = None
+    detect_emotion: bool = True
+    persist: bool = True
+    # Filled in by the stages
+    messages: List[Dict[str, str]] = field(default_factory=list)
+    prompt_tokens: int = 0
+    response: str = ""
+    model: str = "unavailable"
+    cached: bool = False
+    emotion: Any = None
+    crisis: bool = False
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.timings.items())
+
+
+class Stage(abc.ABC):
+    name = "stage"
+
+    @abc.abstractmethod
+    async def run(self, turn: ChatTurn) -> None:
+        ...
+
+    async def __call__(self, turn: ChatTurn) -> None:
+        start = time.perf_counter()
+        try:
+            await self.run(turn)
+        finally:
+            turn.timings[self.name] = round((time.perf_counter() - start) * 1000, 1)
+
+
+class Parallel(Stage):
+    """Run independent stages concurrently; the first failure cancels the rest."""
+
+    def __init__(self, *stages: Stage, name: str = "parallel") -> None:
+        self.stages = stages
+        self.name = name
+
+    async def run(self, turn: ChatTurn) -> None:
+        tasks = [asyncio.ensure_future(stage(turn)) for stage in self.stages]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+
+class ContextStage(Stage):
+    name = "context"
+
+    def __init__(self, history: bool = True) -> None:
+        self.history = history
+
+    async def run(self, turn: ChatTurn) -> None:
+        builder = get_context_builder()
+        turn.conversation_id = builder.authorize(turn.db, turn.conversation_id, turn.user_id)
+        if self.history:
+            turn.messages = builder.build(turn.db, turn.conversation_id, turn.system_prompt, turn.message)
+        else:
+            turn.messages = [
+                {"role": "system", "content": turn.system_prompt},
+                {"role": "user", "content": turn.message},
+            ]
+        turn.prompt_tokens = get_token_counter().count_messages(turn.messages)
+
+
+class LLMStage(Stage):
+    """Cache lookup, then the routed LLM call. With `error_text` set, failures
+    become a reply (formatted with the error); otherwise they propagate."""
+
+    name = "llm"
+
+    def __init__(
+        self,
+        *,
+        prefer: Optional[str] = None,
+        params: Optional[Dict[str, Any]] = None,
+        unavailable_text: str = "Sorry, the AI service is not currently available. Please try again later.",
+        empty_text: str = "I received your message but couldn't generate a response. Please try again.",
+        error_text: Optional[str] = None,
+    ) -> None:
+        self.prefer = prefer
+        self.params = params or {}
+        self.unavailable_text = unavailable_text
+        self.empty_text = empty_text
+        self.error_text = error_text
+
+    async def run(self, turn: ChatTurn) -> None:
+        llm = turn.llm
+        if not llm:
+            logger.warning("No LLM service available")
+            turn.response = self.unavailable_text
+            return
+        try:
+            lookup = None
+            if turn.cache:
+                cache_model = getattr(llm, "cache_name", None) or llm.model
+                lookup = await turn.cache.lookup(turn.messages, model=cache_model, scope=turn.cache_scope)
+            if lookup and lookup.hit:
+                logger.info(f"Response cache {lookup.hit} hit (similarity={lookup.similarity:.3f})")
+                turn.response, turn.model, turn.cached = lookup.response, lookup.model, True
+            else:
+                result = await llm.complete(turn.messages, prefer=self.prefer, **self.params)
+                logger.info(f"LLM reply from {result.provider} in {result.latency_ms}ms{' (hedged)' if result.hedged else ''}")
+                turn.response, turn.model = result.content, result.model
+                if lookup and turn.response:
+                    turn.cache.store(lookup, turn.response, model=turn.model)
+            if not turn.response:
+                logger.warning("LLM returned empty response")
+                turn.response = self.empty_text
+        except Exception as e:
+            logger.error(f"LLM call failed: {e}", exc_info=True)
+            if self.error_text is None:
+                raise
+            turn.response = self.error_text.format(error=str(e)[:100])
+
+
+class EmotionStage(Stage):
+    name = "emotion"
+
+    async def run(self, turn: ChatTurn) -> None:
+        if not (turn.phi2 and turn.detect_emotion):
+            return
+        try:
+            turn.emotion = await turn.phi2.detect_emotion(turn.message)
+        except Exception:
+            turn.emotion = None
+
+
+class CrisisStage(Stage):
+    name = "crisis"
+
+    async def run(self, turn: ChatTurn) -> None:
+        turn.crisis = is_crisis(turn.message)
+
+
+class PersistStage(Stage):
+    """Save the turn, update the cached context and schedule a summary fold."""
+
+    name = "persist"
+
+    async def run(self, turn: ChatTurn) -> None:
+        if not turn.persist:
+            return
+        builder = get_context_builder()
+        messages = [builder.message("user", turn.message), builder.message("assistant", turn.response)]
+        usage = None
+        if turn.model != "unavailable":
+            usage = TurnUsage(turn.model, turn.prompt_tokens, messages[1].tokens, cached=turn.cached)
+        turn.conversation_id = await get_chat_store().save_turn(
+            turn.db, turn.conversation_id, messages, user_id=turn.user_id, usage=usage,
+        )
+        builder.append(turn.conversation_id, messages)
+        builder.maybe_fold(turn.conversation_id, turn.llm)
+
+
+class NotifyStage(Stage):
+    """Notify a background job (debounced per conversation) after a real reply."""
+
+    name = "enrich"
+
+    def __init__(self, kind: str) -> None:
+        self.kind = kind
+
+    async def run(self, turn: ChatTurn) -> None:
+        if not (turn.conversation_id and turn.response and turn.model != "unavailable"):
+            return
+        try:
+            get_job_queue().notify(self.kind, turn.conversation_id, {"conversation_id": turn.conversation_id})
+        except Exception as e:
+            logger.error(f"Failed to schedule {self.kind} job: {e}")
+
+
+class ChatPipeline:
+    def __init__(self, stages: List[Stage], name: str = "chat") -> None:
+        self.stages = stages
+        self.name = name
+
+    async def run(self, turn: ChatTurn) -> ChatTurn:
+        start = time.perf_counter()
+        try:
+            for stage in self.stages:
+                await stage(turn)
+        finally:
+            turn.timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+            logger.info(f"{self.name} pipeline timings: {turn.timings}")
+        return turn
@@ -0,0 +1,230 @@
+"""
+Token-budgeted conversation context.
+Each conversation is held as a rolling summary plus the tail of messages
+not yet folded into it. Prompts are assembled newest-first from the tail
+until the budget is spent; once the tail outgrows the budget its oldest
+turns are folded into the summary in the background, so prompt size stays
+constant however long the conversation gets.
+
+Conversation ids come from clients, so callers `authorize` an id against the
+caller before building on it: a conversation belongs to its user, and an
+anonymous one only to anonymous callers.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.conversation import Conversation, ConversationSummary
+from app.models.message import Message
+from app.services.tokens import MESSAGE_OVERHEAD, TokenCounter, get_token_counter
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and Buddy, an AI assistant. "
+    "Extend the existing summary with the new messages. Keep names, facts, preferences, feelings and open "
+    "questions; drop small talk. Reply with the updated summary only, in under {words} words."
+)
+
+
+@dataclass
+class TurnMessage:
+    role: str
+    content: str
+    tokens: int
+    id: Optional[int] = None
+
+
+@dataclass
+class _ConversationState:
+    summary: str = ""
+    summary_tokens: int = 0
+    upto_message_id: int = 0
+    tail: List[TurnMessage] = field(default_factory=list)
+    loaded_at: float = field(default_factory=time.monotonic)
+    folding: bool = False
+    exists: bool = True
+    owner: Optional[int] = None
+
+    @property
+    def tail_tokens(self) -> int:
+        return sum(m.tokens + MESSAGE_OVERHEAD for m in self.tail)
+
+
+class ContextBuilder:
+    def __init__(
+        self,
+        counter: Optional[TokenCounter] = None,
+        max_tokens: Optional[int] = None,
+        summary_max_tokens: Optional[int] = None,
+    ) -> None:
+        self.counter = counter or get_token_counter()
+        self.max_tokens = max_tokens or settings.context_max_tokens
+        self.summary_max_tokens = summary_max_tokens or settings.context_summary_max_tokens
+        self._states: "OrderedDict[int, _ConversationState]" = OrderedDict()
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def history_budget(self) -> int:
+        return max(0, self.max_tokens - self.summary_max_tokens)
+
+    def _load(self, db: Session, conversation_id: int) -> _ConversationState:
+        state = _ConversationState()
+        conv = db.query(Conversation.id, Conversation.user_id).filter(Conversation.id == conversation_id).first()
+        if conv is None:
+            state.exists = False
+            return state
+        state.owner = conv.user_id
+        row = db.query(ConversationSummary).filter(ConversationSummary.conversation_id == conversation_id).first()
+        if row is not None:
+            state.summary = row.summary or ""
+            state.summary_tokens = row.tokens or self.counter.count(state.summary)
+            state.upto_message_id = row.upto_message_id or 0
+        # Only the unsummarised tail is read; folding keeps it bounded
+        msgs = (
+            db.query(Message)
+            .filter(Message.conversation_id == conversation_id, Message.id > state.upto_message_id)
+            .order_by(Message.id.asc())
+            .all()
+        )
+        state.tail = [TurnMessage(role=m.role, content=m.content, tokens=self.counter.count(m.content), id=m.id) for m in msgs]
+        return state
+
+    def _state(self, db: Session, conversation_id: int) -> _ConversationState:
+        state = self._states.get(conversation_id)
+        if state is None or (time.monotonic() - state.loaded_at > settings.context_cache_ttl_s and not state.folding):
+            state = self._load(db, conversation_id)
+            if not state.exists:
+                return state  # not cached: the id may be created later
+            self._states[conversation_id] = state
+        self._states.move_to_end(conversation_id)
+        while len(self._states) > settings.context_cache_size:
+            self._states.popitem(last=False)
+        return state
+
+    def authorize(self, db: Session, conversation_id: Optional[int], user_id: Optional[int]) -> Optional[int]:
+        """`conversation_id` if the caller may continue it, otherwise None (a new conversation)."""
+        if conversation_id is None:
+            return None
+        state = self._state(db, conversation_id)
+        if state.exists and state.owner == user_id:
+            return conversation_id
+        logger.warning(f"Conversation {conversation_id} is not the caller's; starting a new one")
+        return None
+
+    def build(self, db: Session, conversation_id: Optional[int], system_prompt: str, user_message: str) -> List[dict]:
+        """Messages for the next completion: system, summary, as much recent history as fits, the new message.
+        `conversation_id` must have gone through `authorize`."""
+        head = [{"role": "system", "content": system_prompt}]
+        current = {"role": "user", "content": user_message}
+        if conversation_id is None:
+            return head + [current]
+        state = self._state(db, conversation_id)
+        if state.summary:
+            head.append({"role": "system", "content": f"Summary of the earlier conversation:\n{state.summary}"})
+        budget = self.max_tokens - self.counter.count_messages(head) - self.counter.count(user_message) - MESSAGE_OVERHEAD
+        history: List[dict] = []
+        for m in reversed(state.tail):
+            cost = m.tokens + MESSAGE_OVERHEAD
+            if cost > budget:
+                break
+            budget -= cost
+            history.append({"role": m.role, "content": m.content})
+        history.reverse()
+        return head + history + [current]
+
+    def message(self, role: str, content: str) -> TurnMessage:
+        return TurnMessage(role=role, content=content, tokens=self.counter.count(content))
+
+    def append(self, conversation_id: Optional[int], messages: List[TurnMessage]) -> None:
+        """Add a turn's messages to the cached tail (no-op if the conversation is not cached).
+        Messages may still be waiting for their DB id; they are folded only once it is set."""
+        state = self._states.get(conversation_id) if conversation_id is not None else None
+        if state is not None:
+            state.tail.extend(messages)
+
+    def maybe_fold(self, conversation_id: Optional[int], llm=None) -> None:
+        """Schedule a background fold once the tail no longer fits the history budget."""
+        state = self._states.get(conversation_id) if conversation_id is not None else None
+        if state is None or state.folding or state.tail_tokens <= self.history_budget:
+            return
+        state.folding = True
+        task = asyncio.create_task(self._fold(conversation_id, state, llm))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fold(self, conversation_id: int, state: _ConversationState, llm) -> None:
+        try:
+            # Fold down to half the budget so folds happen every few turns, not every turn
+            target = self.history_budget // 2
+            folded: List[TurnMessage] = []
+            remaining = state.tail_tokens
+            for m in state.tail:
+                if remaining <= target or m.id is None:
+                    break
+                folded.append(m)
+                remaining -= m.tokens + MESSAGE_OVERHEAD
+            if not folded:
+                return
+            summary = await self._extend_summary(state.summary, folded, llm)
+            summary_tokens = self.counter.count(summary)
+            upto = folded[-1].id
+
+            db = SessionLocal()
+            try:
+                row = db.query(ConversationSummary).filter(ConversationSummary.conversation_id == conversation_id).first()
+                if row is None:
+                    row = ConversationSummary(conversation_id=conversation_id)
+                    db.add(row)
+                row.summary, row.upto_message_id, row.tokens = summary, upto, summary_tokens
+                db.commit()
+            finally:
+                db.close()
+
+            state.summary, state.summary_tokens, state.upto_message_id = summary, summary_tokens, upto
+            del state.tail[:len(folded)]
+            logger.info(f"Folded {len(folded)} messages into summary of conversation {conversation_id} ({summary_tokens} tokens)")
+        except Exception as e:
+            logger.error(f"Summary fold failed for conversation {conversation_id}: {e}")
+        finally:
+            state.folding = False
+
+    async def _extend_summary(self, summary: str, folded: List[TurnMessage], llm) -> str:
+        transcript = "\n".join(f"{m.role}: {m.content}" for m in folded)
+        if llm is not None:
+            try:
+                prompt = [
+                    {"role": "system", "content": SUMMARY_PROMPT.format(words=int(self.summary_max_tokens * 0.7))},
+                    {"role": "user", "content": f"Existing summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"},
+                ]
+                text = await llm.chat_completion(prompt, temperature=0.2, max_tokens=self.summary_max_tokens)
+                if text:
+                    return self.counter.truncate(text.strip(), self.summary_max_tokens)
+            except Exception as e:
+                logger.warning(f"LLM summary failed, using extractive fallback: {e}")
+        # Extractive fallback: keep the most recent lines that fit
+        lines = [summary] if summary else []
+        lines += [f"{m.role}: {m.content[:200]}" for m in folded]
+        return self.counter.truncate("\n".join(lines), self.summary_max_tokens, keep_end=True)
+
+    def forget(self, conversation_id: int) -> None:
+        self._states.pop(conversation_id, None)
+
+
+_builder: Optional[ContextBuilder] = None
+
+
+def get_context_builder() -> ContextBuilder:
+    global _builder
+    if _builder is None:
+        _builder = ContextBuilder()
+    return _builder
@@ -0,0 +1,78 @@
+"""
+Automatic note generation (Family Tree / key facts) from recent conversation
+turns. Runs as a debounced background job, see services/job_queue.py.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional, Tuple
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.conversation import Conversation
+from app.models.message import Message
+from app.services.topic_repository import SavedNote, get_topic_repository
+
+logger = logging.getLogger(__name__)
+
+JOB_KIND = "conversation_notes"
+
+NOTES_PROMPT = (
+    "You are a helpful assistant that extracts key information from conversations to build a 'Family Tree' "
+    "and structured notes. Extract names, relationships, key facts, and important context. Return the result "
+    "as a concise summary formatted as a Markdown note with headings like # Family Tree, # Key Facts, # Context."
+)
+
+
+def _history(conversation_id: int) -> Tuple[Optional[int], str]:
+    """(owner, transcript of the recent turns); runs in a worker thread."""
+    db = SessionLocal()
+    try:
+        # Everything since the last run fits in the window: a run happens at least every N turns
+        limit = max(10, settings.note_jobs_every_turns * 2)
+        msgs = (
+            db.query(Message)
+            .filter(Message.conversation_id == conversation_id)
+            .order_by(Message.id.desc())
+            .limit(limit)
+            .all()
+        )
+        owner = db.query(Conversation.user_id).filter(Conversation.id == conversation_id).scalar()
+        return owner, "\n".join(f"{m.role}: {m.content}" for m in reversed(msgs))
+    finally:
+        db.close()
+
+
+def _save(owner: Optional[int], title: str, content: str) -> SavedNote:
+    """Save with a session of its own; runs in a worker thread (dedup lookups and a
+    first-use keyphrase corpus scan must not hold up the event loop)."""
+    db = SessionLocal()
+    try:
+        # Successive runs mostly restate the previous summary: fold them into one note
+        return get_topic_repository().save_notes(
+            db, [(title, content, ["Family Tree"])], user_id=owner,
+            policy=settings.dedup_conversation_policy, threshold=settings.dedup_conversation_threshold,
+        )[0]
+    finally:
+        db.close()
+
+
+async def generate_conversation_notes(llm, conversation_id: int) -> None:
+    if llm is None:
+        return
+    owner, history_text = await asyncio.to_thread(_history, conversation_id)
+    if not history_text:
+        return
+    prompt = [
+        {"role": "system", "content": NOTES_PROMPT},
+        {"role": "user", "content": f"Analyze this conversation and extract key notes:\n\n{history_text}"},
+    ]
+    note_content = await llm.chat_completion(prompt)
+    if not note_content:
+        return
+
+    title = f"Conversation Notes - {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+    saved = await asyncio.to_thread(_save, owner, title, note_content)
+    logger.info(f"Generated notes for conversation {conversation_id} ({saved.action})")
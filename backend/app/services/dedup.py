@@ -0,0 +1,349 @@
+"""
+Near-duplicate detection for notes.
+Every saved note gets a signature: a SHA-256 of its normalised text for exact
+duplicates and a 128-value MinHash over word 3-shingles for near duplicates.
+The MinHash is cut into 32 bands of 4 values; each band is hashed into a
+bucket stored in note_lsh_buckets, so candidates are found with one indexed
+lookup instead of comparing against every note. Candidates are confirmed by
+their estimated Jaccard similarity.
+
+What happens to a duplicate is decided by TopicRepository.save_notes:
+skip it, merge it into the existing note, or keep it as a new version.
+Notes saved before signatures existed are backfilled and folded together by
+the one-off compaction:
+    python -m app.services.dedup --compact [--dry-run] [--user-id N]
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import re
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np  # type: ignore
+except Exception:  # pragma: no cover
+    np = None  # type: ignore
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.dedup import NoteBucket, NoteSignature
+from app.models.note import Note, note_topic
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 128
+BANDS = 32
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_WORDS = 3
+POLICIES = ("skip", "merge", "version", "off")
+
+_PRIME = (1 << 31) - 1
+
+
+def _permutations() -> Tuple[List[int], List[int]]:
+    # Fixed seed: stored signatures must stay comparable across restarts
+    digest = hashlib.shake_256(b"buddy-minhash").digest(8 * NUM_PERM)
+    values = [int.from_bytes(digest[i:i + 4], "little") for i in range(0, len(digest), 4)]
+    return [v % (_PRIME - 1) + 1 for v in values[:NUM_PERM]], [v % _PRIME for v in values[NUM_PERM:]]
+
+
+_A, _B = _permutations()
+_WORD = re.compile(r"\w+", re.UNICODE)
+_IN_CHUNK = 500
+
+
+def normalize(text: str) -> List[str]:
+    return [w.lower() for w in _WORD.findall(text or "")]
+
+
+def _shingles(words: List[str]) -> List[int]:
+    if len(words) < SHINGLE_WORDS:
+        grams = [" ".join(words)] if words else [""]
+    else:
+        grams = [" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)]
+    return sorted({zlib.crc32(g.encode("utf-8")) for g in grams})
+
+
+def _minhash(shingles: List[int]) -> List[int]:
+    if np is not None:
+        x = np.array(shingles, dtype=np.uint64)
+        a = np.array(_A, dtype=np.uint64)[:, None]
+        b = np.array(_B, dtype=np.uint64)[:, None]
+        return ((a * x[None, :] + b) % _PRIME).min(axis=1).tolist()
+    return [min((a * x + b) % _PRIME for x in shingles) for a, b in zip(_A, _B)]
+
+
+@dataclass
+class Signature:
+    content_hash: str
+    minhash: List[int]
+    buckets: List[int] = field(default_factory=list)
+
+    @classmethod
+    def of(cls, text: str) -> "Signature":
+        words = normalize(text)
+        minhash = _minhash(_shingles(words))
+        buckets = []
+        for band in range(BANDS):
+            values = minhash[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+            digest = hashlib.blake2b(f"{band}:{values}".encode(), digest_size=8).digest()
+            buckets.append(int.from_bytes(digest, "little", signed=True))
+        return cls(hashlib.sha256(" ".join(words).encode("utf-8")).hexdigest(), minhash, buckets)
+
+    def packed(self) -> bytes:
+        return b"".join(v.to_bytes(4, "little") for v in self.minhash)
+
+    def similarity(self, other: Sequence[int]) -> float:
+        """Estimated Jaccard similarity of the two shingle sets."""
+        return sum(1 for x, y in zip(self.minhash, other) if x == y) / NUM_PERM
+
+
+def unpack(raw: bytes) -> List[int]:
+    return [int.from_bytes(raw[i:i + 4], "little") for i in range(0, len(raw), 4)]
+
+
+@dataclass
+class Duplicate:
+    note_id: int
+    similarity: float
+    root: int  # first note of the version chain the duplicate belongs to
+
+
+def _chunks(values: List, size: int = _IN_CHUNK):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+class NoteDeduplicator:
+    def __init__(self) -> None:
+        self.checked = 0
+        self.exact = 0
+        self.near = 0
+
+    def find(self, db: Session, user_id: Optional[int], signatures: List[Signature], threshold: float) -> List[Optional[Duplicate]]:
+        """The best stored duplicate of each signature among the user's notes, or None."""
+        uid = user_id or 0
+        self.checked += len(signatures)
+        exact: Dict[str, Tuple[int, Optional[int]]] = {}
+        hashes = list({s.content_hash for s in signatures})
+        for chunk in _chunks(hashes):
+            for note_id, content_hash, version_of in (
+                db.query(NoteSignature.note_id, NoteSignature.content_hash, NoteSignature.version_of)
+                .filter(NoteSignature.user_id == uid, NoteSignature.content_hash.in_(chunk))
+                .order_by(NoteSignature.note_id)
+            ):
+                exact.setdefault(content_hash, (note_id, version_of))
+
+        by_bucket: Dict[int, List[int]] = defaultdict(list)
+        buckets = list({b for s in signatures if s.content_hash not in exact for b in s.buckets})
+        for chunk in _chunks(buckets):
+            for note_id, bucket in (
+                db.query(NoteBucket.note_id, NoteBucket.bucket)
+                .join(NoteSignature, NoteSignature.note_id == NoteBucket.note_id)
+                .filter(NoteSignature.user_id == uid, NoteBucket.bucket.in_(chunk))
+            ):
+                by_bucket[bucket].append(note_id)
+        candidates: Dict[int, Tuple[List[int], Optional[int]]] = {}
+        ids = list({i for ids in by_bucket.values() for i in ids})
+        for chunk in _chunks(ids):
+            for note_id, raw, version_of in db.query(NoteSignature.note_id, NoteSignature.minhash, NoteSignature.version_of).filter(NoteSignature.note_id.in_(chunk)):
+                candidates[note_id] = (unpack(raw), version_of)
+
+        found: List[Optional[Duplicate]] = []
+        for sig in signatures:
+            hit = exact.get(sig.content_hash)
+            if hit is not None:
+                self.exact += 1
+                found.append(Duplicate(hit[0], 1.0, hit[1] or hit[0]))
+                continue
+            best: Optional[Duplicate] = None
+            for note_id in {i for b in sig.buckets for i in by_bucket.get(b, ())}:
+                minhash, version_of = candidates[note_id]
+                sim = sig.similarity(minhash)
+                if sim >= threshold and (best is None or sim > best.similarity or (sim == best.similarity and note_id < best.note_id)):
+                    best = Duplicate(note_id, sim, version_of or note_id)
+            if best is not None:
+                self.near += 1
+            found.append(best)
+        return found
+
+    @staticmethod
+    def index(db: Session, entries: Iterable[Tuple[int, Optional[int], Signature, Optional[int]]]) -> None:
+        """Store signatures for (note_id, user_id, signature, version_of) entries (not committed)."""
+        entries = list(entries)
+        if not entries:
+            return
+        db.execute(NoteSignature.__table__.insert(), [
+            {"note_id": note_id, "user_id": user_id or 0, "content_hash": sig.content_hash, "minhash": sig.packed(), "version_of": version_of}
+            for note_id, user_id, sig, version_of in entries
+        ])
+        db.execute(NoteBucket.__table__.insert(), [
+            {"note_id": note_id, "band": band, "bucket": bucket}
+            for note_id, _, sig, _ in entries
+            for band, bucket in enumerate(sig.buckets)
+        ])
+
+    @staticmethod
+    def reindex(db: Session, note_id: int, sig: Signature) -> None:
+        """Point an existing note's signature at new content (not committed)."""
+        db.query(NoteSignature).filter(NoteSignature.note_id == note_id).update(
+            {NoteSignature.content_hash: sig.content_hash, NoteSignature.minhash: sig.packed()}, synchronize_session=False
+        )
+        db.query(NoteBucket).filter(NoteBucket.note_id == note_id).delete(synchronize_session=False)
+        db.execute(NoteBucket.__table__.insert(), [{"note_id": note_id, "band": b, "bucket": k} for b, k in enumerate(sig.buckets)])
+
+    @staticmethod
+    def forget(db: Session, note_ids: List[int]) -> None:
+        for chunk in _chunks(note_ids):
+            db.query(NoteBucket).filter(NoteBucket.note_id.in_(chunk)).delete(synchronize_session=False)
+            db.query(NoteSignature).filter(NoteSignature.note_id.in_(chunk)).delete(synchronize_session=False)
+
+    def backfill(self, db: Session, batch: int = 500) -> int:
+        """Sign notes saved before signatures existed; returns how many were added."""
+        added = 0
+        after = 0
+        while True:
+            rows = (
+                db.query(Note.id, Note.user_id, Note.content)
+                .outerjoin(NoteSignature, NoteSignature.note_id == Note.id)
+                .filter(NoteSignature.note_id.is_(None), Note.id > after)
+                .order_by(Note.id)
+                .limit(batch)
+                .all()
+            )
+            if not rows:
+                return added
+            self.index(db, [(r.id, r.user_id, Signature.of(r.content or ""), None) for r in rows])
+            db.commit()
+            added += len(rows)
+            after = rows[-1].id
+
+    def compact(self, db: Session, user_id: Optional[int] = None, threshold: Optional[float] = None, dry_run: bool = False) -> dict:
+        """Fold duplicate notes into the oldest note of each group: it keeps its id,
+        takes the newest content and gains every topic of the group; the rest are
+        deleted. Notes kept deliberately as versions are left alone."""
+        from app.services.keyphrases import get_keyphrase_engine
+
+        threshold = threshold or settings.dedup_threshold
+        report = {"backfilled": self.backfill(db), "groups": 0, "removed": 0}
+        scopes = [user_id or 0] if user_id is not None else [u for (u,) in db.query(NoteSignature.user_id).distinct()]
+        for uid in scopes:
+            groups = self._duplicate_groups(db, uid, threshold)
+            report["groups"] += len(groups)
+            report["removed"] += sum(len(dups) for dups in groups.values())
+            if dry_run or not groups:
+                continue
+            for keep_id, dup_ids in groups.items():
+                keep = db.get(Note, keep_id)
+                removed = [c for (c,) in db.query(Note.content).filter(Note.id.in_(dup_ids)).order_by(Note.id)]
+                newest = removed[-1]
+                added = []
+                if newest != keep.content:
+                    removed.append(keep.content)
+                    added.append(newest)
+                # Keep the keyphrase document frequencies in step with the surviving notes
+                delta = get_keyphrase_engine().record(db, None if uid == 0 else uid, added, removed=removed)
+                if added:
+                    keep.content = newest
+                    self.reindex(db, keep_id, Signature.of(newest))
+                topic_ids = {t for (t,) in db.query(note_topic.c.topic_id).filter(note_topic.c.note_id.in_(dup_ids + [keep_id]))}
+                have = {t for (t,) in db.query(note_topic.c.topic_id).filter(note_topic.c.note_id == keep_id)}
+                if topic_ids - have:
+                    db.execute(note_topic.insert(), [{"note_id": keep_id, "topic_id": t} for t in topic_ids - have])
+                db.execute(note_topic.delete().where(note_topic.c.note_id.in_(dup_ids)))
+                self.forget(db, dup_ids)
+                db.query(Note).filter(Note.id.in_(dup_ids)).delete(synchronize_session=False)
+                db.commit()
+                get_keyphrase_engine().apply(delta)
+        logger.info(f"Note compaction{' (dry run)' if dry_run else ''}: {report}")
+        return report
+
+    @staticmethod
+    def _duplicate_groups(db: Session, uid: int, threshold: float) -> Dict[int, List[int]]:
+        keep_by_hash: Dict[str, int] = {}
+        keep_minhash: Dict[int, List[int]] = {}
+        keep_by_bucket: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        groups: Dict[int, List[int]] = defaultdict(list)
+        versioned = {r for (r,) in db.query(NoteSignature.version_of).filter(NoteSignature.user_id == uid, NoteSignature.version_of.isnot(None))}
+        rows = (
+            db.query(NoteSignature.note_id, NoteSignature.content_hash, NoteSignature.minhash, NoteSignature.version_of)
+            .filter(NoteSignature.user_id == uid)
+            .order_by(NoteSignature.note_id)
+            .yield_per(1000)
+        )
+        for note_id, content_hash, raw, version_of in rows:
+            if version_of is not None or note_id in versioned:
+                continue
+            minhash = unpack(raw)
+            target = keep_by_hash.get(content_hash)
+            if target is None:
+                sig = Signature(content_hash, minhash)
+                best = 0.0
+                bands = [(b, tuple(minhash[b * ROWS_PER_BAND:(b + 1) * ROWS_PER_BAND])) for b in range(BANDS)]
+                for cand in {i for band in bands for i in keep_by_bucket.get(band, ())}:
+                    sim = sig.similarity(keep_minhash[cand])
+                    if sim >= threshold and sim > best:
+                        target, best = cand, sim
+            if target is not None:
+                groups[target].append(note_id)
+                continue
+            keep_by_hash[content_hash] = note_id
+            keep_minhash[note_id] = minhash
+            for b in range(BANDS):
+                keep_by_bucket[(b, tuple(minhash[b * ROWS_PER_BAND:(b + 1) * ROWS_PER_BAND]))].append(note_id)
+        return dict(groups)
+
+    def stats(self) -> dict:
+        return {"checked": self.checked, "exact_duplicates": self.exact, "near_duplicates": self.near}
+
+
+def backfill_signatures() -> int:
+    """Sign any unsigned notes with a session of its own (run off the event loop)."""
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        return get_deduplicator().backfill(db)
+    except Exception as e:
+        logger.error(f"Note signature backfill failed: {e}")
+        return 0
+    finally:
+        db.close()
+
+
+_deduplicator: Optional[NoteDeduplicator] = None
+
+
+def get_deduplicator() -> NoteDeduplicator:
+    global _deduplicator
+    if _deduplicator is None:
+        _deduplicator = NoteDeduplicator()
+    return _deduplicator
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Find and fold duplicate notes")
+    parser.add_argument("--compact", action="store_true", help="merge duplicate notes (default: only sign unsigned notes)")
+    parser.add_argument("--dry-run", action="store_true", help="report what --compact would merge")
+    parser.add_argument("--user-id", type=int, default=None, help="only this user's notes (0 for notes without an owner)")
+    parser.add_argument("--threshold", type=float, default=None, help=f"Jaccard similarity (default {settings.dedup_threshold})")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    from app.database import Base, SessionLocal, engine
+    from app.models import user as _user, note as _note, keyphrase as _keyphrase, dedup as _dedup  # ensure models are imported
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        dedup = get_deduplicator()
+        if args.compact or args.dry_run:
+            print(dedup.compact(session, user_id=args.user_id, threshold=args.threshold, dry_run=args.dry_run))
+        else:
+            print({"backfilled": dedup.backfill(session)})
+    finally:
+        session.close()
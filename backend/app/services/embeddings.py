@@ -0,0 +1,62 @@
+"""
+Local sentence embeddings (sentence-transformers, optional dependency).
+The model is loaded lazily on first use; when it is unavailable every call
+returns None and callers fall back to their non-semantic path.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from typing import Sequence
+
+try:
+    import numpy as np  # type: ignore
+except Exception:  # pragma: no cover
+    np = None  # type: ignore
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_model = None
+_load_failed = False
+_lock = threading.Lock()
+
+
+def _get_model():
+    global _model, _load_failed
+    if _model is not None or _load_failed:
+        return _model
+    with _lock:
+        if _model is None and not _load_failed:
+            try:
+                from sentence_transformers import SentenceTransformer  # type: ignore
+                _model = SentenceTransformer(settings.similarity_model, device="cpu")
+                logger.info(f"Embedding model loaded: {settings.similarity_model}")
+            except Exception as e:
+                logger.warning(f"Embedding model unavailable, semantic features disabled: {e}")
+                _load_failed = True
+    return _model
+
+
+def available() -> bool:
+    return np is not None and not _load_failed
+
+
+def encode(texts: Sequence[str]):
+    """Return an (n, dim) float32 matrix of L2-normalised embeddings, or None."""
+    if np is None:
+        return None
+    model = _get_model()
+    if model is None:
+        return None
+    vecs = model.encode(list(texts), normalize_embeddings=True, convert_to_numpy=True, show_progress_bar=False)
+    return np.asarray(vecs, dtype=np.float32)
+
+
+async def embed(texts: Sequence[str]):
+    """`encode` on a worker thread so model inference never blocks the event loop."""
+    if not available():
+        return None
+    return await asyncio.to_thread(encode, texts)
@@ -1,13 +1,20 @@
 """
 Emotion Organizer Service
-Integrates with existing Buddy AI to add file-based emotional organization
+Integrates with existing Buddy AI to add emotional organization. Entries live
+in an indexed append-only store (services/emotion_store.py); the per-category
+text files are an optional export view.
 """
 from __future__ import annotations
 
+import asyncio
 from pathlib import Path
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 
+from app.config import settings
+from app.services.emotion_store import EmotionStore, get_emotion_store, render_entry
+from app.utils.text_matcher import TextMatcher
+
 
 class SimpleEmotionAnalyzer:
     """
@@ -34,13 +41,22 @@ class SimpleEmotionAnalyzer:
         'achievement': ['finished', 'completed', 'done', 'accomplished', 'achieved', 'succeeded']
     }
 
+    INTENSIFIERS = ['very', 'really', 'extremely', 'so']
+
+    # Every vocabulary above in one matcher: a single scan per message
+    MATCHER = TextMatcher({
+        **{f'emotion:{k}': v for k, v in EMOTION_KEYWORDS.items()},
+        **{f'intent:{k}': v for k, v in INTENT_KEYWORDS.items()},
+        'intensifier': INTENSIFIERS,
+    })
+
     def analyze(self, text: str) -> Dict:
-        text_lower = text.lower()
+        found = self.MATCHER.categories(text)
 
         # emotion
         emotion_scores: Dict[str, int] = {}
-        for emotion, words in self.EMOTION_KEYWORDS.items():
-            score = sum(1 for w in words if w in text_lower)
+        for emotion in self.EMOTION_KEYWORDS:
+            score = len(found.get(f'emotion:{emotion}', ()))
             if score:
                 emotion_scores[emotion] = score
 
@@ -48,7 +64,7 @@ class SimpleEmotionAnalyzer:
             detected = max(emotion_scores, key=emotion_scores.get)
             max_score = emotion_scores[detected]
             confidence = min(95, 50 + max_score * 15)
-            if any(x in text_lower for x in ['very', 'really', 'extremely', 'so']):
+            if 'intensifier' in found:
                 intensity = 'high'
                 confidence = min(95, confidence + 10)
             elif max_score >= 3:
@@ -64,8 +80,8 @@ class SimpleEmotionAnalyzer:
 
         # intent
         intent_scores: Dict[str, int] = {}
-        for intent, words in self.INTENT_KEYWORDS.items():
-            score = sum(1 for w in words if w in text_lower)
+        for intent in self.INTENT_KEYWORDS:
+            score = len(found.get(f'intent:{intent}', ()))
             if score:
                 intent_scores[intent] = score
         intent = max(intent_scores, key=intent_scores.get) if intent_scores else 'general'
@@ -79,17 +95,12 @@ class SimpleEmotionAnalyzer:
 
 
 class EmotionOrganizer:
-    """File-based emotion/intent organization per user."""
+    """Emotion/intent organization per user."""
 
-    def __init__(self, base_path: str = "./user_data") -> None:
+    def __init__(self, base_path: str = "./user_data", store: Optional[EmotionStore] = None) -> None:
         self.base_path = Path(base_path)
-        self.base_path.mkdir(exist_ok=True, parents=True)
         self.analyzer = SimpleEmotionAnalyzer()
-
-    def _user_folder(self, user_id: str) -> Path:
-        p = self.base_path / user_id
-        p.mkdir(exist_ok=True, parents=True)
-        return p
+        self.store = store or get_emotion_store()
 
     def _determine_categories(self, analysis: Dict) -> List[str]:
         cats: List[str] = []
@@ -121,6 +132,14 @@ class EmotionOrganizer:
         # remove dupes
         return list(dict.fromkeys(cats))
 
+    def _export_entry(self, user_id: str, categories: List[str], now: datetime, em: Dict, message: str) -> None:
+        entry = render_entry(now, em['emotion'], em['confidence'], message)
+        for cat in categories:
+            cat_dir = self.base_path / user_id / cat
+            cat_dir.mkdir(parents=True, exist_ok=True)
+            with open(cat_dir / f"{now.strftime('%Y-%m-%d')}.txt", 'a', encoding='utf-8') as f:
+                f.write(entry)
+
     async def organize_message(self, user_id: str, message: str, analysis: Optional[Dict] = None) -> Dict:
         # Normalize inbound analysis payloads from external callers
         if analysis:
@@ -134,37 +153,30 @@ class EmotionOrganizer:
             if isinstance(analysis.get('emotion'), str):
                 analysis = {**analysis, 'emotion': analysis['emotion'].lower()}
         em = analysis if (analysis and 'emotion' in analysis) else self.analyzer.analyze(message)
-        user_dir = self._user_folder(user_id)
         categories = self._determine_categories(em)
-
-        saved_files: List[str] = []
         now = datetime.now()
-        date_str = now.strftime('%Y-%m-%d')
-        time_str = now.strftime('%H:%M:%S')
-        divider = '─' * 80
 
-        for cat in categories:
-            cat_dir = user_dir / cat
-            cat_dir.mkdir(parents=True, exist_ok=True)
-            file_path = cat_dir / f"{date_str}.txt"
-            entry = f"\n[{time_str}] Emotion: {em['emotion'].title()} ({em['confidence']}%)\n{message}\n{divider}\n\n"
-            with open(file_path, 'a', encoding='utf-8') as f:
-                f.write(entry)
-            saved_files.append(str(file_path.relative_to(self.base_path)))
+        await asyncio.to_thread(self.store.append, user_id, em, message, categories, now)
+        if settings.emotion_text_export:
+            await asyncio.to_thread(self._export_entry, user_id, categories, now, em, message)
 
+        date_str = now.strftime('%Y-%m-%d')
         return {
             'user_id': user_id,
             'timestamp': now.isoformat(),
             'emotion': em,
             'categories': categories,
-            'saved_to': saved_files,
+            # Paths in the text view, whether or not it is being written
+            'saved_to': [str(Path(user_id) / cat / f"{date_str}.txt") for cat in categories],
             'message_preview': message[:100],
         }
 
     async def get_emotion_summary(self, user_id: str, days: int = 7) -> Dict:
-        user_dir = self._user_folder(user_id)
-        feelings = user_dir / 'Feelings'
-        if not feelings.exists():
+        # Same window as the day files used to give: every day not entirely before the cutoff
+        cutoff = datetime.now() - timedelta(days=days)
+        since = cutoff.date() + timedelta(days=1) if cutoff.time() > datetime.min.time() else cutoff.date()
+        counts = await asyncio.to_thread(self.store.feelings_summary, user_id, since)
+        if counts is None:
             return {
                 'user_id': user_id,
                 'period_days': days,
@@ -172,27 +184,7 @@ class EmotionOrganizer:
                 'emotions': {},
                 'message': 'No emotional data yet',
             }
-        cutoff = datetime.now() - timedelta(days=days)
-        counts: Dict[str, int] = {}
-        total = 0
-        for sub in feelings.iterdir():
-            if not sub.is_dir():
-                continue
-            emotion_name = sub.name
-            num = 0
-            for txt in sub.glob('*.txt'):
-                try:
-                    d = datetime.strptime(txt.stem, '%Y-%m-%d')
-                    if d < cutoff:
-                        continue
-                    with open(txt, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        num += content.count('─' * 80)
-                except Exception:
-                    continue
-            if num:
-                counts[emotion_name] = num
-                total += num
+        total = sum(counts.values())
         perc = {k: round(v * 100.0 / total, 1) for k, v in counts.items()} if total else {}
         dom = max(counts, key=counts.get) if counts else None
         return {
@@ -204,51 +196,15 @@ class EmotionOrganizer:
             'dominant_emotion': dom,
         }
 
+    async def get_emotion_trends(self, user_id: str, days: int = 30, window: int = 7) -> Dict:
+        from app.services.emotion_trends import emotion_trends
+        agg = await asyncio.to_thread(self.store.aggregates, user_id)
+        return {'user_id': user_id, 'period_days': days, **emotion_trends(agg, days, window)}
+
     async def get_category_list(self, user_id: str) -> List[Dict]:
-        user_dir = self._user_folder(user_id)
-        out: List[Dict] = []
-        if not user_dir.exists():
-            return out
-        for item in user_dir.iterdir():
-            if item.is_dir():
-                count = len(list(item.rglob('*.txt')))
-                out.append({
-                    'name': item.name,
-                    'path': str(item.relative_to(user_dir)),
-                    'file_count': count,
-                    'last_modified': datetime.fromtimestamp(item.stat().st_mtime).isoformat(),
-                })
+        out = await asyncio.to_thread(self.store.category_list, user_id)
         return sorted(out, key=lambda x: x['last_modified'], reverse=True)
 
     async def search_notes(self, user_id: str, keyword: str, category: Optional[str] = None) -> List[Dict]:
-        user_dir = self._user_folder(user_id)
-        results: List[Dict] = []
-        if category:
-            paths = [user_dir / category]
-        else:
-            paths = [user_dir]
-        for p in paths:
-            if not p.exists():
-                continue
-            for txt in p.rglob('*.txt'):
-                try:
-                    with open(txt, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        if keyword.lower() in content.lower():
-                            # simple preview around first match
-                            lower = content.lower()
-                            kpos = lower.find(keyword.lower())
-                            start = max(0, kpos - 150)
-                            end = min(len(content), kpos + len(keyword) + 150)
-                            preview = ('' if start == 0 else '...') + content[start:end] + ('' if end == len(content) else '...')
-                            results.append({
-                                'file': str(txt.relative_to(user_dir)),
-                                'category': txt.parent.name,
-                                'date': txt.stem,
-                                'matches': lower.count(keyword.lower()),
-                                'preview': preview,
-                            })
-                except Exception:
-                    continue
-        results.sort(key=lambda x: x['matches'], reverse=True)
-        return results
\ No newline at end of file
+        """`keyword` holds words that must all occur; alternatives are separated by OR, `word*` matches a prefix."""
+        return await asyncio.to_thread(self.store.search, user_id, keyword, category)
@@ -0,0 +1,161 @@
+"""
+Per-user inverted index over EmotionOrganizer entries.
+Each entry is tokenized once when it is appended; for every distinct token a
+row (user_key, token, entry_id) holds the token's character offsets in the
+entry, varint delta-encoded. The primary key starts with the user, so a
+query reads only the postings of its own terms for one user: the cost
+follows the number of matches, not the size of the journal.
+
+Queries are words, AND-ed by default; `OR` (or `|`) separates alternatives
+and a trailing `*` matches a prefix:
+    deadline stress*          entries with both
+    exam OR interview         entries with either
+Entries are scored with tf-idf over the user's own entries and grouped into
+the day files of the text view; the preview is cut around the stored offset
+of the first hit in the best entry of each file.
+"""
+from __future__ import annotations
+
+import math
+import re
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.emotion import EmotionEntry, EmotionEntryCategory, EmotionPosting
+
+PREVIEW_CHARS = 150
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_QUERY_TERM = re.compile(r"\w+\*?", re.UNICODE)
+_OR = re.compile(r"\s+OR\s+|\|")
+
+
+def entry_body(created_at: datetime, emotion: str, confidence, message: str) -> str:
+    """The searchable text of an entry: its text-view block without the divider."""
+    return f"[{created_at.strftime('%H:%M:%S')}] Emotion: {emotion.title()} ({confidence}%)\n{message}"
+
+
+def tokenize(body: str) -> Dict[str, List[int]]:
+    out: Dict[str, List[int]] = defaultdict(list)
+    for m in _TOKEN.finditer(body):
+        out[m.group().lower()].append(m.start())
+    return out
+
+
+def pack_offsets(offsets: Iterable[int]) -> bytes:
+    buf = bytearray()
+    prev = 0
+    for off in offsets:
+        delta, prev = off - prev, off
+        while delta >= 0x80:
+            buf.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        buf.append(delta)
+    return bytes(buf)
+
+
+def unpack_offsets(data: bytes) -> List[int]:
+    out: List[int] = []
+    value = shift = prev = 0
+    for b in data:
+        value |= (b & 0x7F) << shift
+        if b & 0x80:
+            shift += 7
+            continue
+        prev += value
+        out.append(prev)
+        value = shift = 0
+    return out
+
+
+def posting_rows(user_key: str, entry_id: int, body: str) -> List[Dict]:
+    return [
+        {"user_key": user_key, "token": token, "entry_id": entry_id, "offsets": pack_offsets(offsets)}
+        for token, offsets in tokenize(body).items()
+    ]
+
+
+def parse_query(query: str) -> List[List[str]]:
+    """Alternatives of AND-ed terms, e.g. "a b OR c*" -> [["a", "b"], ["c*"]]."""
+    groups = [[t.lower() for t in _QUERY_TERM.findall(part)] for part in _OR.split(query)]
+    return [g for g in groups if g]
+
+
+# term -> entry_id -> [(offset, length)]
+Postings = Dict[str, Dict[int, List[Tuple[int, int]]]]
+
+
+def _fetch(db: Session, user_key: str, terms: Set[str]) -> Postings:
+    postings: Postings = {}
+    for term in terms:
+        q = db.query(EmotionPosting.token, EmotionPosting.entry_id, EmotionPosting.offsets).filter(EmotionPosting.user_key == user_key)
+        if term.endswith("*"):
+            prefix = term[:-1]
+            q = q.filter(EmotionPosting.token >= prefix, EmotionPosting.token < prefix + "\U0010ffff")
+        else:
+            q = q.filter(EmotionPosting.token == term)
+        hits: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+        for token, entry_id, offsets in q:
+            hits[entry_id].extend((off, len(token)) for off in unpack_offsets(offsets))
+        postings[term] = hits
+    return postings
+
+
+def _preview(body: str, offset: int, length: int) -> str:
+    start = max(0, offset - PREVIEW_CHARS)
+    end = min(len(body), offset + length + PREVIEW_CHARS)
+    return ("" if start == 0 else "...") + body[start:end] + ("" if end == len(body) else "...")
+
+
+def search(db: Session, user_key: str, query: str, category_filter, total_entries: int) -> List[Dict]:
+    """Day files with entries matching `query`, best first. `category_filter(category)`
+    says whether a category is in scope; `total_entries` is the user's entry count."""
+    groups = parse_query(query)
+    if not groups:
+        return []
+    postings = _fetch(db, user_key, {t for g in groups for t in g})
+
+    matched: Set[int] = set()
+    for group in groups:
+        ids = set.intersection(*(set(postings[t]) for t in group))
+        matched |= ids
+    if not matched:
+        return []
+
+    # tf-idf against the user's own entries
+    idf = {t: math.log(1 + max(total_entries, len(p)) / len(p)) for t, p in postings.items() if p}
+    scores: Dict[int, float] = {}
+    hits: Dict[int, List[Tuple[int, int]]] = {}
+    for entry_id in matched:
+        found = [(t, postings[t][entry_id]) for t in postings if entry_id in postings[t]]
+        scores[entry_id] = sum(len(h) * idf[t] for t, h in found)
+        hits[entry_id] = sorted(h for _, hs in found for h in hs)
+
+    files: Dict[Tuple[str, object], List[int]] = defaultdict(list)
+    for entry_id, category, day in db.query(
+        EmotionEntryCategory.entry_id, EmotionEntryCategory.category, EmotionEntryCategory.day
+    ).filter(EmotionEntryCategory.entry_id.in_(matched)):
+        if category_filter(category):
+            files[(category, day)].append(entry_id)
+    if not files:
+        return []
+
+    best = {key: max(ids, key=lambda i: (scores[i], -i)) for key, ids in files.items()}
+    entries = {e.id: e for e in db.query(EmotionEntry).filter(EmotionEntry.id.in_(set(best.values())))}
+    results: List[Dict] = []
+    for (category, day), ids in files.items():
+        entry = entries[best[(category, day)]]
+        offset, length = hits[entry.id][0]
+        results.append({
+            "file": f"{category}/{day.isoformat()}.txt",
+            "category": category.rsplit("/", 1)[-1],
+            "date": day.isoformat(),
+            "matches": sum(len(hits[i]) for i in ids),
+            "score": round(sum(scores[i] for i in ids), 4),
+            "preview": _preview(entry_body(entry.created_at, entry.emotion, entry.confidence, entry.message), offset, length),
+        })
+    results.sort(key=lambda r: (r["score"], r["matches"]), reverse=True)
+    return results
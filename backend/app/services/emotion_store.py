@@ -0,0 +1,480 @@
+"""
+Indexed storage behind EmotionOrganizer.
+Entries are appended to the emotion_entries table (one row per message) with
+the categories they were filed under in emotion_entry_categories, indexed by
+user, category, emotion and day. Each entry is also tokenized into the
+per-user inverted index of services/emotion_search.py, so a search reads the
+postings of its terms and the matching entries only.
+
+Every append also bumps a per-user, per-day, per-emotion counter row in
+emotion_daily (entries, intensity and confidence sums). Summaries and trends
+read those counters through an in-process cache that is loaded once per user
+and updated as entries are appended, so a dashboard poll never touches the
+entries. `rebuild_aggregates` recomputes the counters from the entries after
+a backfill or a manual edit:
+    python -m app.services.emotion_store --rebuild-aggregates [--user NAME]
+    python -m app.services.emotion_store --rebuild-search [--user NAME]
+
+The old text layout, user_data/<user>/<category>/<YYYY-MM-DD>.txt, is now a
+view: `render_file` produces exactly what the organizer used to write, the
+organizer can keep appending to it (EMOTION_TEXT_EXPORT=true) and `export`
+writes it out in full. Existing trees are imported with:
+    python -m app.services.emotion_store --migrate ./user_data
+    python -m app.services.emotion_store --export ./user_data_export
+"""
+from __future__ import annotations
+
+import logging
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.config import settings
+from app.database import Base, engine as default_engine
+from app.models.emotion import EmotionDaily, EmotionEntry, EmotionEntryCategory, EmotionPosting
+from app.services import emotion_search
+from app.services.emotion_search import entry_body
+
+logger = logging.getLogger(__name__)
+
+DIVIDER = "─" * 80
+FEELINGS = "Feelings"
+
+_ENTRY = re.compile(r"\[(\d{2}:\d{2}:\d{2})\] Emotion: (.*?) \((.*?)%\)\n(.*)", re.DOTALL)
+_DAY_FILE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+INTENSITY_LEVELS = {"low": 1, "medium": 2, "high": 3}
+
+
+def render_entry(created_at: datetime, emotion: str, confidence, message: str) -> str:
+    """One entry exactly as the text files hold it."""
+    return f"\n[{created_at.strftime('%H:%M:%S')}] Emotion: {emotion.title()} ({confidence}%)\n{message}\n{DIVIDER}\n\n"
+
+
+def _in_category(category: str, prefix: Optional[str]) -> bool:
+    if not prefix:
+        return True
+    prefix = prefix.strip("/")
+    return category == prefix or category.startswith(prefix + "/")
+
+
+def _confidence(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class DayCounts:
+    """Counters of one emotion_daily row."""
+    feeling: Optional[str] = None
+    entries: int = 0
+    intensity_sum: int = 0
+    intensity_n: int = 0
+    confidence_sum: float = 0.0
+    confidence_n: int = 0
+
+    @classmethod
+    def of(cls, feeling: Optional[str], intensity: Optional[str], confidence) -> "DayCounts":
+        level = INTENSITY_LEVELS.get(str(intensity or "").lower())
+        conf = _confidence(confidence)
+        return cls(
+            feeling=feeling,
+            entries=1,
+            intensity_sum=level or 0,
+            intensity_n=1 if level else 0,
+            confidence_sum=conf or 0.0,
+            confidence_n=0 if conf is None else 1,
+        )
+
+    def add(self, other: "DayCounts") -> None:
+        self.feeling = self.feeling or other.feeling
+        self.entries += other.entries
+        self.intensity_sum += other.intensity_sum
+        self.intensity_n += other.intensity_n
+        self.confidence_sum += other.confidence_sum
+        self.confidence_n += other.confidence_n
+
+    def counters(self) -> Dict:
+        return {
+            "entries": self.entries,
+            "intensity_sum": self.intensity_sum,
+            "intensity_n": self.intensity_n,
+            "confidence_sum": self.confidence_sum,
+            "confidence_n": self.confidence_n,
+        }
+
+
+@dataclass
+class UserAggregates:
+    by_day: Dict[date, Dict[str, DayCounts]] = field(default_factory=dict)
+    has_feelings: bool = False
+    entries: int = 0
+
+    def add(self, day: date, emotion: str, counts: DayCounts) -> None:
+        self.by_day.setdefault(day, {}).setdefault(emotion, DayCounts()).add(counts)
+        self.entries += counts.entries
+        self.has_feelings = self.has_feelings or bool(counts.feeling)
+
+
+@dataclass
+class DayFile:
+    category: str
+    day: date
+    text: str
+
+    @property
+    def name(self) -> str:
+        return f"{self.category}/{self.day.isoformat()}.txt"
+
+
+class EmotionStore:
+    def __init__(self, engine: Optional[Engine] = None) -> None:
+        self.engine = engine or default_engine
+        self._session = sessionmaker(bind=self.engine, autoflush=False, autocommit=False)
+        Base.metadata.create_all(bind=self.engine, tables=[
+            EmotionEntry.__table__, EmotionEntryCategory.__table__, EmotionDaily.__table__, EmotionPosting.__table__,
+        ])
+        if self.engine.dialect.name == "sqlite":
+            with self.engine.begin() as conn:
+                # Trigram index of the first version of this store, replaced by emotion_postings
+                conn.execute(text("DROP TABLE IF EXISTS emotion_entries_fts"))
+        # Held across commit + cache update so a concurrent lazy load never counts an entry twice
+        self._lock = threading.Lock()
+        self._aggregates: "OrderedDict[str, UserAggregates]" = OrderedDict()
+        self.aggregate_hits = 0
+        self.aggregate_loads = 0
+
+    # -- writes ------------------------------------------------------------------
+    def append(self, user_key: str, analysis: Dict, message: str, categories: List[str], when: Optional[datetime] = None) -> int:
+        when = when or datetime.now()
+        db = self._session()
+        try:
+            entry_id, emotion, delta = self._append(db, user_key, analysis, message, categories, when)
+            with self._lock:
+                db.commit()
+                cached = self._aggregates.get(user_key)
+                if cached is not None:
+                    cached.add(when.date(), emotion, delta)
+            return entry_id
+        finally:
+            db.close()
+
+    def _append(self, db: Session, user_key: str, analysis: Dict, message: str, categories: Iterable[str], when: datetime) -> Tuple[int, str, DayCounts]:
+        categories = list(dict.fromkeys(categories))
+        emotion = str(analysis.get("emotion") or "neutral").lower()
+        confidence = analysis.get("confidence")
+        entry = EmotionEntry(
+            user_key=user_key,
+            emotion=emotion,
+            confidence=None if confidence is None else str(confidence),
+            intensity=analysis.get("intensity"),
+            intent=analysis.get("intent"),
+            message=message,
+            created_at=when,
+            day=when.date(),
+        )
+        db.add(entry)
+        db.flush()
+        if categories:
+            db.execute(EmotionEntryCategory.__table__.insert(), [
+                {"entry_id": entry.id, "category": c, "user_key": user_key, "day": entry.day} for c in categories
+            ])
+        db.execute(EmotionPosting.__table__.insert(), emotion_search.posting_rows(
+            user_key, entry.id, entry_body(when, emotion, entry.confidence, message)
+        ))
+        feeling = next((c.split("/", 1)[1] for c in categories if c.startswith(FEELINGS + "/")), None)
+        delta = DayCounts.of(feeling, entry.intensity, confidence)
+        self._bump(db, user_key, entry.day, emotion, delta)
+        return entry.id, emotion, delta
+
+    def _bump(self, db: Session, user_key: str, day: date, emotion: str, delta: DayCounts) -> None:
+        row = {"user_key": user_key, "day": day, "emotion": emotion, "feeling": delta.feeling, **delta.counters()}
+        dialect = db.get_bind().dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            if dialect == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            stmt = insert(EmotionDaily)
+            increments = {k: getattr(EmotionDaily, k) + getattr(stmt.excluded, k) for k in delta.counters()}
+            increments["feeling"] = func.coalesce(EmotionDaily.feeling, stmt.excluded.feeling)
+            db.execute(stmt.on_conflict_do_update(index_elements=["user_key", "day", "emotion"], set_=increments), [row])
+            return
+        key = (EmotionDaily.user_key == user_key, EmotionDaily.day == day, EmotionDaily.emotion == emotion)
+        current = db.query(EmotionDaily).filter(*key).first()
+        if current is None:
+            db.add(EmotionDaily(**row))
+            return
+        for k, v in delta.counters().items():
+            setattr(current, k, getattr(current, k) + v)
+        current.feeling = current.feeling or delta.feeling
+
+    # -- aggregates ----------------------------------------------------------------
+    def aggregates(self, user_key: str) -> UserAggregates:
+        """The user's daily counters, loaded from emotion_daily on first use."""
+        with self._lock:
+            cached = self._aggregates.get(user_key)
+            if cached is not None:
+                self._aggregates.move_to_end(user_key)
+                self.aggregate_hits += 1
+                return cached
+            db = self._session()
+            try:
+                agg = UserAggregates()
+                for row in db.query(EmotionDaily).filter(EmotionDaily.user_key == user_key):
+                    agg.add(row.day, row.emotion, DayCounts(
+                        row.feeling, row.entries, row.intensity_sum, row.intensity_n, row.confidence_sum, row.confidence_n
+                    ))
+            finally:
+                db.close()
+            self._aggregates[user_key] = agg
+            self.aggregate_loads += 1
+            while len(self._aggregates) > settings.emotion_aggregate_cache_users:
+                self._aggregates.popitem(last=False)
+            return agg
+
+    def rebuild_aggregates(self, user_key: Optional[str] = None) -> int:
+        """Recompute emotion_daily from the entries (all users or one); returns rows written."""
+        db = self._session()
+        try:
+            feelings = EmotionEntryCategory.category.like(f"{FEELINGS}/%")
+            q = db.query(
+                EmotionEntry.user_key, EmotionEntry.day, EmotionEntry.emotion, EmotionEntry.intensity,
+                EmotionEntry.confidence, EmotionEntryCategory.category,
+            ).outerjoin(EmotionEntryCategory, (EmotionEntryCategory.entry_id == EmotionEntry.id) & feelings)
+            rows_q = db.query(EmotionDaily)
+            if user_key is not None:
+                q = q.filter(EmotionEntry.user_key == user_key)
+                rows_q = rows_q.filter(EmotionDaily.user_key == user_key)
+            # Appends commit under the same lock: none can land between the scan and the swap
+            with self._lock:
+                totals: Dict[Tuple[str, date, str], DayCounts] = defaultdict(DayCounts)
+                for user, day, emotion, intensity, confidence, category in q.yield_per(5000):
+                    feeling = category.split("/", 1)[1] if category else None
+                    totals[(user, day, emotion)].add(DayCounts.of(feeling, intensity, confidence))
+                rows_q.delete(synchronize_session=False)
+                if totals:
+                    db.execute(EmotionDaily.__table__.insert(), [
+                        {"user_key": u, "day": d, "emotion": e, "feeling": c.feeling, **c.counters()}
+                        for (u, d, e), c in totals.items()
+                    ])
+                db.commit()
+                if user_key is None:
+                    self._aggregates.clear()
+                else:
+                    self._aggregates.pop(user_key, None)
+            logger.info(f"Rebuilt emotion aggregates for {user_key or 'all users'}: {len(totals)} rows")
+            return len(totals)
+        finally:
+            db.close()
+
+    def rebuild_search_index(self, user_key: Optional[str] = None) -> int:
+        """Re-tokenize the entries (all users or one) into emotion_postings; returns entries indexed."""
+        db = self._session()
+        try:
+            q = db.query(EmotionEntry).order_by(EmotionEntry.id)
+            postings = db.query(EmotionPosting)
+            if user_key is not None:
+                q = q.filter(EmotionEntry.user_key == user_key)
+                postings = postings.filter(EmotionPosting.user_key == user_key)
+            postings.delete(synchronize_session=False)
+            indexed = 0
+            batch: List[Dict] = []
+            for e in q.yield_per(1000):
+                batch.extend(emotion_search.posting_rows(e.user_key, e.id, entry_body(e.created_at, e.emotion, e.confidence, e.message)))
+                indexed += 1
+                if len(batch) >= 5000:
+                    db.execute(EmotionPosting.__table__.insert(), batch)
+                    batch = []
+            if batch:
+                db.execute(EmotionPosting.__table__.insert(), batch)
+            db.commit()
+            logger.info(f"Rebuilt emotion search index for {user_key or 'all users'}: {indexed} entries")
+            return indexed
+        finally:
+            db.close()
+
+    def backfill(self) -> Dict[str, int]:
+        """Build counters and postings once for entries stored before they existed (run off the event loop)."""
+        db = self._session()
+        try:
+            has_entries = db.query(EmotionEntry.id).first() is not None
+            missing_aggregates = has_entries and db.query(EmotionDaily.user_key).first() is None
+            missing_postings = has_entries and db.query(EmotionPosting.entry_id).first() is None
+        finally:
+            db.close()
+        report = {"aggregates": 0, "indexed": 0}
+        try:
+            if missing_aggregates:
+                report["aggregates"] = self.rebuild_aggregates()
+            if missing_postings:
+                report["indexed"] = self.rebuild_search_index()
+        except Exception as e:
+            logger.error(f"Emotion store backfill failed: {e}")
+        return report
+
+    def aggregate_stats(self) -> Dict:
+        return {"cached_users": len(self._aggregates), "hits": self.aggregate_hits, "loads": self.aggregate_loads}
+
+    # -- reads -------------------------------------------------------------------
+    def feelings_summary(self, user_key: str, since: date) -> Optional[Dict[str, int]]:
+        """Entries per Feelings sub-category from `since` on; None if the user never had one."""
+        agg = self.aggregates(user_key)
+        if not agg.has_feelings:
+            return None
+        counts: Dict[str, int] = defaultdict(int)
+        for day, emotions in agg.by_day.items():
+            if day < since:
+                continue
+            for c in emotions.values():
+                if c.feeling:
+                    counts[c.feeling] += c.entries
+        return dict(counts)
+
+    def category_list(self, user_key: str) -> List[Dict]:
+        """Top-level categories with their number of day files and latest entry."""
+        db = self._session()
+        try:
+            rows = (
+                db.query(EmotionEntryCategory.category, func.count(func.distinct(EmotionEntryCategory.day)), func.max(EmotionEntry.created_at))
+                .join(EmotionEntry, EmotionEntry.id == EmotionEntryCategory.entry_id)
+                .filter(EmotionEntryCategory.user_key == user_key)
+                .group_by(EmotionEntryCategory.category)
+            )
+            tops: Dict[str, List] = {}
+            for category, files, last in rows:
+                top = category.split("/", 1)[0]
+                agg = tops.setdefault(top, [0, last])
+                agg[0] += files
+                agg[1] = max(agg[1], last)
+            return [
+                {"name": top, "path": top, "file_count": files, "last_modified": last.isoformat()}
+                for top, (files, last) in tops.items()
+            ]
+        finally:
+            db.close()
+
+    def search(self, user_key: str, query: str, category: Optional[str] = None) -> List[Dict]:
+        """Day files with entries matching `query` (see emotion_search), best first."""
+        total = self.aggregates(user_key).entries
+        db = self._session()
+        try:
+            return emotion_search.search(db, user_key, query, lambda c: _in_category(c, category), total)
+        finally:
+            db.close()
+
+    def render_files(self, db: Session, user_key: str, category: Optional[str] = None) -> List[DayFile]:
+        """Rebuild a user's day files (optionally only those under `category`) from the log."""
+        q = (
+            db.query(EmotionEntryCategory.category, EmotionEntryCategory.day, EmotionEntry)
+            .join(EmotionEntry, EmotionEntry.id == EmotionEntryCategory.entry_id)
+            .filter(EmotionEntryCategory.user_key == user_key)
+        )
+        parts: Dict[Tuple[str, date], List[str]] = defaultdict(list)
+        for cat, day, entry in q.order_by(EmotionEntry.id):
+            if not _in_category(cat, category):
+                continue
+            parts[(cat, day)].append(render_entry(entry.created_at, entry.emotion, entry.confidence, entry.message))
+        return [DayFile(cat, day, "".join(chunks)) for (cat, day), chunks in parts.items()]
+
+    # -- text view -----------------------------------------------------------------
+    def export(self, base_path: Path, user_key: Optional[str] = None) -> int:
+        """Write the text layout for one user or everyone; returns files written."""
+        db = self._session()
+        try:
+            users = [user_key] if user_key else [u for (u,) in db.query(EmotionEntry.user_key).distinct()]
+            written = 0
+            for user in users:
+                for f in self.render_files(db, user):
+                    path = Path(base_path) / user / f.name
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    path.write_text(f.text, encoding="utf-8")
+                    written += 1
+            return written
+        finally:
+            db.close()
+
+    def migrate(self, base_path: Path) -> Dict[str, int]:
+        """Import an existing user_data tree. Entries filed under several categories
+        become one entry; running it twice imports nothing new."""
+        base_path = Path(base_path)
+        report = {"files": 0, "entries": 0, "skipped": 0}
+        if not base_path.exists():
+            return report
+        for user_dir in sorted(p for p in base_path.iterdir() if p.is_dir()):
+            parsed: Dict[Tuple[datetime, str, str, str], List[str]] = defaultdict(list)
+            for path in sorted(user_dir.rglob("*.txt")):
+                if not _DAY_FILE.match(path.stem):
+                    continue
+                day = datetime.strptime(path.stem, "%Y-%m-%d")
+                category = path.parent.relative_to(user_dir).as_posix()
+                report["files"] += 1
+                for chunk in path.read_text(encoding="utf-8", errors="replace").split(DIVIDER):
+                    m = _ENTRY.match(chunk.strip("\n"))
+                    if not m:
+                        continue
+                    hh, mm, ss = (int(x) for x in m.group(1).split(":"))
+                    when = day.replace(hour=hh, minute=mm, second=ss)
+                    parsed[(when, m.group(2).lower(), m.group(3), m.group(4).rstrip("\n"))].append(category)
+            db = self._session()
+            try:
+                for (when, emotion, confidence, message), categories in sorted(parsed.items(), key=lambda kv: kv[0][0]):
+                    exists = db.query(EmotionEntry.id).filter(
+                        EmotionEntry.user_key == user_dir.name, EmotionEntry.created_at == when, EmotionEntry.message == message
+                    ).first()
+                    if exists:
+                        report["skipped"] += 1
+                        continue
+                    self._append(db, user_dir.name, {"emotion": emotion, "confidence": confidence}, message, categories, when)
+                    report["entries"] += 1
+                with self._lock:
+                    db.commit()
+                    self._aggregates.pop(user_dir.name, None)
+            finally:
+                db.close()
+        logger.info(f"Emotion data migrated from {base_path}: {report}")
+        return report
+
+
+_store: Optional[EmotionStore] = None
+
+
+def get_emotion_store() -> EmotionStore:
+    global _store
+    if _store is None:
+        _store = EmotionStore()
+    return _store
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import or export EmotionOrganizer text files")
+    parser.add_argument("--migrate", metavar="DIR", help="import an existing user_data tree")
+    parser.add_argument("--export", metavar="DIR", help="write the text layout from the store")
+    parser.add_argument("--rebuild-aggregates", action="store_true", help="recompute the daily emotion counters")
+    parser.add_argument("--rebuild-search", action="store_true", help="re-tokenize entries into the search index")
+    parser.add_argument("--user", help="export or rebuild only this user")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    store = get_emotion_store()
+    if args.migrate:
+        print(store.migrate(Path(args.migrate)))
+    if args.export:
+        print({"files": store.export(Path(args.export), args.user)})
+    if args.rebuild_aggregates:
+        print({"rows": store.rebuild_aggregates(args.user)})
+    if args.rebuild_search:
+        print({"indexed": store.rebuild_search_index(args.user)})
+    if not (args.migrate or args.export or args.rebuild_aggregates or args.rebuild_search):
+        parser.print_help()
@@ -0,0 +1,100 @@
+"""
+Emotion trends over the daily counters kept by the emotion store.
+The window is laid out as dense (emotion x day) arrays once, then the
+histogram, trailing moving averages and dominant-emotion streaks are all
+computed on those arrays with NumPy; nothing here reads entries.
+"""
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np  # type: ignore
+except Exception:  # pragma: no cover
+    np = None  # type: ignore
+
+from app.services.emotion_store import UserAggregates
+
+
+def _trailing_mean(values, window: int):
+    """Mean over the last `window` days (fewer at the start of the range), per row."""
+    c = np.cumsum(values, axis=-1, dtype=np.float64)
+    lagged = np.zeros_like(c)
+    lagged[..., window:] = c[..., :-window]
+    span = np.minimum(np.arange(1, values.shape[-1] + 1), window)
+    return (c - lagged) / span
+
+
+def _trailing_ratio(num, den, window: int) -> List[Optional[float]]:
+    """Window sum of `num` over window sum of `den`; None where the window is empty."""
+    n = _trailing_mean(num, window)
+    d = _trailing_mean(den, window)
+    out = np.divide(n, d, out=np.full_like(n, np.nan), where=d > 0)
+    return [None if np.isnan(v) else round(float(v), 2) for v in out]
+
+
+def _streaks(dominant, emotions: List[str], days: List[date]) -> List[Dict]:
+    """Runs of consecutive days with the same dominant emotion (days without entries break a run)."""
+    if not len(dominant):
+        return []
+    starts = np.flatnonzero(np.r_[True, dominant[1:] != dominant[:-1]])
+    ends = np.r_[starts[1:], len(dominant)] - 1
+    return [
+        {
+            "emotion": emotions[dominant[s]],
+            "start": days[s].isoformat(),
+            "end": days[e].isoformat(),
+            "days": int(e - s + 1),
+        }
+        for s, e in zip(starts, ends)
+        if dominant[s] >= 0
+    ]
+
+
+def emotion_trends(agg: UserAggregates, days: int, window: int, today: Optional[date] = None) -> Dict:
+    """Daily histogram, `window`-day moving averages and dominant-emotion streaks for the last `days` days."""
+    today = today or date.today()
+    start = today - timedelta(days=days - 1)
+    axis = [start + timedelta(days=i) for i in range(days)]
+    rows = [(day, e, c) for day, emotions in agg.by_day.items() if start <= day <= today for e, c in emotions.items()]
+    emotions = sorted({e for _, e, _ in rows})
+
+    index = {e: i for i, e in enumerate(emotions)}
+    shape = (len(emotions), days)
+    counts = np.zeros(shape, dtype=np.int64)
+    intensity = np.zeros((2, days))
+    confidence = np.zeros((2, days))
+    if rows:
+        ei = np.fromiter((index[e] for _, e, _ in rows), dtype=np.intp, count=len(rows))
+        di = np.fromiter(((day - start).days for day, _, _ in rows), dtype=np.intp, count=len(rows))
+        np.add.at(counts, (ei, di), np.fromiter((c.entries for *_, c in rows), dtype=np.int64, count=len(rows)))
+        np.add.at(intensity[0], di, [c.intensity_sum for *_, c in rows])
+        np.add.at(intensity[1], di, [c.intensity_n for *_, c in rows])
+        np.add.at(confidence[0], di, [c.confidence_sum for *_, c in rows])
+        np.add.at(confidence[1], di, [c.confidence_n for *_, c in rows])
+
+    totals = counts.sum(axis=0)
+    dominant = np.where(totals > 0, counts.argmax(axis=0) if emotions else -1, -1)
+    moving = _trailing_mean(counts, window) if emotions else np.zeros(shape)
+    streaks = _streaks(dominant, emotions, axis)
+    longest: Dict[str, Dict] = {}
+    for s in streaks:
+        if s["days"] > longest.get(s["emotion"], {}).get("days", 0):
+            longest[s["emotion"]] = s
+
+    return {
+        "days": [d.isoformat() for d in axis],
+        "window": window,
+        "histogram": {e: counts[i].tolist() for i, e in enumerate(emotions)},
+        "total": totals.tolist(),
+        "moving_average": {e: np.round(moving[i], 2).tolist() for i, e in enumerate(emotions)},
+        "moving_average_total": np.round(_trailing_mean(totals, window), 2).tolist(),
+        "intensity_average": _trailing_ratio(intensity[0], intensity[1], window),
+        "confidence_average": _trailing_ratio(confidence[0], confidence[1], window),
+        "dominant": [emotions[i] if i >= 0 else None for i in dominant.tolist()],
+        "streaks": streaks,
+        "longest_streaks": longest,
+        # Most recent run; it is still going if it ends today
+        "current_streak": streaks[-1] if streaks else None,
+    }
@@ -0,0 +1,48 @@
+"""
+Shared async HTTP connection pool for upstream LLM providers.
+All provider SDK clients are built on the same httpx.AsyncClient so TLS
+connections are reused across requests instead of re-negotiated per call.
+"""
+from __future__ import annotations
+
+import logging
+
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the process-wide pooled client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.llm_pool_max_connections,
+                max_keepalive_connections=settings.llm_pool_max_keepalive,
+                keepalive_expiry=settings.llm_keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(settings.llm_request_timeout, connect=10.0),
+        )
+    return _client
+
+
+async def warm_up(url: str) -> bool:
+    """Open a keep-alive connection to `url` so the first real call skips the handshake."""
+    try:
+        await get_http_client().head(url)
+        return True
+    except httpx.HTTPError as e:
+        logger.warning(f"Connection warm-up to {url} failed: {e}")
+        return False
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
@@ -0,0 +1,117 @@
+"""
+Micro-batching for local model inference.
+Concurrent `submit` calls are collected into batches (up to `max_batch`
+items, or whatever arrived within `max_wait_ms` of the first one) and run
+through a batch function on a dedicated thread, off the event loop. Each
+caller's future is resolved with its own result.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Generic, List, Optional, Sequence, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    def __init__(self, fn: Callable[[List[T]], Sequence[R]], *, max_batch: int = 16, max_wait_ms: float = 10.0, name: str = "batcher") -> None:
+        self.fn = fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+        # One thread: model calls are serialised, concurrency comes from batching
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running: List[Tuple[T, asyncio.Future, float]] = []  # the batch being inferred
+        self.batches = 0
+        self.items = 0
+        self.max_batch_seen = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+        self.run_ms_total = 0.0
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, item: T) -> R:
+        self._ensure_started()
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, fut, time.perf_counter()))
+        return await fut
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[Tuple[T, asyncio.Future, float]] = [await self._queue.get()]
+            self._running = batch  # taken off the queue: close() must still find these
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                try:
+                    batch.append(self._queue.get_nowait() if remaining <= 0 else await asyncio.wait_for(self._queue.get(), remaining))
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+            # Callers that gave up (e.g. a cancelled request) are dropped before inference
+            batch = self._running = [entry for entry in batch if not entry[1].done()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                wait_ms = (started - enqueued) * 1000
+                self.wait_ms_total += wait_ms
+                self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+            try:
+                results = list(await loop.run_in_executor(self._executor, self.fn, [item for item, _, _ in batch]))
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{self.name} returned {len(results)} results for {len(batch)} items")
+                for (_, fut, _), result in zip(batch, results):
+                    if not fut.done():
+                        fut.set_result(result)
+            except Exception as e:
+                logger.error(f"{self.name} batch of {len(batch)} failed: {e}")
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+            self._running = []
+            self.run_ms_total += (time.perf_counter() - started) * 1000
+            self.batches += 1
+            self.items += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Fail whatever was still queued or being inferred, or its callers wait forever
+        pending = list(self._running)
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        self._running = []
+        for _, fut, _ in pending:
+            if not fut.done():
+                fut.set_exception(RuntimeError(f"{self.name} closed"))
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_seen,
+            "avg_queue_wait_ms": round(self.wait_ms_total / self.items, 2) if self.items else 0.0,
+            "max_queue_wait_ms": round(self.wait_ms_max, 2),
+            "avg_batch_run_ms": round(self.run_ms_total / self.batches, 2) if self.batches else 0.0,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+        }
@@ -0,0 +1,159 @@
+"""
+Upload ingestion.
+Uploads are read in fixed-size chunks against a hard byte limit and decoded
+incrementally, with the encoding chosen once from a prefix sample (BOMs,
+UTF-16 NUL patterns, strict UTF-8 check, cp1252 fallback) instead of
+re-decoding the whole buffer per candidate. `split_sections` cuts long
+documents at headings and paragraph breaks into sections small enough to be
+organized whole.
+"""
+from __future__ import annotations
+
+import codecs
+import re
+from typing import List, Optional
+
+from fastapi import UploadFile
+
+CHUNK_SIZE = 64 * 1024
+SAMPLE_SIZE = 8 * 1024
+
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+_HEADING = re.compile(r"^(?=#{1,6}\s)", re.MULTILINE)
+_PARAGRAPH = re.compile(r"\n\s*\n")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def detect_encoding(sample: bytes) -> str:
+    for bom, name in _BOMS:
+        if sample.startswith(bom):
+            return name
+    if sample:
+        # Mostly-ASCII UTF-16 without a BOM has a NUL in every other byte
+        even, odd = sample[0::2], sample[1::2]
+        if odd and odd.count(0) > len(odd) * 0.4 and even.count(0) < len(even) * 0.1:
+            return "utf-16-le"
+        if even and even.count(0) > len(even) * 0.4 and odd.count(0) < len(odd) * 0.1:
+            return "utf-16-be"
+    try:
+        # final=False: a multi-byte character cut at the end of the sample is fine
+        codecs.getincrementaldecoder("utf-8")("strict").decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp1252"
+
+
+def decode_bytes(raw: bytes) -> Optional[str]:
+    """Decode a buffer with the encoding detected from its prefix."""
+    try:
+        return raw.decode(detect_encoding(raw[:SAMPLE_SIZE]), errors="replace")
+    except LookupError:
+        return None
+
+
+async def read_upload(upload: UploadFile, max_bytes: int) -> bytes:
+    """Read an upload chunk by chunk, failing as soon as it exceeds `max_bytes`."""
+    chunks: List[bytes] = []
+    size = 0
+    while True:
+        chunk = await upload.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadTooLarge(f"{upload.filename or 'upload'} exceeds {max_bytes} bytes")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def read_upload_text(upload: UploadFile, max_bytes: int) -> str:
+    """Stream-decode an upload to text without holding the raw bytes as well."""
+    parts: List[str] = []
+    size = 0
+    decoder = None
+    pending = b""
+    while True:
+        chunk = await upload.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadTooLarge(f"{upload.filename or 'upload'} exceeds {max_bytes} bytes")
+        if decoder is None:
+            pending += chunk
+            if len(pending) < SAMPLE_SIZE:
+                continue
+            decoder = codecs.getincrementaldecoder(detect_encoding(pending[:SAMPLE_SIZE]))(errors="replace")
+            chunk, pending = pending, b""
+        parts.append(decoder.decode(chunk))
+    if decoder is None:
+        decoder = codecs.getincrementaldecoder(detect_encoding(pending))(errors="replace")
+        parts.append(decoder.decode(pending))
+    parts.append(decoder.decode(b"", final=True))
+    return "".join(parts)
+
+
+def _hard_split(block: str, max_chars: int) -> List[str]:
+    pieces: List[str] = []
+    current = ""
+    for sentence in _SENTENCE.split(block):
+        while len(sentence) > max_chars:
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_sections(text: str, max_chars: int) -> List[str]:
+    """Split at Markdown headings, then pack paragraphs into sections of at most `max_chars`."""
+    if len(text) <= max_chars:
+        return [text]
+    sections: List[str] = []
+    for part in _HEADING.split(text):
+        if not part.strip():
+            continue
+        current = ""
+        heading: Optional[str] = None
+        paras = [p.strip() for p in _PARAGRAPH.split(part) if p.strip()]
+        for i, para in enumerate(paras):
+            # A heading line travels with the paragraph after it, so a long body
+            # never leaves it behind at the end of the previous section
+            if _HEADING.match(para) and "\n" not in para and i + 1 < len(paras):
+                heading = para
+                continue
+            if heading is not None:
+                para, heading = f"{heading}\n\n{para}", None
+            blocks = [para] if len(para) <= max_chars else _hard_split(para, max_chars)
+            for block in blocks:
+                if current and len(current) + 2 + len(block) > max_chars:
+                    sections.append(current)
+                    current = block
+                else:
+                    current = f"{current}\n\n{block}" if current else block
+        if current:
+            sections.append(current)
+    # Fold tiny trailing sections (e.g. a lone heading) into their predecessor
+    merged: List[str] = []
+    for section in sections:
+        if merged and len(section) < max_chars // 8 and len(merged[-1]) + 2 + len(section) <= max_chars:
+            merged[-1] = f"{merged[-1]}\n\n{section}"
+        else:
+            merged.append(section)
+    return merged
@@ -0,0 +1,212 @@
+"""
+Debounced background job queue.
+Callers `notify` a (kind, key) whenever something happened; repeated
+notifications for the same key coalesce into one pending job that runs once
+enough notifications arrived or the key has been idle long enough. A bounded
+worker pool runs due jobs and waits for spare LLM capacity first. Pending
+jobs are checkpointed to the `pending_jobs` table and restored on startup.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.job import PendingJob
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable[Any]]
+
+
+@dataclass
+class _Job:
+    key: str
+    kind: str
+    payload: dict
+    turns: int
+    due_at: float  # time.time()
+    dirty: bool = True
+
+
+class JobQueue:
+    def __init__(self, workers: Optional[int] = None, checkpoint_s: Optional[float] = None) -> None:
+        self.workers = max(1, workers or settings.job_workers)
+        self.checkpoint_s = checkpoint_s or settings.job_checkpoint_s
+        # Returns False while interactive traffic needs the LLM; workers wait on it
+        self.capacity_check: Optional[Callable[[], bool]] = None
+        self._handlers: Dict[str, Tuple[Handler, int, float]] = {}
+        self._pending: Dict[str, _Job] = {}
+        self._running: Dict[str, _Job] = {}
+        self._finished: Set[str] = set()  # keys whose checkpoint row should be deleted
+        self._ready: Optional[asyncio.Queue] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self.notified = 0
+        self.coalesced = 0
+        self.completed = 0
+        self.failed = 0
+
+    def register(self, kind: str, handler: Handler, *, every: int = 1, idle_s: float = 0.0) -> None:
+        """Run `handler(payload)` after `every` notifications or `idle_s` seconds without one."""
+        self._handlers[kind] = (handler, max(1, every), idle_s)
+
+    def notify(self, kind: str, key: Any, payload: dict) -> None:
+        if kind not in self._handlers:
+            raise KeyError(f"No handler registered for job kind '{kind}'")
+        _, every, idle_s = self._handlers[kind]
+        job_key = f"{kind}:{key}"
+        now = time.time()
+        self.notified += 1
+        job = self._pending.get(job_key)
+        if job is None:
+            job = _Job(key=job_key, kind=kind, payload=payload, turns=0, due_at=now)
+            self._pending[job_key] = job
+            self._finished.discard(job_key)
+        else:
+            self.coalesced += 1
+            job.payload = payload
+        job.turns += 1
+        job.due_at = now if job.turns >= every else now + idle_s
+        job.dirty = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._ready = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+        for job in await asyncio.to_thread(self._load):
+            if job.kind in self._handlers:
+                self._pending.setdefault(job.key, job)
+        if self._pending:
+            logger.info(f"Restored {len(self._pending)} pending background jobs")
+        self._tasks = [asyncio.create_task(self._schedule())]
+        self._tasks += [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Interrupted and queued jobs go back to pending so they survive the restart
+        for job in list(self._running.values()):
+            job.dirty = True
+            self._pending.setdefault(job.key, job)
+        self._running.clear()
+        await asyncio.to_thread(self._checkpoint, *self._checkpoint_snapshot())
+
+    async def _schedule(self) -> None:
+        last_checkpoint = time.monotonic()
+        while True:
+            now = time.time()
+            next_due: Optional[float] = None
+            for key, job in list(self._pending.items()):
+                if key in self._running:
+                    continue  # runs again after the current run finishes
+                if job.due_at <= now:
+                    del self._pending[key]
+                    self._running[key] = job
+                    self._ready.put_nowait(job)
+                elif next_due is None or job.due_at < next_due:
+                    next_due = job.due_at
+            timeout = self.checkpoint_s if next_due is None else min(self.checkpoint_s, max(0.0, next_due - now))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if time.monotonic() - last_checkpoint >= self.checkpoint_s:
+                last_checkpoint = time.monotonic()
+                upserts, deletes = self._checkpoint_snapshot()
+                if upserts or deletes:
+                    try:
+                        await asyncio.to_thread(self._checkpoint, upserts, deletes)
+                    except Exception as e:
+                        logger.error(f"Job checkpoint failed: {e}")
+
+    async def _work(self) -> None:
+        while True:
+            job: _Job = await self._ready.get()
+            try:
+                while self.capacity_check is not None and not self.capacity_check():
+                    await asyncio.sleep(1.0)
+                handler = self._handlers[job.kind][0]
+                await handler(job.payload)
+                self.completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Background job {job.key} failed: {e}")
+            finally:
+                if self._running.pop(job.key, None) is not None and job.key not in self._pending:
+                    self._finished.add(job.key)
+                self._ready.task_done()
+                self._wakeup.set()
+
+    def _checkpoint_snapshot(self):
+        upserts = []
+        for job in self._pending.values():
+            if job.dirty:
+                upserts.append((job.key, job.kind, dict(job.payload), job.turns, job.due_at))
+                job.dirty = False
+        deletes = list(self._finished)
+        self._finished.clear()
+        return upserts, deletes
+
+    @staticmethod
+    def _checkpoint(upserts, deletes) -> None:
+        db = SessionLocal()
+        try:
+            if deletes:
+                db.query(PendingJob).filter(PendingJob.key.in_(deletes)).delete(synchronize_session=False)
+            for key, kind, payload, turns, due_at in upserts:
+                db.merge(PendingJob(key=key, kind=kind, payload=payload, turns=turns, due_at=due_at))
+            db.commit()
+        finally:
+            db.close()
+
+    @staticmethod
+    def _load() -> List[_Job]:
+        db = SessionLocal()
+        try:
+            return [
+                _Job(key=r.key, kind=r.kind, payload=r.payload or {}, turns=r.turns or 0, due_at=r.due_at, dirty=False)
+                for r in db.query(PendingJob).all()
+            ]
+        except Exception as e:
+            logger.warning(f"Could not restore pending jobs: {e}")
+            return []
+        finally:
+            db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        oldest = min((j.due_at for j in self._pending.values()), default=None)
+        return {
+            "pending": len(self._pending),
+            "running": len(self._running),
+            "queued": self._ready.qsize() if self._ready is not None else 0,
+            "workers": self.workers,
+            "notified": self.notified,
+            "coalesced": self.coalesced,
+            "completed": self.completed,
+            "failed": self.failed,
+            "next_due_in_s": round(oldest - now, 1) if oldest is not None else None,
+        }
+
+
+_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        _queue = JobQueue()
+    return _queue
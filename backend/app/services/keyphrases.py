@@ -0,0 +1,330 @@
+"""
+Local keyphrase extraction, no LLM required.
+Candidates are RAKE-style phrases: runs of content words between stopwords and
+punctuation. Each word is scored by RAKE degree/frequency times TF-IDF, where
+document frequencies come from the user's own notes, so words that appear in
+every note ("today", "things") sink and distinctive ones rise. Phrase scores
+are the sums of their words' scores, computed in one vectorized pass.
+
+Document frequencies live in term_stats/corpus_stats, are bootstrapped from a
+user's existing notes the first time they are needed and then updated
+incrementally in the same transaction that saves each note. Results are
+cached per note content and reused until the corpus has grown noticeably.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np  # type: ignore
+except Exception:  # pragma: no cover
+    np = None  # type: ignore
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.keyphrase import CorpusStat, TermStat
+from app.models.note import Note
+
+logger = logging.getLogger(__name__)
+
+MAX_PHRASE_WORDS = 3
+MIN_WORD_CHARS = 3
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are aren't as at be because been before being below
+between both but by can can't cannot could couldn't did didn't do does doesn't doing don't down during each etc
+even ever every few for from further get gets getting got had hadn't has hasn't have haven't having he he'd he'll
+he's her here here's hers herself him himself his how how's however i i'd i'll i'm i've if in into is isn't it
+it's its itself just let's like make made many may maybe me might more most much must mustn't my myself need
+needs new no nor not now of off often on once one only or other ought our ours ourselves out over own per
+quite rather really said same say says see seem shan't she she'd she'll she's should shouldn't since so some
+something still such take than that that's the their theirs them themselves then there there's these they
+they'd they'll they're they've thing things this those though through thus to too under until up upon us use
+used using very via want was wasn't way we we'd we'll we're we've well were weren't what what's when when's
+where where's whether which while who who's whom why why's will with within without won't would wouldn't yes
+yet you you'd you'll you're you've your yours yourself yourselves today tomorrow yesterday week etc okay ok
+""".split())
+
+_FRAGMENT_BREAK = re.compile(r"[.,;:!?()\[\]{}<>\"“”‘’|/\\*#`~=+_]+|\s-+\s|\n")
+_WORD = re.compile(r"[^\W\d_][\w'-]*", re.UNICODE)
+_URL = re.compile(r"\S+://\S+|www\.\S+")
+
+
+def _words(fragment: str) -> List[str]:
+    return [w.strip("'-").lower() for w in _WORD.findall(fragment)]
+
+
+def _is_content(word: str) -> bool:
+    return len(word) >= MIN_WORD_CHARS and word not in STOPWORDS
+
+
+def candidate_phrases(text: str) -> List[Tuple[str, ...]]:
+    """Phrase occurrences in document order, each a tuple of 1-3 content words."""
+    phrases: List[Tuple[str, ...]] = []
+    for fragment in _FRAGMENT_BREAK.split(_URL.sub(" ", text or "")):
+        run: List[str] = []
+        for word in _words(fragment) + [""]:
+            if word and _is_content(word):
+                run.append(word)
+                continue
+            # Long runs become consecutive chunks rather than one unwieldy phrase
+            for i in range(0, len(run), MAX_PHRASE_WORDS):
+                phrases.append(tuple(run[i:i + MAX_PHRASE_WORDS]))
+            run = []
+    return phrases
+
+
+def document_terms(text: str) -> set:
+    """Distinct content words of a document, the unit counted in document frequencies."""
+    return {w for phrase in candidate_phrases(text) for w in phrase}
+
+
+@dataclass
+class Keyphrases:
+    phrases: List[Tuple[str, float]]
+    documents: int  # corpus size the scores were computed against
+
+    @property
+    def topics(self) -> List[str]:
+        return [p for p, _ in self.phrases]
+
+    @property
+    def confident(self) -> bool:
+        """Enough corpus statistics and enough distinct phrases to skip the LLM."""
+        return self.documents >= settings.keyphrase_min_corpus_docs and len(self.phrases) >= 3
+
+
+@dataclass
+class _Corpus:
+    documents: int = 0
+    df: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class CorpusDelta:
+    user_id: int
+    documents: int
+    df: Counter
+
+
+def _score(phrases: List[Tuple[str, ...]], corpus: _Corpus) -> Dict[Tuple[str, ...], float]:
+    counts = Counter(phrases)
+    unique = list(counts)
+    vocab = {w: i for i, w in enumerate(dict.fromkeys(w for p in unique for w in p))}
+    n = len(vocab)
+    freq = [0.0] * n
+    degree = [0.0] * n
+    for phrase, count in counts.items():
+        for w in phrase:
+            freq[vocab[w]] += count
+            degree[vocab[w]] += count * len(phrase)
+    df = [corpus.df.get(w, 0) for w in vocab]
+    members = [vocab[w] for p in unique for w in p]
+    starts = [0]
+    for p in unique[:-1]:
+        starts.append(starts[-1] + len(p))
+    occurrences = [counts[p] for p in unique]
+    if np is not None:
+        freq_a, deg_a, df_a = np.array(freq), np.array(degree), np.array(df, dtype=np.float64)
+        idf = np.log((corpus.documents + 1.0) / (df_a + 1.0)) + 1.0
+        word = (1.0 + np.log(freq_a)) * idf * (deg_a / freq_a)
+        scores = np.add.reduceat(word[np.array(members)], np.array(starts)) * (1.0 + np.log(np.array(occurrences, dtype=np.float64)))
+        return dict(zip(unique, scores.tolist()))
+    word = [
+        (1.0 + math.log(freq[i])) * (math.log((corpus.documents + 1.0) / (df[i] + 1.0)) + 1.0) * degree[i] / freq[i]
+        for i in range(n)
+    ]
+    return {p: sum(word[vocab[w]] for w in p) * (1.0 + math.log(counts[p])) for p in unique}
+
+
+class KeyphraseEngine:
+    def __init__(self, max_users: Optional[int] = None, cache_size: Optional[int] = None) -> None:
+        self.max_users = max_users or settings.keyphrase_max_users
+        self.cache_size = cache_size or settings.keyphrase_cache_size
+        self._corpora: "OrderedDict[int, _Corpus]" = OrderedDict()
+        self._results: "OrderedDict[Tuple[int, str], Keyphrases]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._loading: Dict[int, threading.Lock] = {}  # user -> once-guard while the corpus loads
+        self.extractions = 0
+        self.cache_hits = 0
+
+    # -- corpus statistics -------------------------------------------------------
+    def _cached(self, user_id: int) -> Optional[_Corpus]:
+        with self._lock:
+            corpus = self._corpora.get(user_id)
+            if corpus is not None:
+                self._corpora.move_to_end(user_id)
+            return corpus
+
+    def _corpus(self, user_id: int) -> _Corpus:
+        corpus = self._cached(user_id)
+        if corpus is not None:
+            return corpus
+        with self._lock:
+            guard = self._loading.setdefault(user_id, threading.Lock())
+        # Load outside the engine lock: a bootstrap scan only holds up the same user
+        with guard:
+            corpus = self._cached(user_id)
+            if corpus is not None:
+                return corpus
+            try:
+                corpus = self._load(user_id)
+                with self._lock:
+                    self._corpora[user_id] = corpus
+                    while len(self._corpora) > self.max_users:
+                        self._corpora.popitem(last=False)
+            finally:
+                with self._lock:
+                    self._loading.pop(user_id, None)
+            return corpus
+
+    @staticmethod
+    def _load(user_id: int) -> _Corpus:
+        db = SessionLocal()
+        try:
+            row = db.get(CorpusStat, user_id)
+            if row is not None:
+                df = dict(db.query(TermStat.term, TermStat.df).filter(TermStat.user_id == user_id))
+                return _Corpus(row.documents or 0, df)
+            # First use: count the notes this user already has
+            owner = Note.user_id.is_(None) if user_id == 0 else Note.user_id == user_id
+            corpus = _Corpus()
+            counts: Counter = Counter()
+            for (content,) in db.query(Note.content).filter(owner).yield_per(500):
+                counts.update(document_terms(content or ""))
+                corpus.documents += 1
+            corpus.df = dict(counts)
+            try:
+                db.query(TermStat).filter(TermStat.user_id == user_id).delete(synchronize_session=False)
+                if counts:
+                    db.execute(TermStat.__table__.insert(), [{"user_id": user_id, "term": t, "df": c} for t, c in counts.items()])
+                db.add(CorpusStat(user_id=user_id, documents=corpus.documents))
+                db.commit()
+                logger.info(f"Keyphrase corpus for user {user_id}: {corpus.documents} notes, {len(counts)} terms")
+            except IntegrityError:
+                # Bootstrapped concurrently by another worker; read theirs
+                db.rollback()
+                return KeyphraseEngine._load(user_id)
+            return corpus
+        finally:
+            db.close()
+
+    def record(self, db: Session, user_id: Optional[int], texts: Iterable[str], removed: Iterable[str] = ()) -> CorpusDelta:
+        """Add documents to (and drop `removed` ones from) the user's statistics inside
+        the caller's transaction. Call `apply` with the result once it has committed."""
+        uid = user_id or 0
+        self._corpus(uid)  # bootstrap first, outside the caller's transaction
+        delta = CorpusDelta(uid, 0, Counter())
+        for text in texts:
+            delta.df.update(document_terms(text))
+            delta.documents += 1
+        for text in removed:
+            delta.df.subtract(document_terms(text))
+            delta.documents -= 1
+        delta.df = Counter({t: c for t, c in delta.df.items() if c})
+        if not delta.documents and not delta.df:
+            return delta
+        updated = db.query(CorpusStat).filter(CorpusStat.user_id == uid).update(
+            {CorpusStat.documents: CorpusStat.documents + delta.documents}, synchronize_session=False
+        )
+        if not updated:
+            db.add(CorpusStat(user_id=uid, documents=max(delta.documents, 0)))
+        if delta.df:
+            self._upsert_terms(db, uid, delta.df)
+        return delta
+
+    @staticmethod
+    def _upsert_terms(db: Session, user_id: int, df: Counter) -> None:
+        rows = [{"user_id": user_id, "term": t, "df": c} for t, c in df.items()]
+        dialect = db.get_bind().dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            if dialect == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            stmt = insert(TermStat)
+            db.execute(stmt.on_conflict_do_update(index_elements=["user_id", "term"], set_={"df": TermStat.df + stmt.excluded.df}), rows)
+            return
+        for row in rows:
+            updated = db.query(TermStat).filter(TermStat.user_id == user_id, TermStat.term == row["term"]).update(
+                {TermStat.df: TermStat.df + row["df"]}, synchronize_session=False
+            )
+            if not updated:
+                db.add(TermStat(**row))
+
+    def apply(self, delta: CorpusDelta) -> None:
+        with self._lock:
+            corpus = self._corpora.get(delta.user_id)
+            if corpus is None:
+                return  # loaded from the database next time
+            corpus.documents += delta.documents
+            for term, count in delta.df.items():
+                df = corpus.df.get(term, 0) + count
+                if df > 0:
+                    corpus.df[term] = df
+                else:
+                    corpus.df.pop(term, None)
+
+    # -- extraction --------------------------------------------------------------
+    def extract(self, text: str, user_id: Optional[int] = None, limit: int = 5) -> Keyphrases:
+        uid = user_id or 0
+        corpus = self._corpus(uid)
+        key = (uid, hashlib.blake2b((text or "").encode("utf-8"), digest_size=16).hexdigest())
+        with self._lock:
+            cached = self._results.get(key)
+            # Scores drift as the corpus grows; reuse them until it grew by a tenth
+            if cached is not None and corpus.documents <= cached.documents * 1.1 + 1:
+                self._results.move_to_end(key)
+                self.cache_hits += 1
+                return cached
+        self.extractions += 1
+        phrases = candidate_phrases(text)
+        ranked: List[Tuple[str, float]] = []
+        if phrases:
+            with self._lock:
+                scores = _score(phrases, corpus)
+                documents = corpus.documents
+            taken: set = set()
+            for phrase, score in sorted(scores.items(), key=lambda kv: -kv[1]):
+                if set(phrase) <= taken:
+                    continue  # already covered by a longer, higher-ranked phrase
+                taken.update(phrase)
+                ranked.append((" ".join(phrase), round(score, 3)))
+                if len(ranked) >= limit:
+                    break
+        else:
+            documents = corpus.documents
+        result = Keyphrases(ranked, documents)
+        with self._lock:
+            self._results[key] = result
+            while len(self._results) > self.cache_size:
+                self._results.popitem(last=False)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "extractions": self.extractions,
+            "cache_hits": self.cache_hits,
+            "cached_results": len(self._results),
+            "loaded_corpora": len(self._corpora),
+        }
+
+
+_engine: Optional[KeyphraseEngine] = None
+
+
+def get_keyphrase_engine() -> KeyphraseEngine:
+    global _engine
+    if _engine is None:
+        _engine = KeyphraseEngine()
+    return _engine
@@ -0,0 +1,108 @@
+"""
+Shared plumbing for the OpenAI-compatible LLM providers.
+Subclasses build their SDK client and say which model and settings they use;
+the concurrency limiter, single-flight coalescing, streaming and the note
+helpers live here.
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Optional
+
+from app.services.http_client import warm_up
+from app.services.single_flight import SingleFlight, get_single_flight
+
+logger = logging.getLogger(__name__)
+
+
+class LLMService:
+    name = "llm"
+    api_key_env = "API_KEY"
+
+    def __init__(self, client: Any, model: str, max_concurrency: int) -> None:
+        self.client = client
+        self.model = model
+        # Caps in-flight upstream calls so a burst queues here instead of at the provider
+        self.max_concurrency = max(1, max_concurrency)
+        self._limiter = asyncio.Semaphore(self.max_concurrency)
+        logger.info(f"{self.name} service initialized with model: {self.model}")
+
+    def _params(self, messages: list, temperature: Optional[float], max_tokens: Optional[int]) -> dict:
+        params = dict(model=self.model, messages=messages)
+        if temperature is not None:
+            params["temperature"] = float(temperature)
+        if max_tokens is not None:
+            params["max_tokens"] = int(max_tokens)
+        return params
+
+    async def warm_up(self) -> bool:
+        if not self.client:
+            return False
+        return await warm_up(str(self.client.base_url))
+
+    async def chat_completion(self, messages: list, stream: bool = False, *, temperature: float | None = None, max_tokens: int | None = None):
+        if not self.client:
+            raise RuntimeError(f"{self.api_key_env} not configured")
+        params = self._params(messages, temperature, max_tokens)
+        if stream:
+            return self._stream(params)
+        # Identical concurrent requests share one upstream call
+        return await get_single_flight().do(SingleFlight.key(self.name, params), lambda: self._complete(params))
+
+    async def _complete(self, params: dict):
+        async with self._limiter:
+            try:
+                resp = await self.client.chat.completions.create(**params)
+            except Exception as e:
+                logger.error(f"{self.name} API error: {e}")
+                raise
+        return resp.choices[0].message.content
+
+    async def _stream(self, params: dict):
+        # The concurrency slot is held for the whole stream; closing the
+        # generator closes the upstream response.
+        async with self._limiter:
+            try:
+                stream = await self.client.chat.completions.create(stream=True, **params)
+            except Exception as e:
+                logger.error(f"{self.name} API error: {e}")
+                raise
+            try:
+                async for chunk in stream:
+                    yield chunk
+            finally:
+                await stream.close()
+
+    async def extract_topics(self, text: str) -> list[str]:
+        prompt = (
+            "Analyze this note and extract 3-5 main topics/themes.\n"
+            "Return ONLY a comma-separated list of topics, nothing else.\n\n"
+            f"Note: {text[:1000]}"
+        )
+        messages = [{"role": "user", "content": prompt}]
+        res = await self.chat_completion(messages)
+        return [t.strip() for t in (res or '').split(',')][:5]
+
+    async def generate_headings(self, text: str) -> list[dict]:
+        prompt = (
+            "Analyze this note and create a hierarchical outline with headings.\n"
+            "Return JSON array: [{\"level\": 1-3, \"text\": \"heading\"}]\n\n"
+            f"Note: {text[:2000]}"
+        )
+        messages = [{"role": "user", "content": prompt}]
+        res = await self.chat_completion(messages)
+        try:
+            return json.loads(res or '[]')
+        except Exception:
+            return [{"level": 1, "text": "Main Content"}]
+
+    async def categorize_note(self, text: str) -> list[str]:
+        prompt = (
+            "Categorize this note into 1-3 categories from: "
+            "[Work, Personal, Study, Ideas, Tasks, Reference, Meeting, Project]\n"
+            "Return ONLY category names comma-separated.\n\n"
+            f"Note: {text[:800]}"
+        )
+        messages = [{"role": "user", "content": prompt}]
+        res = await self.chat_completion(messages)
+        return [c.strip() for c in (res or '').split(',')][:3]
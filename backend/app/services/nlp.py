@@ -1,7 +1,7 @@
 import re
-from typing import List
+import threading
+from typing import List, Optional, Tuple
 from dataclasses import dataclass
-import os
 
 try:
     from groq import Groq  # type: ignore
@@ -9,7 +9,9 @@ except Exception:
     Groq = None  # type: ignore
 
 from app.config import settings
-from app.schemas import Heading, OrganizeResult
+from app.schemas.note import Heading, OrganizeResult
+from app.services.keyphrases import get_keyphrase_engine
+from app.utils.text_matcher import TextMatcher
 
 
 @dataclass
@@ -17,14 +19,31 @@ class SimpleTopic:
     name: str
 
 
-def _heuristic_topics(text: str) -> List[str]:
-    keywords = [
-        "project", "meeting", "task", "todo", "idea", "goal", "bug", "fix",
-        "research", "study", "plan", "deadline", "note", "learn", "design",
-    ]
-    text_l = text.lower()
-    found = {k for k in keywords if k in text_l}
-    return sorted(found)[:10] or ["general"]
+def _heuristic_topics(text: str, user_id: Optional[int] = None) -> List[str]:
+    return get_keyphrase_engine().extract(text, user_id).topics or ["general"]
+
+
+CATEGORIES = ["Work", "Personal", "Study", "Ideas", "Tasks", "Reference", "Meeting", "Project"]
+
+_CATEGORY_MATCHER = TextMatcher({
+    "Work": ["work", "office", "client", "manager", "colleague", "report"],
+    "Personal": ["family", "friend", "home", "health", "feel", "mom", "dad"],
+    "Study": ["study", "learn", "exam", "course", "lecture", "homework", "research"],
+    "Ideas": ["idea", "brainstorm", "what if", "concept"],
+    "Tasks": ["todo", "to do", "task", "deadline", "remember to"],
+    "Reference": ["link", "reference", "docs", "documentation", "http", "how to"],
+    "Meeting": ["meeting", "agenda", "minutes", "attendees", "standup"],
+    "Project": ["project", "milestone", "roadmap", "release", "sprint"],
+})
+
+
+def _heuristic_categories(text: str) -> List[str]:
+    return _rank_categories(_CATEGORY_MATCHER.categories(text))
+
+
+def _rank_categories(found) -> List[str]:
+    ranked = sorted(found, key=lambda c: (-len(found[c]), CATEGORIES.index(c)))
+    return ranked[:3] or ["Personal"]
 
 
 def _heuristic_headings(text: str) -> List[Heading]:
@@ -38,11 +57,25 @@ def _heuristic_headings(text: str) -> List[Heading]:
     return headings or [Heading(level=1, text="Notes")]
 
 
+_groq_client = None
+_groq_lock = threading.Lock()
+
+
+def _get_groq_client():
+    """One pooled client for the process instead of a new connection pool per call."""
+    global _groq_client
+    if _groq_client is None:
+        with _groq_lock:
+            if _groq_client is None:
+                _groq_client = Groq(api_key=settings.groq_api_key)
+    return _groq_client
+
+
 def _groq_topics_headings(text: str):
     if not (settings.groq_api_key and Groq):
         return None
     try:
-        client = Groq(api_key=settings.groq_api_key)
+        client = _get_groq_client()
         prompt = (
             "Analyze the user's notes. Return JSON with two fields: "
             "headings: array of {level:int,text:string} describing major sections; "
@@ -68,12 +101,25 @@ def _groq_topics_headings(text: str):
         return None
 
 
+def organize_heuristic(text: str, user_id: Optional[int] = None) -> OrganizeResult:
+    return organize_local(text, user_id)[0]
+
+
+def organize_local(text: str, user_id: Optional[int] = None) -> Tuple[OrganizeResult, bool]:
+    """Organize without an LLM; the flag says whether the result is good enough to keep."""
+    keyphrases = get_keyphrase_engine().extract(text, user_id)
+    found = _CATEGORY_MATCHER.categories(text)
+    result = OrganizeResult(
+        headings=_heuristic_headings(text),
+        topics=keyphrases.topics or ["general"],
+        categories=_rank_categories(found),
+    )
+    return result, keyphrases.confident and bool(found)
+
+
 def organize_text(text: str) -> OrganizeResult:
     # Try Groq first, fallback to heuristics
     groq_res = _groq_topics_headings(text)
     if groq_res:
         return groq_res
-    return OrganizeResult(
-        headings=_heuristic_headings(text),
-        topics=_heuristic_topics(text),
-    )
+    return organize_heuristic(text)
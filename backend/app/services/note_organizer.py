@@ -0,0 +1,231 @@
+"""
+Note organization in one LLM call.
+The provider is asked once for a JSON object with headings, topics and
+categories instead of three separate prompts. Missing or malformed fields
+fall back to the heuristics in services/nlp.py. When the local keyphrase
+engine is confident (services/keyphrases.py) the LLM is skipped entirely, so
+most notes are organized in milliseconds. LLM results are stored in
+the organize_cache table keyed by a hash of the text, so re-importing the
+same content costs no upstream call. Documents longer than one prompt are
+split into sections (services/ingest.py) that are organized concurrently and
+merged, so the whole text is covered rather than its first few KB.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.organize import OrganizeCache
+from app.schemas.note import Heading
+from app.services.ingest import split_sections
+from app.services.nlp import CATEGORIES, organize_local
+
+logger = logging.getLogger(__name__)
+
+# Bump when the prompt or the result shape changes, so old cache rows are not reused
+PROMPT_VERSION = 1
+MAX_INPUT_CHARS = 4000
+
+ORGANIZE_PROMPT = (
+    "Analyze this note and return ONLY a JSON object with exactly these fields:\n"
+    '  "headings": hierarchical outline, array of {"level": 1-3, "text": "heading"}\n'
+    '  "topics": 3-5 main topics/themes, array of short strings\n'
+    f'  "categories": 1-3 categories chosen from {json.dumps(CATEGORIES)}\n'
+    "No prose, no code fences.\n\n"
+    "Note:\n"
+)
+
+_JSON_OBJECT = re.compile(r"\{.*\}", re.DOTALL)
+
+
+@dataclass
+class OrganizeOutcome:
+    headings: List[Heading]
+    topics: List[str]
+    categories: List[str]
+    source: str  # 'llm', 'local' (confident keyphrases) or 'heuristic' (LLM fallback)
+    cached: bool = False
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(f"v{PROMPT_VERSION}\n{text}".encode("utf-8")).hexdigest()
+
+
+def _headings(value: Any) -> List[Heading]:
+    out: List[Heading] = []
+    for h in value if isinstance(value, list) else []:
+        if isinstance(h, dict) and str(h.get("text") or "").strip():
+            try:
+                level = min(max(int(h.get("level", 1)), 1), 3)
+            except (TypeError, ValueError):
+                level = 1
+            out.append(Heading(level=level, text=str(h["text"]).strip()))
+    return out
+
+
+def _strings(value: Any, limit: int) -> List[str]:
+    if isinstance(value, str):
+        value = value.split(",")
+    items = [str(v).strip() for v in value] if isinstance(value, list) else []
+    return [v for v in dict.fromkeys(items) if v][:limit]
+
+
+def parse_organize(raw: Optional[str]) -> Optional[dict]:
+    """Pull the JSON object out of a model reply; None if there is none."""
+    match = _JSON_OBJECT.search(raw or "")
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group(0))
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    allowed = {c.lower(): c for c in CATEGORIES}
+    return {
+        "headings": _headings(data.get("headings")),
+        "topics": _strings(data.get("topics"), 5),
+        "categories": [allowed[c.lower()] for c in _strings(data.get("categories"), 3) if c.lower() in allowed],
+    }
+
+
+class NoteOrganizer:
+    def __init__(self) -> None:
+        self.llm_calls = 0
+        self.cache_hits = 0
+        self.fallbacks = 0
+        self.local = 0
+
+    async def organize(self, db: Session, llm, text: str, *, use_cache: bool = True, user_id: Optional[int] = None) -> OrganizeOutcome:
+        key = content_hash(text)
+        if use_cache:
+            row = db.get(OrganizeCache, key)
+            if row is not None:
+                self.cache_hits += 1
+                return OrganizeOutcome(
+                    headings=[Heading(**h) for h in row.headings],
+                    topics=list(row.topics),
+                    categories=list(row.categories),
+                    source="llm",
+                    cached=True,
+                )
+
+        # Corpus statistics may need loading on first use, so keep it off the event loop
+        fallback, confident = await asyncio.to_thread(organize_local, text, user_id)
+        if confident and settings.organize_prefer_local:
+            self.local += 1
+            return OrganizeOutcome(fallback.headings, fallback.topics, fallback.categories, source="local")
+
+        parsed = None
+        if llm is not None:
+            self.llm_calls += 1
+            try:
+                raw = await llm.chat_completion(
+                    [{"role": "user", "content": ORGANIZE_PROMPT + text[:MAX_INPUT_CHARS]}],
+                    temperature=0.2,
+                    max_tokens=700,
+                )
+                parsed = parse_organize(raw)
+                if parsed is None:
+                    logger.warning("Organize reply was not valid JSON; using heuristics")
+            except Exception as e:
+                logger.error(f"Organize LLM call failed: {e}")
+
+        if parsed is None:
+            self.fallbacks += 1
+            return OrganizeOutcome(fallback.headings, fallback.topics, fallback.categories, source="heuristic")
+
+        # Fill any field the model left empty
+        outcome = OrganizeOutcome(
+            headings=parsed["headings"] or fallback.headings,
+            topics=parsed["topics"] or fallback.topics,
+            categories=parsed["categories"] or fallback.categories,
+            source="llm",
+        )
+        self._store(db, key, outcome, getattr(llm, "model", None))
+        return outcome
+
+    async def organize_document(self, db: Session, llm, text: str, *, use_cache: bool = True, user_id: Optional[int] = None) -> OrganizeOutcome:
+        """Organize text of any length: one call when it fits, else per section and merged.
+        Sections run concurrently, each with a session of its own (`db` is only used
+        for a single section), since a Session must not be shared between tasks."""
+        sections = split_sections(text, MAX_INPUT_CHARS)
+        if len(sections) == 1:
+            return await self.organize(db, llm, sections[0], use_cache=use_cache, user_id=user_id)
+        limiter = asyncio.Semaphore(settings.organize_section_concurrency)
+
+        async def one(section: str) -> OrganizeOutcome:
+            async with limiter:
+                section_db = SessionLocal()
+                try:
+                    return await self.organize(section_db, llm, section, use_cache=use_cache, user_id=user_id)
+                finally:
+                    section_db.close()
+
+        parts = await asyncio.gather(*(one(s) for s in sections))
+        return merge_outcomes(parts)
+
+    @staticmethod
+    def _store(db: Session, key: str, outcome: OrganizeOutcome, model: Optional[str]) -> None:
+        try:
+            db.merge(OrganizeCache(
+                content_hash=key,
+                headings=[h.model_dump() for h in outcome.headings],
+                topics=outcome.topics,
+                categories=outcome.categories,
+                model=model,
+            ))
+            db.commit()
+        except IntegrityError:
+            db.rollback()  # stored concurrently by another request
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Could not cache organize result: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "llm_calls": self.llm_calls,
+            "cache_hits": self.cache_hits,
+            "local": self.local,
+            "heuristic_fallbacks": self.fallbacks,
+        }
+
+
+def merge_outcomes(parts: List[OrganizeOutcome]) -> OrganizeOutcome:
+    """Combine per-section results: headings in document order, topics and
+    categories ranked by how many sections mention them."""
+    headings: List[Heading] = []
+    for part in parts:
+        for h in part.headings:
+            if not headings or headings[-1].text != h.text:
+                headings.append(h)
+    topics = Counter(t for part in parts for t in dict.fromkeys(part.topics))
+    categories = Counter(c for part in parts for c in dict.fromkeys(part.categories))
+    return OrganizeOutcome(
+        headings=headings,
+        topics=[t for t, _ in topics.most_common(5)],
+        categories=[c for c, _ in categories.most_common(3)],
+        source=next((s for s in ("llm", "local") if any(p.source == s for p in parts)), "heuristic"),
+        cached=all(p.cached for p in parts),
+    )
+
+
+_organizer: Optional[NoteOrganizer] = None
+
+
+def get_note_organizer() -> NoteOrganizer:
+    global _organizer
+    if _organizer is None:
+        _organizer = NoteOrganizer()
+    return _organizer
@@ -1,22 +1,41 @@
 from transformers import pipeline
 import torch
 from app.config import settings
+from app.services.inference_batcher import MicroBatcher
 import logging
 
 logger = logging.getLogger(__name__)
 
+NEUTRAL = {"label": "neutral", "confidence": 0.5}
+
 class Phi2Service:
     """Local emotion detection pipeline (privacy-focused)."""
     def __init__(self):
         self.device = 0 if torch.cuda.is_available() else -1
         model = settings.emotion_model
         self.analyzer = pipeline("sentiment-analysis", model=model, device=self.device)
+        self.batcher = MicroBatcher(
+            self.detect_emotion_batch,
+            max_batch=settings.emotion_batch_max_size,
+            max_wait_ms=settings.emotion_batch_max_wait_ms,
+            name="emotion",
+        )
         logger.info("Emotion detection model loaded")
 
-    def detect_emotion(self, text: str) -> dict:
+    def detect_emotion_batch(self, texts: list[str]) -> list[dict]:
+        """Blocking batched inference; runs on the batcher's thread."""
+        results = self.analyzer([t[:512] for t in texts], batch_size=len(texts), truncation=True)
+        return [{"label": r["label"].lower(), "confidence": float(r["score"])} for r in results]
+
+    async def detect_emotion(self, text: str) -> dict:
         try:
-            result = self.analyzer(text[:512])[0]
-            return {"label": result["label"].lower(), "confidence": float(result["score"]) }
+            return await self.batcher.submit(text)
         except Exception as e:
             logger.error(f"Emotion detection error: {e}")
-            return {"label": "neutral", "confidence": 0.5}
+            return dict(NEUTRAL)
+
+    def stats(self) -> dict:
+        return self.batcher.stats()
+
+    async def close(self) -> None:
+        await self.batcher.close()
@@ -0,0 +1,261 @@
+"""
+Latency-aware router in front of the LLM provider services.
+Tracks rolling latency and error rates per provider, sends each call to the
+fastest healthy provider, optionally hedges slow calls with a second provider
+and trips a circuit breaker on providers that keep failing.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+from app.config import settings
+from app.services.single_flight import get_single_flight
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+@dataclass
+class RoutedCompletion:
+    content: Optional[str]
+    provider: str
+    model: str
+    latency_ms: float
+    hedged: bool = False
+
+
+@dataclass
+class _Provider:
+    name: str
+    service: Any
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=max(10, settings.llm_latency_window)))
+    latency_ewma: Optional[float] = None
+    error_rate: float = 0.0  # EWMA of the failure indicator
+    successes: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    state: str = CLOSED
+    opened_at: float = 0.0
+    trial_in_flight: bool = False
+    inflight: int = 0
+
+    @property
+    def model(self) -> str:
+        return getattr(self.service, "model", self.name)
+
+    def p95(self) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def score(self) -> float:
+        latency = self.latency_ewma if self.latency_ewma is not None else settings.llm_default_latency_ms
+        return latency * (1.0 + 4.0 * self.error_rate)
+
+    def available(self, now: float) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and now - self.opened_at >= settings.llm_breaker_cooldown_s:
+            self.state = HALF_OPEN
+        # Half-open lets exactly one trial call through
+        return self.state == HALF_OPEN and not self.trial_in_flight
+
+    def record_success(self, latency_ms: Optional[float]) -> None:
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.error_rate *= 0.8
+        if latency_ms is not None:
+            self.latencies.append(latency_ms)
+            self.latency_ewma = latency_ms if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency_ms
+        if self.state != CLOSED:
+            logger.info(f"Provider {self.name} recovered; circuit closed")
+        self.state = CLOSED
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.error_rate = 0.8 * self.error_rate + 0.2
+        if self.state == HALF_OPEN or self.consecutive_failures >= settings.llm_breaker_failure_threshold:
+            if self.state != OPEN:
+                logger.warning(f"Provider {self.name} failing; circuit opened")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "state": self.state,
+            "latency_ewma_ms": round(self.latency_ewma, 1) if self.latency_ewma is not None else None,
+            "latency_p95_ms": self.p95(),
+            "error_rate": round(self.error_rate, 3),
+            "successes": self.successes,
+            "failures": self.failures,
+            "inflight": self.inflight,
+        }
+
+
+class ProviderRouter:
+    """Drop-in `llm` object: exposes `chat_completion` like a single provider service."""
+
+    def __init__(self, hedge: Optional[bool] = None) -> None:
+        self.hedge = settings.llm_hedge_enabled if hedge is None else hedge
+        self._providers: List[_Provider] = []
+
+    def register(self, name: str, service: Any) -> None:
+        self._providers.append(_Provider(name=name, service=service))
+
+    @property
+    def providers(self) -> List[str]:
+        return [p.name for p in self._providers]
+
+    @property
+    def model(self) -> str:
+        ranked = self._ranked()
+        return ranked[0].model if ranked else "unavailable"
+
+    @property
+    def cache_name(self) -> str:
+        """Stable identity for cache keys; `model` changes with the provider ranking."""
+        return "router:" + ",".join(sorted(self.providers))
+
+    def has_spare_capacity(self, reserve: float = 0.5) -> bool:
+        """True when some closed (healthy) provider is using less than (1 - reserve) of its
+        concurrency cap. Background work checks this so it never competes with interactive
+        chat. Read-only: unlike `available` it never moves a breaker to half-open, so the
+        single recovery probe is left to interactive traffic."""
+        for p in self._providers:
+            cap = getattr(p.service, "max_concurrency", 1)
+            if p.state == CLOSED and p.inflight < max(1, int(cap * (1.0 - reserve))):
+                return True
+        return False
+
+    def _ranked(self, prefer: Optional[str] = None) -> List[_Provider]:
+        now = time.monotonic()
+        healthy = [p for p in self._providers if p.available(now)]
+        pool = healthy or list(self._providers)  # all tripped: best effort beats failing outright
+        order = {p.name: i for i, p in enumerate(self._providers)}
+        return sorted(pool, key=lambda p: (p.score(), p.name != prefer, order[p.name]))
+
+    def _hedge_delay(self, provider: _Provider) -> float:
+        delay = provider.p95() or settings.llm_default_latency_ms
+        delay = min(max(delay, settings.llm_hedge_min_delay_ms), settings.llm_hedge_max_delay_ms)
+        return delay / 1000.0
+
+    async def _call(self, provider: _Provider, messages: list, params: dict) -> Optional[str]:
+        trial = provider.state == HALF_OPEN
+        if trial:
+            provider.trial_in_flight = True
+        provider.inflight += 1
+        started = time.perf_counter()
+        try:
+            content = await provider.service.chat_completion(messages, **params)
+        except asyncio.CancelledError:
+            raise  # a cancelled hedge loser says nothing about provider health
+        except Exception as e:
+            logger.warning(f"Provider {provider.name} failed: {e}")
+            provider.record_failure()
+            raise
+        else:
+            provider.record_success((time.perf_counter() - started) * 1000)
+            return content
+        finally:
+            provider.inflight -= 1
+            if trial:
+                provider.trial_in_flight = False
+
+    async def complete(self, messages: list, *, prefer: Optional[str] = None, hedge: Optional[bool] = None, **params) -> RoutedCompletion:
+        candidates = self._ranked(prefer)
+        if not candidates:
+            raise RuntimeError("No LLM provider configured")
+        hedge = self.hedge if hedge is None else hedge
+        started = time.perf_counter()
+        pending: Dict[asyncio.Task, _Provider] = {}
+        last_error: Optional[BaseException] = None
+        hedged = False
+
+        def launch() -> None:
+            provider = candidates.pop(0)
+            pending[asyncio.create_task(self._call(provider, messages, params))] = provider
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if hedge and candidates and len(pending) == 1:
+                    timeout = self._hedge_delay(next(iter(pending.values())))
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    launch()
+                    continue
+                for task in done:
+                    provider = pending.pop(task)
+                    try:
+                        content = task.result()
+                    except Exception as e:
+                        last_error = e
+                        continue
+                    return RoutedCompletion(
+                        content=content,
+                        provider=provider.name,
+                        model=provider.model,
+                        latency_ms=round((time.perf_counter() - started) * 1000, 1),
+                        hedged=hedged,
+                    )
+                if not pending and candidates:
+                    launch()  # fail over to the next provider
+            raise last_error or RuntimeError("All LLM providers failed")
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def chat_completion(self, messages: list, stream: bool = False, *, prefer: Optional[str] = None, **params):
+        if stream:
+            return self._stream(messages, prefer, params)
+        result = await self.complete(messages, prefer=prefer, **params)
+        return result.content
+
+    async def _stream(self, messages: list, prefer: Optional[str], params: dict):
+        # Fail over only until the first chunk; after that the reply is committed
+        # to one provider.
+        last_error: Optional[BaseException] = None
+        for provider in self._ranked(prefer):
+            started = time.perf_counter()
+            yielded = False
+            provider.inflight += 1  # a stream holds a provider slot until it ends
+            try:
+                stream = await provider.service.chat_completion(messages, stream=True, **params)
+                async with aclosing(stream):
+                    async for chunk in stream:
+                        if not yielded:
+                            yielded = True
+                            # time-to-first-chunk is a different scale than full
+                            # completions, so it only feeds health, not latency
+                            provider.record_success(None)
+                            logger.info(f"Streaming from {provider.name}, first chunk after {(time.perf_counter() - started) * 1000:.0f}ms")
+                        yield chunk
+                return
+            except Exception as e:
+                provider.record_failure()
+                if yielded:
+                    raise
+                logger.warning(f"Provider {provider.name} stream failed before first chunk: {e}")
+                last_error = e
+            finally:
+                provider.inflight -= 1
+        raise last_error or RuntimeError("No LLM provider configured")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hedge": self.hedge,
+            "providers": {p.name: p.snapshot() for p in self._providers},
+            "single_flight": get_single_flight().stats(),
+        }
@@ -0,0 +1,175 @@
+"""
+Response cache for chat completions.
+Exact tier: keyed by the normalised prompt plus everything sent before it
+(system prompt, context) plus model and scope. Semantic tier: among entries
+sharing that prefix, reuse a response whose prompt embedding is close enough.
+The shared scope (replies reused across users) is exact-only: a near match
+can differ in a negation, which is fine within one user's history but not
+across users.
+Entries expire by TTL and are evicted LRU.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Set
+
+from app.config import settings
+from app.services import embeddings
+
+logger = logging.getLogger(__name__)
+
+_PUNCT = re.compile(r"[^\w\s]+")
+_SPACE = re.compile(r"\s+")
+
+SHARED_SCOPE = "shared"
+
+
+def normalize(text: str) -> str:
+    return _SPACE.sub(" ", _PUNCT.sub(" ", (text or "").lower())).strip()
+
+
+@dataclass
+class _Entry:
+    prefix: str
+    response: str
+    model: str
+    expires_at: float
+    embedding: Any = None
+
+
+@dataclass
+class CacheLookup:
+    key: str
+    prefix: str
+    model: str
+    embedding: Any = None
+    hit: Optional[str] = None  # None | "exact" | "semantic"
+    response: Optional[str] = None
+    similarity: Optional[float] = None
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl_s: Optional[float] = None,
+        similarity: Optional[float] = None,
+        semantic: Optional[bool] = None,
+    ) -> None:
+        self.max_entries = max_entries or settings.response_cache_max_entries
+        self.ttl_s = ttl_s or settings.response_cache_ttl_s
+        self.similarity = similarity or settings.response_cache_similarity
+        self.semantic = settings.response_cache_semantic if semantic is None else semantic
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._by_prefix: Dict[str, Set[str]] = {}
+        self.hits_exact = 0
+        self.hits_semantic = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _prefix(messages: list, model: str, scope: str) -> str:
+        head = [(m.get("role"), normalize(m.get("content", ""))) for m in messages[:-1]]
+        raw = json.dumps([scope, model, head], separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def lookup(self, messages: list, *, model: str, scope: str = SHARED_SCOPE) -> CacheLookup:
+        prompt = normalize(messages[-1].get("content", "")) if messages else ""
+        prefix = self._prefix(messages, model, scope)
+        key = hashlib.sha256(f"{prefix}:{prompt}".encode("utf-8")).hexdigest()
+        result = CacheLookup(key=key, prefix=prefix, model=model)
+        now = time.monotonic()
+
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at > now:
+            self._entries.move_to_end(key)
+            self.hits_exact += 1
+            result.hit, result.response, result.similarity, result.model = "exact", entry.response, 1.0, entry.model
+            return result
+
+        if self.semantic and scope != SHARED_SCOPE and embeddings.available():
+            try:
+                vecs = await embeddings.embed([prompt])
+            except Exception as e:
+                logger.warning(f"Semantic cache lookup skipped: {e}")
+                vecs = None
+            if vecs is not None:
+                result.embedding = vecs[0]
+                best_key, best_sim = self._nearest(prefix, result.embedding, now)
+                if best_key is not None and best_sim >= self.similarity:
+                    self._entries.move_to_end(best_key)
+                    self.hits_semantic += 1
+                    best = self._entries[best_key]
+                    result.hit, result.response, result.similarity, result.model = "semantic", best.response, best_sim, best.model
+                    return result
+
+        self.misses += 1
+        return result
+
+    def _nearest(self, prefix: str, vec, now: float):
+        import numpy as np
+        keys = [k for k in self._by_prefix.get(prefix, ()) if self._entries[k].embedding is not None and self._entries[k].expires_at > now]
+        if not keys:
+            return None, 0.0
+        sims = np.stack([self._entries[k].embedding for k in keys]) @ vec
+        i = int(np.argmax(sims))
+        return keys[i], float(sims[i])
+
+    def store(self, lookup: CacheLookup, response: str, model: Optional[str] = None) -> None:
+        if not response:
+            return
+        self._drop(lookup.key)
+        self._entries[lookup.key] = _Entry(
+            prefix=lookup.prefix,
+            response=response,
+            model=model or lookup.model,
+            expires_at=time.monotonic() + self.ttl_s,
+            embedding=lookup.embedding,
+        )
+        self._by_prefix.setdefault(lookup.prefix, set()).add(lookup.key)
+        self.stores += 1
+        self._evict()
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._by_prefix.get(entry.prefix)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_prefix[entry.prefix]
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        expired = [k for k, e in self._entries.items() if e.expires_at <= now] if len(self._entries) > self.max_entries else []
+        for k in expired:
+            self._drop(k)
+            self.evictions += 1
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_prefix.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits_exact + self.hits_semantic + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits_exact": self.hits_exact,
+            "hits_semantic": self.hits_semantic,
+            "misses": self.misses,
+            "hit_rate": round((self.hits_exact + self.hits_semantic) / lookups, 3) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "semantic_enabled": self.semantic and embeddings.available(),
+        }
@@ -0,0 +1,214 @@
+"""
+Full-text search over notes and chat messages.
+Both tables are mirrored into external-content FTS5 indexes (the text is not
+stored twice) that SQLite triggers keep in sync on every insert, update and
+delete, whatever code path writes the rows. Results are ranked with BM25 and
+come with highlighted snippets; notes can be filtered by owner, topic and
+date, messages by owner (through their conversation) and date.
+
+FTS5 is SQLite-only; on other databases `available()` is False and the
+search API reports that instead of scanning.
+
+Rebuild the indexes from existing rows with:
+    python -m app.services.search_index --rebuild
+"""
+from __future__ import annotations
+
+import logging
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.database import engine as default_engine, ensure_column
+
+logger = logging.getLogger(__name__)
+
+TOKENIZER = "porter unicode61 remove_diacritics 2"
+
+_SCHEMA = [
+    "CREATE INDEX IF NOT EXISTS ix_notes_user_id ON notes (user_id)",
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(path, content, content='notes', content_rowid='id', tokenize='{TOKENIZER}')",
+    """CREATE TRIGGER IF NOT EXISTS notes_fts_ai AFTER INSERT ON notes BEGIN
+        INSERT INTO notes_fts(rowid, path, content) VALUES (new.id, new.path, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS notes_fts_ad AFTER DELETE ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, path, content) VALUES ('delete', old.id, old.path, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS notes_fts_au AFTER UPDATE OF path, content ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, path, content) VALUES ('delete', old.id, old.path, old.content);
+        INSERT INTO notes_fts(rowid, path, content) VALUES (new.id, new.path, new.content);
+    END""",
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(content, content='messages', content_rowid='id', tokenize='{TOKENIZER}')",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+]
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+SNIPPET_START, SNIPPET_END = "<mark>", "</mark>"
+
+
+def available(engine: Optional[Engine] = None) -> bool:
+    return (engine or default_engine).dialect.name == "sqlite"
+
+
+def ensure_search_schema(engine: Optional[Engine] = None) -> bool:
+    """Create the FTS tables and triggers (idempotent). Returns True if the notes
+    index was created just now and existing rows need a rebuild."""
+    engine = engine or default_engine
+    ensure_column("notes", "user_id", "INTEGER", engine)
+    if not available(engine):
+        return False
+    with engine.begin() as conn:
+        existed = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'notes_fts'")).first() is not None
+        for stmt in _SCHEMA:
+            conn.execute(text(stmt))
+    if not existed:
+        rebuild(engine)
+    return not existed
+
+
+def rebuild(engine: Optional[Engine] = None) -> None:
+    """Re-read every note and message into the indexes."""
+    with (engine or default_engine).begin() as conn:
+        conn.execute(text("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')"))
+        conn.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+        conn.execute(text("INSERT INTO notes_fts(notes_fts) VALUES ('optimize')"))
+        conn.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('optimize')"))
+    logger.info("Search indexes rebuilt")
+
+
+def build_match(query: str, mode: str = "all") -> Optional[str]:
+    """Turn free text into a safe FTS5 expression: every word is quoted (so
+    user input never hits FTS syntax), the last one also matches as a prefix."""
+    terms = _TERM.findall(query or "")
+    if not terms:
+        return None
+    if mode == "phrase":
+        return '"' + " ".join(terms) + '"'
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += "*"
+    return (" OR " if mode == "any" else " AND ").join(quoted)
+
+
+@dataclass
+class SearchHit:
+    kind: str  # 'note' | 'message'
+    id: int
+    score: float
+    snippet: str
+    created_at: Optional[str]
+    extra: Dict[str, Any]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"kind": self.kind, "id": self.id, "score": self.score, "snippet": self.snippet, "created_at": self.created_at, **self.extra}
+
+
+def _iso(value) -> Optional[str]:
+    if value is None:
+        return None
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def search_notes(
+    db: Session,
+    match: str,
+    *,
+    user_id: Optional[int] = None,
+    topic: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 20,
+    offset: int = 0,
+) -> List[SearchHit]:
+    where = ["notes_fts MATCH :match"]
+    params: Dict[str, Any] = {"match": match, "limit": limit, "offset": offset, "s0": SNIPPET_START, "s1": SNIPPET_END}
+    if user_id is not None:
+        # Notes from before ownership was tracked stay visible, like the rest of the notes API
+        where.append("(n.user_id = :user_id OR n.user_id IS NULL)")
+        params["user_id"] = user_id
+    if topic:
+        where.append(
+            "EXISTS (SELECT 1 FROM note_topic nt JOIN topics t ON t.id = nt.topic_id "
+            "WHERE nt.note_id = n.id AND t.name = :topic)"
+        )
+        params["topic"] = topic
+    if since is not None:
+        where.append("n.created_at >= :since")
+        params["since"] = since.isoformat(" ")
+    if until is not None:
+        where.append("n.created_at < :until")
+        params["until"] = until.isoformat(" ")
+    sql = (
+        "SELECT n.id, n.path, n.created_at, bm25(notes_fts, 2.0, 1.0) AS score, "
+        "snippet(notes_fts, 1, :s0, :s1, '…', 16) AS snip "
+        "FROM notes_fts JOIN notes n ON n.id = notes_fts.rowid "
+        f"WHERE {' AND '.join(where)} ORDER BY score LIMIT :limit OFFSET :offset"
+    )
+    return [
+        SearchHit("note", r.id, round(-r.score, 4), r.snip, _iso(r.created_at), {"path": r.path})
+        for r in db.execute(text(sql), params)
+    ]
+
+
+def search_messages(
+    db: Session,
+    match: str,
+    *,
+    user_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 20,
+    offset: int = 0,
+) -> List[SearchHit]:
+    where = ["messages_fts MATCH :match"]
+    params: Dict[str, Any] = {"match": match, "limit": limit, "offset": offset, "s0": SNIPPET_START, "s1": SNIPPET_END}
+    join = ""
+    if user_id is not None:
+        join = "JOIN conversations c ON c.id = m.conversation_id "
+        where.append("c.user_id = :user_id")
+        params["user_id"] = user_id
+    if since is not None:
+        where.append("m.created_at >= :since")
+        params["since"] = since.isoformat(" ")
+    if until is not None:
+        where.append("m.created_at < :until")
+        params["until"] = until.isoformat(" ")
+    sql = (
+        "SELECT m.id, m.conversation_id, m.role, m.created_at, bm25(messages_fts) AS score, "
+        "snippet(messages_fts, 0, :s0, :s1, '…', 16) AS snip "
+        f"FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid {join}"
+        f"WHERE {' AND '.join(where)} ORDER BY score LIMIT :limit OFFSET :offset"
+    )
+    return [
+        SearchHit("message", r.id, round(-r.score, 4), r.snip, _iso(r.created_at), {"conversation_id": r.conversation_id, "role": r.role})
+        for r in db.execute(text(sql), params)
+    ]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage the notes/messages full-text index")
+    parser.add_argument("--rebuild", action="store_true", help="re-index all existing notes and messages")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    from app.database import Base
+    from app.models import user as _user, note as _note, conversation as _conv, message as _msg  # ensure models are imported
+    Base.metadata.create_all(bind=default_engine)
+    created = ensure_search_schema()
+    if args.rebuild and not created:
+        rebuild()
+    print("Search index ready.")
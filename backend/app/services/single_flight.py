@@ -0,0 +1,82 @@
+"""
+Single-flight coalescing for identical in-flight calls.
+The first caller for a key (the leader) starts the call as a task; callers
+arriving while it runs (followers) await the same task instead of issuing
+their own. Everyone gets the leader's result or its exception. A caller
+that is cancelled only detaches itself; the shared call is cancelled once
+nobody is waiting for it any more.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task) -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._inflight: Dict[str, _Flight] = {}
+        self.calls = 0
+        self.leaders = 0
+        self.coalesced = 0
+        self.failed = 0
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        raw = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        self.calls += 1
+        flight = self._inflight.get(key)
+        if flight is None:
+            self.leaders += 1
+            flight = _Flight(asyncio.create_task(fn()))
+            self._inflight[key] = flight
+            flight.task.add_done_callback(lambda t, k=key, f=flight: self._done(k, f, t))
+        else:
+            self.coalesced += 1
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def _done(self, key: str, flight: _Flight, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.failed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "upstream_calls": self.leaders,
+            "coalesced": self.coalesced,
+            "coalescing_ratio": round(self.coalesced / self.calls, 3) if self.calls else 0.0,
+            "failed_flights": self.failed,
+            "in_flight": len(self._inflight),
+        }
+
+
+_single_flight: Optional[SingleFlight] = None
+
+
+def get_single_flight() -> SingleFlight:
+    global _single_flight
+    if _single_flight is None:
+        _single_flight = SingleFlight()
+    return _single_flight
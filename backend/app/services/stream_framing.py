@@ -0,0 +1,147 @@
+"""
+Output framing for token streams.
+By default every token becomes its own SSE frame. Clients can opt in to
+coalesced frames, where tokens are grouped until a time window passes or a
+byte budget fills, to NDJSON instead of SSE, and to gzip with a sync flush
+after every frame so nothing waits in the compressor. A coalesced frame
+carries the concatenated text in the same {"token": ...} field, so clients
+that append tokens need no changes.
+
+Options come from query parameters or headers:
+    format=sse|ndjson          X-Stream-Format
+    coalesce=true              X-Stream-Coalesce   (window_ms / max_bytes override the defaults)
+    compress=gzip              X-Stream-Compress   (only if Accept-Encoding allows gzip)
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import zlib
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional
+
+import anyio
+from starlette.requests import HTTPConnection
+
+from app.config import settings
+
+_TRUE = {"1", "true", "yes", "on"}
+
+
+@dataclass
+class StreamOptions:
+    format: str = "sse"
+    window_ms: float = 0.0  # 0 = one frame per token
+    max_bytes: int = 0
+    gzip: bool = False
+
+    @property
+    def media_type(self) -> str:
+        return "application/x-ndjson" if self.format == "ndjson" else "text/event-stream"
+
+    @classmethod
+    def from_request(cls, req: HTTPConnection) -> "StreamOptions":
+        def opt(query: str, header: str) -> Optional[str]:
+            value = req.query_params.get(query) or req.headers.get(header)
+            return value.strip().lower() if value else None
+
+        options = cls(format="ndjson" if opt("format", "x-stream-format") == "ndjson" else "sse")
+        if (opt("coalesce", "x-stream-coalesce") or "") in _TRUE:
+            options.window_ms = _bounded(req.query_params.get("window_ms"), settings.stream_coalesce_window_ms, 0, 1000)
+            options.max_bytes = int(_bounded(req.query_params.get("max_bytes"), settings.stream_coalesce_max_bytes, 1, 65536))
+        accepts_gzip = "gzip" in (req.headers.get("accept-encoding") or "").lower()
+        options.gzip = accepts_gzip and opt("compress", "x-stream-compress") == "gzip"
+        return options
+
+    def headers(self) -> Dict[str, str]:
+        headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        if self.gzip:
+            headers["Content-Encoding"] = "gzip"
+            headers["Vary"] = "Accept-Encoding"
+        return headers
+
+
+def _bounded(raw: Optional[str], default: float, low: float, high: float) -> float:
+    try:
+        value = float(raw) if raw is not None else float(default)
+    except ValueError:
+        value = float(default)
+    return min(max(value, low), high)
+
+
+class FrameEncoder:
+    """Turn event dicts into SSE or NDJSON frames, optionally gzip-compressed."""
+
+    def __init__(self, options: StreamOptions) -> None:
+        self.options = options
+        self._gzip = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if options.gzip else None
+
+    def _out(self, text: str) -> bytes:
+        data = text.encode("utf-8")
+        if self._gzip is None:
+            return data
+        return self._gzip.compress(data) + self._gzip.flush(zlib.Z_SYNC_FLUSH)
+
+    def event(self, obj: Dict[str, Any]) -> bytes:
+        payload = json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+        if self.options.format == "ndjson":
+            return self._out(payload + "\n")
+        return self._out(f"data: {payload}\n\n")
+
+    def end(self) -> bytes:
+        """End-of-stream marker (SSE only) plus the gzip trailer."""
+        data = self._out("data: [DONE]\n\n") if self.options.format == "sse" else b""
+        if self._gzip is not None:
+            data += self._gzip.flush()
+        return data
+
+
+async def coalesce(tokens: AsyncIterator[str], *, window_ms: float, max_bytes: int) -> AsyncIterator[str]:
+    """Group `tokens` into chunks. A chunk is emitted once `max_bytes` is reached or
+    `window_ms` after its first token, whichever comes first, even if the
+    source is still waiting for its next token."""
+    if window_ms <= 0 and max_bytes <= 0:
+        async for token in tokens:
+            yield token
+        return
+    loop = asyncio.get_running_loop()
+    window = window_ms / 1000.0
+    source = tokens.__aiter__()
+    buf: list[str] = []
+    size = 0
+    deadline: Optional[float] = None
+    # The pending read is kept across flushes rather than cancelled on timeout,
+    # since cancelling an async generator mid-step would end it.
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(source.__anext__())
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            done, _ = await asyncio.wait((pending,), timeout=timeout)
+            if not done:
+                yield "".join(buf)
+                buf, size, deadline = [], 0, None
+                continue
+            future, pending = pending, None
+            try:
+                token = future.result()
+            except StopAsyncIteration:
+                break
+            buf.append(token)
+            size += len(token.encode("utf-8"))
+            if deadline is None:
+                deadline = loop.time() + window
+            if max_bytes and size >= max_bytes:
+                yield "".join(buf)
+                buf, size, deadline = [], 0, None
+        if buf:
+            yield "".join(buf)
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+            with anyio.CancelScope(shield=True):
+                try:
+                    await pending
+                except (asyncio.CancelledError, Exception):
+                    pass
@@ -0,0 +1,83 @@
+"""
+Async token streaming from LLM providers.
+Pulls deltas from the provider stream only as fast as the consumer takes them
+(natural backpressure), stops early when asked to, and always closes the
+upstream response so an abandoned stream does not keep generating.
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+import anyio
+
+
+@dataclass
+class StreamStats:
+    started_at: float = field(default_factory=time.perf_counter)
+    first_token_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    tokens: int = 0  # provider deltas, roughly one token each
+    cancelled: bool = False
+
+    @property
+    def ttft_ms(self) -> Optional[float]:
+        if self.first_token_at is None:
+            return None
+        return round((self.first_token_at - self.started_at) * 1000, 1)
+
+    @property
+    def tokens_per_sec(self) -> Optional[float]:
+        if self.first_token_at is None or self.finished_at is None:
+            return None
+        elapsed = self.finished_at - self.first_token_at
+        return round(self.tokens / elapsed, 1) if elapsed > 0 else None
+
+    def as_dict(self) -> dict:
+        end = self.finished_at or time.perf_counter()
+        return {
+            "ttft_ms": self.ttft_ms,
+            "tokens": self.tokens,
+            "tokens_per_sec": self.tokens_per_sec,
+            "duration_ms": round((end - self.started_at) * 1000, 1),
+            "cancelled": self.cancelled,
+        }
+
+
+def delta_text(chunk) -> Optional[str]:
+    choices = getattr(chunk, "choices", None)
+    if not choices:
+        return None
+    delta = getattr(choices[0], "delta", None)
+    return getattr(delta, "content", None) if delta else None
+
+
+async def iter_tokens(
+    llm,
+    messages: list,
+    stats: StreamStats,
+    *,
+    should_stop: Optional[Callable[[], Awaitable[bool]]] = None,
+    **params,
+) -> AsyncIterator[str]:
+    """Yield content tokens as they arrive from `llm`'s streaming completion."""
+    stream = await llm.chat_completion(messages, stream=True, **params)
+    try:
+        async for chunk in stream:
+            token = delta_text(chunk)
+            if not token:
+                continue
+            if stats.first_token_at is None:
+                stats.first_token_at = time.perf_counter()
+            stats.tokens += 1
+            yield token
+            if should_stop is not None and await should_stop():
+                stats.cancelled = True
+                break
+    finally:
+        stats.finished_at = time.perf_counter()
+        # Shielded so the upstream response is released even while the
+        # surrounding task is being cancelled by a client disconnect.
+        with anyio.CancelScope(shield=True):
+            await stream.aclose()
@@ -0,0 +1,102 @@
+"""
+Local token counting with the tokenizer bundled at the repo root
+(tokenizer.json). Falls back to a ~4 chars/token estimate when the
+`tokenizers` package or the file is unavailable. Counts are memoized in a
+bounded LRU keyed by a hash of the text, since the same system prompts,
+history messages and summaries are counted again on every turn.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Chat formats wrap every message in a few role/separator tokens
+MESSAGE_OVERHEAD = 4
+
+
+class TokenCounter:
+    def __init__(self, path: Optional[str] = None, cache_size: Optional[int] = None) -> None:
+        self.path = path or settings.tokenizer_path
+        self.cache_size = settings.token_cache_size if cache_size is None else cache_size
+        self._cache: "OrderedDict[bytes, int]" = OrderedDict()
+        self._lock = threading.Lock()  # counts also happen on worker threads
+        self.hits = 0
+        self.misses = 0
+        self._tokenizer = None
+        try:
+            from tokenizers import Tokenizer  # type: ignore
+            self._tokenizer = Tokenizer.from_file(self.path)
+            logger.info(f"Token counter using {self.path}")
+        except Exception as e:
+            logger.warning(f"Tokenizer unavailable ({e}); using length-based token estimates")
+
+    @property
+    def exact(self) -> bool:
+        return self._tokenizer is not None
+
+    def _count(self, text: str) -> int:
+        if self._tokenizer is not None:
+            return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+        return max(1, len(text) // 4)
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.cache_size <= 0:
+            return self._count(text)
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        with self._lock:
+            n = self._cache.get(key)
+            if n is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return n
+        n = self._count(text)
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = n
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return n
+
+    def count_messages(self, messages: Iterable[dict]) -> int:
+        return sum(self.count(m.get("content") or "") + MESSAGE_OVERHEAD for m in messages)
+
+    def truncate(self, text: str, max_tokens: int, *, keep_end: bool = False) -> str:
+        """Cut `text` to at most `max_tokens`, keeping the start (or the end)."""
+        if max_tokens <= 0 or not text:
+            return ""
+        if self._tokenizer is None:
+            limit = max_tokens * 4
+            return text[-limit:] if keep_end else text[:limit]
+        enc = self._tokenizer.encode(text, add_special_tokens=False)
+        if len(enc.ids) <= max_tokens:
+            return text
+        if keep_end:
+            return text[enc.offsets[-max_tokens][0]:]
+        return text[:enc.offsets[max_tokens - 1][1]]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "exact": self.exact,
+            "cached": len(self._cache),
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+_counter: Optional[TokenCounter] = None
+
+
+def get_token_counter() -> TokenCounter:
+    global _counter
+    if _counter is None:
+        _counter = TokenCounter()
+    return _counter
@@ -0,0 +1,249 @@
+"""
+Topic lookups in bulk.
+`resolve` maps a batch of topic names to ids with at most three statements
+(select known names, insert-or-ignore the missing ones, select those back),
+and remembers name -> id in a bounded LRU shared by all requests, so common
+topics usually cost no query at all. Saving a note with its topics is then
+a constant number of statements however many topics it has. The note texts
+also feed the keyphrase document frequencies in the same transaction, and
+duplicates of existing notes are skipped, merged or versioned (services/dedup.py).
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.note import Note, Topic, note_topic
+from app.services.dedup import POLICIES, Signature, get_deduplicator
+from app.services.keyphrases import get_keyphrase_engine
+
+logger = logging.getLogger(__name__)
+
+
+def _clean(names: Iterable[str]) -> List[str]:
+    return list(dict.fromkeys(n.strip() for n in names if n and n.strip()))
+
+
+@dataclass
+class SavedNote:
+    note: Note
+    action: str  # 'created' | 'skipped' | 'merged' | 'versioned'
+    duplicate_of: Optional[int] = None
+    similarity: Optional[float] = None
+
+
+class TopicRepository:
+    def __init__(self, max_entries: Optional[int] = None) -> None:
+        self.max_entries = max_entries or settings.topic_cache_size
+        self._ids: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()  # also used from worker threads (bulk import)
+
+    def _cached(self, names: List[str]) -> Dict[str, int]:
+        found: Dict[str, int] = {}
+        with self._lock:
+            for name in names:
+                topic_id = self._ids.get(name)
+                if topic_id is not None:
+                    self._ids.move_to_end(name)
+                    found[name] = topic_id
+        return found
+
+    def _remember(self, ids: Dict[str, int]) -> None:
+        with self._lock:
+            for name, topic_id in ids.items():
+                self._ids[name] = topic_id
+                self._ids.move_to_end(name)
+            while len(self._ids) > self.max_entries:
+                self._ids.popitem(last=False)
+
+    def resolve(self, db: Session, names: Iterable[str]) -> Dict[str, int]:
+        """name -> topic id for every name, creating missing topics (not committed)."""
+        wanted = _clean(names)
+        ids = self._cached(wanted)
+        missing = [n for n in wanted if n not in ids]
+        if missing:
+            fetched = dict(db.query(Topic.name, Topic.id).filter(Topic.name.in_(missing)).all())
+            new = [n for n in missing if n not in fetched]
+            if new:
+                self._insert_missing(db, new)
+                fetched.update(db.query(Topic.name, Topic.id).filter(Topic.name.in_(new)).all())
+            ids.update(fetched)
+            self._remember(fetched)
+        return ids
+
+    @staticmethod
+    def _insert_missing(db: Session, names: List[str]) -> None:
+        rows = [{"name": n} for n in names]
+        dialect = db.get_bind().dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            if dialect == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            db.execute(insert(Topic).on_conflict_do_nothing(index_elements=["name"]), rows)
+            return
+        # Other backends: one savepoint per name so a concurrent insert is not fatal
+        for row in rows:
+            try:
+                with db.begin_nested():
+                    db.execute(Topic.__table__.insert(), [row])
+            except IntegrityError:
+                pass
+
+    def forget(self, names: Optional[Iterable[str]] = None) -> None:
+        with self._lock:
+            if names is None:
+                self._ids.clear()
+            else:
+                for name in names:
+                    self._ids.pop(name, None)
+
+    def add_note(self, db: Session, path: Optional[str], content: str, topics: Iterable[str], user_id: Optional[int] = None, policy: Optional[str] = None) -> Note:
+        """Insert a note linked to `topics` and commit."""
+        return self.save_notes(db, [(path, content, list(topics))], user_id=user_id, policy=policy)[0].note
+
+    def add_notes(self, db: Session, items: List[Tuple[Optional[str], str, List[str]]], user_id: Optional[int] = None, policy: Optional[str] = None) -> List[Note]:
+        """Insert (path, content, topics) notes in one transaction and commit."""
+        return [saved.note for saved in self.save_notes(db, items, user_id=user_id, policy=policy)]
+
+    def save_notes(
+        self,
+        db: Session,
+        items: List[Tuple[Optional[str], str, List[str]]],
+        user_id: Optional[int] = None,
+        policy: Optional[str] = None,
+        threshold: Optional[float] = None,
+    ) -> List[SavedNote]:
+        """Insert (path, content, topics) notes in one transaction and commit.
+        Duplicates of the user's notes, or of each other, are handled by `policy`:
+        'skip' keeps the existing note, 'merge' updates it with the new content
+        and topics, 'version' saves a new note linked to it, 'off' saves as is."""
+        policy = policy or settings.dedup_policy
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown dedup policy '{policy}'")
+        threshold = threshold or settings.dedup_threshold
+        dedup = get_deduplicator()
+        sigs = [Signature.of(content) for _, content, _ in items]
+        found = dedup.find(db, user_id, sigs, threshold) if policy != "off" else [None] * len(items)
+
+        # Plan first: which items become rows and what every duplicate points at,
+        # either a stored note ("db", id) or an earlier item of this batch ("batch", index)
+        targets: List[Optional[Tuple[str, int, float]]] = []
+        fresh: List[int] = []
+        for i, sig in enumerate(sigs):
+            target = ("db", found[i].note_id, found[i].similarity) if found[i] is not None else None
+            if policy != "off":
+                for j in fresh:
+                    sim = 1.0 if sig.content_hash == sigs[j].content_hash else sig.similarity(sigs[j].minhash)
+                    if sim >= threshold and (target is None or sim > target[2]):
+                        target = ("batch", j, sim)
+            if target is None or policy == "version":
+                fresh.append(i)
+            targets.append(target)
+
+        paths = {i: items[i][0] for i in fresh}
+        contents = {i: items[i][1] for i in fresh}
+        topics = {i: list(items[i][2]) for i in fresh}
+        merges: Dict[int, Tuple[Optional[str], str, Signature, List[str]]] = {}
+        for i, target in enumerate(targets):
+            if target is None or policy != "merge":
+                continue
+            kind, ref, _ = target
+            path, content, new_topics = items[i]
+            if kind == "batch":
+                paths[ref] = path or paths[ref]
+                contents[ref] = content
+                topics[ref] += new_topics
+                sigs[ref] = sigs[i]
+            else:
+                previous = merges.get(ref, (None, "", sigs[i], []))
+                merges[ref] = (path or previous[0], content, sigs[i], previous[3] + list(new_topics))
+        stored_ids = {t[1] for t in targets if t is not None and t[0] == "db"}
+        stored = {n.id: n for n in db.query(Note).filter(Note.id.in_(stored_ids))} if stored_ids else {}
+
+        changed = [note_id for note_id, merge in merges.items() if note_id in stored and merge[1] != stored[note_id].content]
+        corpus = get_keyphrase_engine().record(
+            db, user_id,
+            [contents[i] for i in fresh] + [merges[n][1] for n in changed],
+            removed=[stored[n].content for n in changed],
+        )
+
+        notes = {i: Note(path=paths[i], content=contents[i], user_id=user_id) for i in fresh}
+        db.add_all(notes.values())
+        for note_id in changed:
+            path, content, sig, _ = merges[note_id]
+            stored[note_id].content = content
+            if path:
+                stored[note_id].path = path
+            dedup.reindex(db, note_id, sig)
+        ids = self.resolve(db, [t for i in fresh for t in topics[i]] + [t for m in merges.values() for t in m[3]])
+        db.flush()
+
+        roots: Dict[int, Optional[int]] = {}
+        for i in fresh:
+            target = targets[i]
+            if target is None:
+                roots[i] = None
+            elif target[0] == "db":
+                roots[i] = found[i].root
+            else:
+                roots[i] = roots[target[1]] or notes[target[1]].id
+        dedup.index(db, [(notes[i].id, user_id, sigs[i], roots[i]) for i in fresh])
+
+        links = [
+            {"note_id": notes[i].id, "topic_id": topic_id}
+            for i in fresh
+            for topic_id in dict.fromkeys(ids[t] for t in _clean(topics[i]))
+        ]
+        merged_into = [n for n in merges if n in stored]
+        if merged_into:
+            linked = set(db.query(note_topic.c.note_id, note_topic.c.topic_id).filter(note_topic.c.note_id.in_(merged_into)))
+            links += [
+                {"note_id": note_id, "topic_id": topic_id}
+                for note_id in merged_into
+                for topic_id in dict.fromkeys(ids[t] for t in _clean(merges[note_id][3]))
+                if (note_id, topic_id) not in linked
+            ]
+        if links:
+            db.execute(note_topic.insert(), links)
+        try:
+            db.commit()
+        except Exception:
+            db.rollback()
+            # A cached id may point at a topic deleted behind our back
+            self.forget(ids)
+            raise
+        get_keyphrase_engine().apply(corpus)
+
+        saved: List[SavedNote] = []
+        for i, target in enumerate(targets):
+            if target is None:
+                saved.append(SavedNote(notes[i], "created"))
+                continue
+            kind, ref, sim = target
+            existing = notes[ref] if kind == "batch" else stored[ref]
+            if policy == "version":
+                saved.append(SavedNote(notes[i], "versioned", existing.id, sim))
+            else:
+                saved.append(SavedNote(existing, "merged" if policy == "merge" else "skipped", existing.id, sim))
+        return saved
+
+    def stats(self) -> dict:
+        return {"cached_topics": len(self._ids), "max_entries": self.max_entries}
+
+
+_repository: Optional[TopicRepository] = None
+
+
+def get_topic_repository() -> TopicRepository:
+    global _repository
+    if _repository is None:
+        _repository = TopicRepository()
+    return _repository
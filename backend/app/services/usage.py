@@ -0,0 +1,108 @@
+"""
+Token usage accounting.
+Every saved turn adds its prompt/completion token counts to a per user, day
+and model aggregate row in the same transaction as the messages, so usage
+reports never need to scan the messages table.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.message import Message
+from app.models.usage import UsageDaily
+
+
+@dataclass
+class TurnUsage:
+    model: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached: bool = False  # served from the response cache: counted, but no tokens billed
+
+
+_Key = Tuple[int, date, str]
+
+
+def record_usage(db: Session, entries: Iterable[Tuple[Optional[int], TurnUsage]], day: Optional[date] = None) -> None:
+    """Add turns to their aggregate rows. Does not commit; the caller's transaction does."""
+    day = day or datetime.utcnow().date()
+    totals: Dict[_Key, List[int]] = {}
+    for user_id, usage in entries:
+        row = totals.setdefault((user_id or 0, day, usage.model), [0, 0, 0, 0])
+        row[0] += 1
+        if usage.cached:
+            row[1] += 1
+        else:
+            row[2] += usage.prompt_tokens
+            row[3] += usage.completion_tokens
+    for key, values in totals.items():
+        if not _increment(db, key, values):
+            try:
+                with db.begin_nested():
+                    db.add(UsageDaily(
+                        user_id=key[0], day=key[1], model=key[2], requests=values[0],
+                        cached_requests=values[1], tokens_in=values[2], tokens_out=values[3],
+                    ))
+            except IntegrityError:
+                # Another writer created the row first
+                _increment(db, key, values)
+
+
+def _increment(db: Session, key: _Key, values: List[int]) -> bool:
+    user_id, day, model = key
+    updated = (
+        db.query(UsageDaily)
+        .filter(UsageDaily.user_id == user_id, UsageDaily.day == day, UsageDaily.model == model)
+        .update({
+            UsageDaily.requests: UsageDaily.requests + values[0],
+            UsageDaily.cached_requests: UsageDaily.cached_requests + values[1],
+            UsageDaily.tokens_in: UsageDaily.tokens_in + values[2],
+            UsageDaily.tokens_out: UsageDaily.tokens_out + values[3],
+            UsageDaily.updated_at: datetime.utcnow(),
+        }, synchronize_session=False)
+    )
+    return updated > 0
+
+
+def daily_usage(db: Session, *, user_id: Optional[int] = None, days: int = 30, model: Optional[str] = None) -> List[dict]:
+    """Usage per day and model over the last `days` days, for one user or everyone."""
+    since = datetime.utcnow().date() - timedelta(days=max(days, 1) - 1)
+    q = db.query(
+        UsageDaily.day,
+        UsageDaily.model,
+        func.sum(UsageDaily.requests),
+        func.sum(UsageDaily.cached_requests),
+        func.sum(UsageDaily.tokens_in),
+        func.sum(UsageDaily.tokens_out),
+    ).filter(UsageDaily.day >= since)
+    if user_id is not None:
+        q = q.filter(UsageDaily.user_id == user_id)
+    if model:
+        q = q.filter(UsageDaily.model == model)
+    rows = q.group_by(UsageDaily.day, UsageDaily.model).order_by(UsageDaily.day.desc(), UsageDaily.model).all()
+    return [
+        {
+            "day": d.isoformat(),
+            "model": m,
+            "requests": int(req or 0),
+            "cached_requests": int(cached or 0),
+            "tokens_in": int(t_in or 0),
+            "tokens_out": int(t_out or 0),
+        }
+        for d, m, req, cached, t_in, t_out in rows
+    ]
+
+
+def conversation_usage(db: Session, conversation_id: int) -> dict:
+    t_in, t_out, count = (
+        db.query(func.sum(Message.tokens_in), func.sum(Message.tokens_out), func.count(Message.id))
+        .filter(Message.conversation_id == conversation_id, Message.role == "assistant")
+        .one()
+    )
+    return {"conversation_id": conversation_id, "replies": int(count or 0), "tokens_in": int(t_in or 0), "tokens_out": int(t_out or 0)}
@@ -0,0 +1,632 @@
+"""
+Semantic index over notes and chat messages, without an external vector DB.
+
+Each corpus (notes, messages) is a `VectorStore`: an append-only matrix of
+L2-normalised embeddings memory-mapped from disk (float32, or int8 with a
+per-row scale at a quarter of the size), a row-metadata file (key, content
+hash, scale) and a tombstone file. Re-embedding a row appends a new version
+and tombstones the old one; `compact` rewrites the files once enough rows are
+dead. Search is a chunked matrix-vector product plus `argpartition`; large
+stores add a k-means coarse index and only scan the closest clusters.
+
+Embeddings are computed in batches and reused by content hash, so identical
+texts (repeated messages, re-imported notes) are encoded once. `SemanticIndex`
+keeps the stores in step with the database: new rows are picked up past a
+high-water mark, deleted ones are tombstoned by a periodic reconcile.
+
+Maintenance:
+    python -m app.services.vector_index [--reconcile] [--compact] [--rebuild]
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np  # type: ignore
+except Exception:  # pragma: no cover
+    np = None  # type: ignore
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.conversation import Conversation
+from app.models.message import Message
+from app.models.note import Note
+from app.services import embeddings
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+MAX_EMBED_CHARS = 2000  # MiniLM only reads the first ~256 tokens anyway
+SCAN_CHUNK_ROWS = 65536
+PAGE_ROWS = 500
+COMPACT_DEAD_FRACTION = 0.25
+KMEANS_ITERATIONS = 10
+
+_META_DTYPE = [("key", "<i8"), ("hash", "<u8"), ("scale", "<f4")] if np is not None else None
+
+
+def content_hash(text: str) -> int:
+    digest = hashlib.blake2b(f"{settings.similarity_model}\0{text}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _embed_text(text: str) -> str:
+    return " ".join((text or "").split())[:MAX_EMBED_CHARS]
+
+
+def available() -> bool:
+    return np is not None and embeddings.available()
+
+
+class _CoarseIndex:
+    """Spherical k-means over the stored vectors; each search probes the nearest lists."""
+
+    def __init__(self, centroids, assign) -> None:
+        self.centroids = centroids  # (nlist, dim) float32, normalised
+        self.assign = assign  # (rows,) int32 cluster per row
+        self.trained_rows = len(assign)
+
+    @classmethod
+    def train(cls, store: "VectorStore") -> "_CoarseIndex":
+        n = store.rows
+        nlist = max(2, int(np.sqrt(n)))
+        rng = np.random.default_rng(0)
+        sample_rows = np.sort(rng.choice(n, size=min(n, nlist * 64), replace=False))
+        sample = store.dense(sample_rows)
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            sums[empty] = centroids[empty]  # keep the old centroid for empty clusters
+            norms[empty] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+        index = cls(centroids, np.empty(0, dtype=np.int32))
+        index.assign = index.nearest(store, 0, n)
+        index.trained_rows = n
+        return index
+
+    def nearest(self, store: "VectorStore", start: int, stop: int):
+        out = np.empty(stop - start, dtype=np.int32)
+        for lo in range(start, stop, SCAN_CHUNK_ROWS):
+            hi = min(stop, lo + SCAN_CHUNK_ROWS)
+            out[lo - start:hi - start] = np.argmax(store.dense(slice(lo, hi)) @ self.centroids.T, axis=1)
+        return out
+
+    def extend(self, store: "VectorStore") -> None:
+        if store.rows > len(self.assign):
+            self.assign = np.concatenate([self.assign, self.nearest(store, len(self.assign), store.rows)])
+
+    def candidates(self, query, nprobe: int):
+        probe = np.argsort(-(self.centroids @ query))[:nprobe]
+        return np.flatnonzero(np.isin(self.assign, probe))
+
+
+class VectorStore:
+    """One append-only, memory-mapped embedding matrix with keys and tombstones."""
+
+    def __init__(self, directory: Path, name: str, dim: int, dtype: str = "float32") -> None:
+        if dtype not in ("float32", "int8"):
+            raise ValueError(f"Unsupported vector dtype '{dtype}'")
+        self.directory = Path(directory)
+        self.name = name
+        self.dim = dim
+        self.dtype = dtype
+        self.high_water = 0  # largest database id already considered
+        self._lock = threading.RLock()
+        self._coarse: Optional[_CoarseIndex] = None
+        self._open()
+
+    # -- files -------------------------------------------------------------------
+    def _path(self, suffix: str) -> Path:
+        return self.directory / f"{self.name}.{suffix}"
+
+    @property
+    def _vec_dtype(self):
+        return np.float32 if self.dtype == "float32" else np.int8
+
+    def _header(self) -> dict:
+        return {"version": FORMAT_VERSION, "model": settings.similarity_model, "dim": self.dim, "dtype": self.dtype}
+
+    def _open(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        header_path = self._path("json")
+        header = json.loads(header_path.read_text()) if header_path.exists() else None
+        if header is None or {k: header.get(k) for k in self._header()} != self._header():
+            if header is not None:
+                logger.info(f"Vector store {self.name}: model or format changed, starting over")
+            self._reset_files()
+        else:
+            self.high_water = int(header.get("high_water", 0))
+        self._load()
+
+    def _reset_files(self) -> None:
+        for suffix in ("vec", "meta", "dead"):
+            self._path(suffix).unlink(missing_ok=True)
+        self.high_water = 0
+        self._write_header()
+
+    def _write_header(self) -> None:
+        tmp = self._path("json.tmp")
+        tmp.write_text(json.dumps({**self._header(), "high_water": self.high_water}))
+        os.replace(tmp, self._path("json"))
+
+    def _load(self) -> None:
+        meta_path, vec_path, dead_path = self._path("meta"), self._path("vec"), self._path("dead")
+        meta_bytes = np.dtype(_META_DTYPE).itemsize
+        row_bytes = self.dim * np.dtype(self._vec_dtype).itemsize
+        meta_size = meta_path.stat().st_size if meta_path.exists() else 0
+        vec_size = vec_path.stat().st_size if vec_path.exists() else 0
+        rows = min(meta_size // meta_bytes, vec_size // row_bytes)
+        if meta_size != rows * meta_bytes or vec_size != rows * row_bytes:
+            # A torn append left a partial row behind; cut both files back so later appends stay aligned
+            logger.warning(f"Vector store {self.name}: truncating to {rows} complete rows")
+            for path, size in ((meta_path, rows * meta_bytes), (vec_path, rows * row_bytes)):
+                if path.exists():
+                    with open(path, "r+b") as f:
+                        f.truncate(size)
+        meta = np.fromfile(meta_path, dtype=_META_DTYPE) if rows else np.empty(0, dtype=_META_DTYPE)
+        self.meta = meta
+        self.vectors = np.memmap(vec_path, dtype=self._vec_dtype, mode="r", shape=(rows, self.dim)) if rows else None
+        self.alive = np.ones(rows, dtype=bool)
+        if dead_path.exists():
+            dead = np.fromfile(dead_path, dtype="<i8")
+            self.alive[dead[dead < rows]] = False
+        self._row_by_key: Dict[int, int] = {}
+        self._row_by_hash: Dict[int, int] = {}
+        for row in np.flatnonzero(self.alive):
+            self._row_by_key[int(self.meta["key"][row])] = int(row)
+            self._row_by_hash[int(self.meta["hash"][row])] = int(row)
+        self._coarse = None
+
+    @property
+    def rows(self) -> int:
+        return len(self.meta)
+
+    @property
+    def live(self) -> int:
+        return len(self._row_by_key)
+
+    # -- reads -------------------------------------------------------------------
+    def dense(self, rows):
+        """Dequantised float32 vectors for a row index or slice."""
+        block = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.dtype == "int8":
+            block *= self.meta["scale"][rows][:, None]
+        return block
+
+    def keys(self) -> List[int]:
+        with self._lock:
+            return list(self._row_by_key)
+
+    def hashes(self, keys: Iterable[int]) -> Dict[int, int]:
+        with self._lock:
+            return {k: int(self.meta["hash"][r]) for k in keys if (r := self._row_by_key.get(k)) is not None}
+
+    def get(self, keys: Sequence[int]) -> Dict[int, "np.ndarray"]:
+        with self._lock:
+            found = [(k, self._row_by_key[k]) for k in keys if k in self._row_by_key]
+            if not found:
+                return {}
+            block = self.dense(np.array([r for _, r in found]))
+            return {k: block[i] for i, (k, _) in enumerate(found)}
+
+    def by_hash(self, hashes: Iterable[int]) -> Dict[int, "np.ndarray"]:
+        with self._lock:
+            found = [(h, self._row_by_hash[h]) for h in hashes if h in self._row_by_hash]
+            if not found:
+                return {}
+            block = self.dense(np.array([r for _, r in found]))
+            return {h: block[i] for i, (h, _) in enumerate(found)}
+
+    # -- writes ------------------------------------------------------------------
+    def append(self, keys: Sequence[int], hashes: Sequence[int], vectors) -> None:
+        """Add (or replace) vectors for `keys`; `vectors` must be L2-normalised float32."""
+        if not len(keys):
+            return
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(keys), self.dim)
+        meta = np.zeros(len(keys), dtype=_META_DTYPE)
+        meta["key"], meta["hash"], meta["scale"] = keys, hashes, 1.0
+        if self.dtype == "int8":
+            scale = np.abs(vectors).max(axis=1) / 127.0
+            scale[scale == 0] = 1.0
+            meta["scale"] = scale
+            stored = np.round(vectors / scale[:, None]).astype(np.int8)
+        else:
+            stored = vectors
+        with self._lock:
+            self.delete([k for k in keys if k in self._row_by_key])
+            with open(self._path("vec"), "ab") as f:
+                f.write(stored.tobytes())
+            with open(self._path("meta"), "ab") as f:
+                f.write(meta.tobytes())
+            start = self.rows
+            self.meta = np.concatenate([self.meta, meta])
+            self.alive = np.concatenate([self.alive, np.ones(len(keys), dtype=bool)])
+            self.vectors = np.memmap(self._path("vec"), dtype=self._vec_dtype, mode="r", shape=(self.rows, self.dim))
+            for i, (key, h) in enumerate(zip(keys, hashes)):
+                self._row_by_key[int(key)] = start + i
+                self._row_by_hash[int(h)] = start + i
+            if self._coarse is not None:
+                self._coarse.extend(self)
+
+    def delete(self, keys: Iterable[int]) -> int:
+        with self._lock:
+            rows = [self._row_by_key.pop(int(k)) for k in keys if int(k) in self._row_by_key]
+            if not rows:
+                return 0
+            for row in rows:
+                self.alive[row] = False
+                h = int(self.meta["hash"][row])
+                if self._row_by_hash.get(h) == row:
+                    del self._row_by_hash[h]
+            with open(self._path("dead"), "ab") as f:
+                f.write(np.asarray(rows, dtype="<i8").tobytes())
+            return len(rows)
+
+    def set_high_water(self, value: int) -> None:
+        with self._lock:
+            if value > self.high_water:
+                self.high_water = value
+                self._write_header()
+
+    def compact(self, force: bool = False) -> bool:
+        """Rewrite the files without tombstoned rows."""
+        with self._lock:
+            dead = self.rows - self.live
+            if not dead or (not force and dead < self.rows * COMPACT_DEAD_FRACTION):
+                return False
+            keep = np.flatnonzero(self.alive)
+            tmp_vec, tmp_meta = self._path("vec.tmp"), self._path("meta.tmp")
+            with open(tmp_vec, "wb") as f:
+                for lo in range(0, len(keep), SCAN_CHUNK_ROWS):
+                    f.write(np.ascontiguousarray(self.vectors[keep[lo:lo + SCAN_CHUNK_ROWS]]).tobytes())
+            self.meta[keep].tofile(tmp_meta)
+            self.vectors = None  # release the old mapping before replacing the file
+            os.replace(tmp_vec, self._path("vec"))
+            os.replace(tmp_meta, self._path("meta"))
+            self._path("dead").unlink(missing_ok=True)
+            self._load()
+            logger.info(f"Vector store {self.name}: compacted {dead} dead rows, {self.rows} remain")
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self.vectors = None
+            self._reset_files()
+            self._load()
+
+    # -- search ------------------------------------------------------------------
+    def search(self, query, k: int, allowed: Optional[Iterable[int]] = None, exclude: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        """Top-k (key, cosine similarity) among live rows, optionally restricted to `allowed` keys."""
+        query = np.asarray(query, dtype=np.float32).reshape(self.dim)
+        with self._lock:
+            if not self.live:
+                return []
+            mask = self.alive.copy()
+            if allowed is not None:
+                mask &= np.isin(self.meta["key"], np.fromiter(allowed, dtype=np.int64))
+            excluded = np.fromiter(exclude, dtype=np.int64)
+            if len(excluded):
+                mask &= ~np.isin(self.meta["key"], excluded)
+            coarse = self._coarse_index()
+            if coarse is not None:
+                rows = coarse.candidates(query, settings.vector_coarse_nprobe)
+                rows = rows[mask[rows]]
+            else:
+                rows = np.flatnonzero(mask)
+            if not len(rows):
+                return []
+            scores = np.empty(len(rows), dtype=np.float32)
+            for lo in range(0, len(rows), SCAN_CHUNK_ROWS):
+                chunk = rows[lo:lo + SCAN_CHUNK_ROWS]
+                scores[lo:lo + len(chunk)] = self.dense(chunk) @ query
+            k = min(k, len(rows))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            keys = self.meta["key"][rows[top]]
+            return [(int(key), round(float(scores[i]), 4)) for key, i in zip(keys, top)]
+
+    def _coarse_index(self) -> Optional[_CoarseIndex]:
+        if self.live < settings.vector_coarse_min_rows:
+            return None
+        if self._coarse is None or self.rows > 2 * self._coarse.trained_rows:
+            self._coarse = _CoarseIndex.train(self)
+            logger.info(f"Vector store {self.name}: coarse index with {len(self._coarse.centroids)} lists")
+        return self._coarse
+
+    def stats(self) -> dict:
+        return {
+            "rows": self.rows,
+            "live": self.live,
+            "dead": self.rows - self.live,
+            "dtype": self.dtype,
+            "bytes": self.rows * self.dim * np.dtype(self._vec_dtype).itemsize,
+            "high_water": self.high_water,
+            "coarse_lists": len(self._coarse.centroids) if self._coarse is not None else 0,
+        }
+
+
+class SemanticIndex:
+    """Note and message vector stores kept in step with the database."""
+
+    KINDS = ("notes", "messages")
+
+    def __init__(self, directory: Optional[str] = None, dtype: Optional[str] = None) -> None:
+        self.directory = Path(directory or settings.vector_index_dir)
+        self.dtype = dtype or settings.vector_index_dtype
+        self.batch_size = settings.vector_embed_batch_size
+        self._stores: Dict[str, VectorStore] = {}
+        self._sync_lock = threading.Lock()
+        self._queries: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._queries_lock = threading.Lock()  # endpoints call embed_query from the threadpool
+        self._task: Optional[asyncio.Task] = None
+        self.embedded = 0
+        self.reused = 0
+
+    def store(self, kind: str) -> Optional[VectorStore]:
+        """The store for `kind`, created on first use once the embedding dimension is known."""
+        store = self._stores.get(kind)
+        if store is None:
+            dim = self._dimension()
+            if dim is None:
+                return None
+            store = self._stores.setdefault(kind, VectorStore(self.directory, kind, dim, self.dtype))
+        return store
+
+    def _dimension(self) -> Optional[int]:
+        if self._stores:
+            return next(iter(self._stores.values())).dim
+        probe = embeddings.encode(["dimension probe"])
+        return None if probe is None else int(probe.shape[1])
+
+    # -- embedding ---------------------------------------------------------------
+    def embed(self, texts: Sequence[str]) -> Optional[Tuple[List[int], "np.ndarray"]]:
+        """Content hashes and vectors for `texts`, encoding only hashes no store has seen."""
+        cleaned = [_embed_text(t) for t in texts]
+        hashes = [content_hash(t) for t in cleaned]
+        known: Dict[int, np.ndarray] = {}
+        for store in self._stores.values():
+            known.update(store.by_hash([h for h in hashes if h not in known]))
+        missing: Dict[int, str] = {}
+        for h, t in zip(hashes, cleaned):
+            if h not in known:
+                missing.setdefault(h, t)
+        todo = list(missing.items())
+        for lo in range(0, len(todo), self.batch_size):
+            batch = todo[lo:lo + self.batch_size]
+            vecs = embeddings.encode([t for _, t in batch])
+            if vecs is None:
+                return None
+            known.update({h: v for (h, _), v in zip(batch, vecs)})
+        self.embedded += len(todo)
+        self.reused += len(hashes) - len(todo)
+        if not hashes:
+            return [], np.empty((0, 0), dtype=np.float32)
+        return hashes, np.stack([known[h] for h in hashes])
+
+    def embed_query(self, text: str):
+        key = content_hash(_embed_text(text))
+        with self._queries_lock:
+            vec = self._queries.get(key)
+            if vec is not None:
+                self._queries.move_to_end(key)
+                return vec
+        result = self.embed([text])
+        if result is None:
+            return None
+        vec = result[1][0]
+        with self._queries_lock:
+            self._queries[key] = vec
+            while len(self._queries) > 256:
+                self._queries.popitem(last=False)
+        return vec
+
+    def _index(self, kind: str, rows: List[Tuple[int, str]]) -> int:
+        """Embed and store (id, text) rows whose content changed; returns rows written."""
+        store = self.store(kind)
+        if store is None or not rows:
+            return 0
+        current = store.hashes([i for i, _ in rows])
+        changed = [(i, t) for i, t in rows if current.get(i) != content_hash(_embed_text(t))]
+        if not changed:
+            return 0
+        result = self.embed([t for _, t in changed])
+        if result is None:
+            return 0
+        hashes, vecs = result
+        store.append([i for i, _ in changed], hashes, vecs)
+        return len(changed)
+
+    # -- keeping up with the database -------------------------------------------
+    def _page(self, db: Session, kind: str, after: int):
+        if kind == "notes":
+            return db.query(Note.id, Note.content).filter(Note.id > after).order_by(Note.id).limit(PAGE_ROWS).all()
+        return (
+            db.query(Message.id, Message.content)
+            .filter(Message.id > after, Message.role.in_(("user", "assistant")))
+            .order_by(Message.id)
+            .limit(PAGE_ROWS)
+            .all()
+        )
+
+    def sync(self, db: Session, reconcile: bool = False) -> Dict[str, int]:
+        """Embed rows added since the last sync; with `reconcile`, also drop deleted
+        rows and re-embed edited notes. Safe to call from several threads."""
+        counts = {"indexed": 0, "deleted": 0}
+        if not available():
+            return counts
+        with self._sync_lock:
+            for kind in self.KINDS:
+                store = self.store(kind)
+                if store is None:
+                    return counts
+                while True:
+                    page = self._page(db, kind, store.high_water)
+                    if not page:
+                        break
+                    counts["indexed"] += self._index(kind, [(r.id, r.content or "") for r in page])
+                    store.set_high_water(page[-1].id)
+                if reconcile:
+                    counts.update({k: counts[k] + v for k, v in self._reconcile(db, kind, store).items()})
+                    store.compact()
+        if counts["indexed"] or counts["deleted"]:
+            logger.info(f"Semantic index sync: {counts}")
+        return counts
+
+    def _reconcile(self, db: Session, kind: str, store: VectorStore) -> Dict[str, int]:
+        model = Note if kind == "notes" else Message
+        existing = {i for (i,) in db.query(model.id).filter(model.id <= store.high_water)}
+        deleted = store.delete([k for k in store.keys() if k not in existing])
+        indexed = 0
+        if kind == "notes":
+            # Messages are never edited; notes may be, so compare content hashes
+            after = 0
+            while True:
+                page = db.query(Note.id, Note.content).filter(Note.id > after, Note.id <= store.high_water).order_by(Note.id).limit(PAGE_ROWS).all()
+                if not page:
+                    break
+                indexed += self._index(kind, [(r.id, r.content or "") for r in page])
+                after = page[-1].id
+        return {"indexed": indexed, "deleted": deleted}
+
+    def message_vectors(self, db: Session, message_ids: Sequence[int]) -> Dict[int, "np.ndarray"]:
+        """Vectors for specific messages, embedding any the background sync has not reached."""
+        store = self.store("messages")
+        if store is None:
+            return {}
+        found = store.get(message_ids)
+        missing = [i for i in message_ids if i not in found]
+        if missing:
+            rows = db.query(Message.id, Message.content).filter(Message.id.in_(missing)).all()
+            self._index("messages", [(r.id, r.content or "") for r in rows])
+            found.update(store.get(missing))
+        return found
+
+    # -- queries -----------------------------------------------------------------
+    def search(self, kind: str, query, k: int = 10, allowed: Optional[Iterable[int]] = None, exclude: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        store = self.store(kind)
+        if store is None or query is None:
+            return []
+        return store.search(query, k, allowed=allowed, exclude=exclude)
+
+    def conversation_vector(self, db: Session, conversation_id: int, last: int = 12):
+        """Recency-weighted mean of the conversation's latest messages."""
+        ids = [
+            i for (i,) in db.query(Message.id)
+            .filter(Message.conversation_id == conversation_id, Message.role.in_(("user", "assistant")))
+            .order_by(Message.id.desc())
+            .limit(last)
+        ]
+        vectors = self.message_vectors(db, ids)
+        if not vectors:
+            return None
+        weights = np.array([0.85 ** n for n, i in enumerate(ids) if i in vectors], dtype=np.float32)
+        stacked = np.stack([vectors[i] for i in ids if i in vectors])
+        mean = weights @ stacked
+        norm = np.linalg.norm(mean)
+        return mean / norm if norm else None
+
+    # -- background refresh ------------------------------------------------------
+    def start(self) -> None:
+        if self._task is None and available():
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _sync_once(self, reconcile: bool) -> None:
+        db = SessionLocal()
+        try:
+            self.sync(db, reconcile=reconcile)
+        finally:
+            db.close()
+
+    async def _refresh_loop(self) -> None:
+        passes = 0
+        while True:
+            try:
+                await asyncio.to_thread(self._sync_once, passes % 10 == 0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Semantic index sync failed: {e}", exc_info=True)
+            passes += 1
+            await asyncio.sleep(settings.vector_sync_interval_s)
+
+    def stats(self) -> dict:
+        return {
+            "available": available(),
+            "model": settings.similarity_model,
+            "embedded": self.embedded,
+            "reused_by_hash": self.reused,
+            "stores": {kind: store.stats() for kind, store in self._stores.items()},
+        }
+
+
+def owned_note_ids(db: Session, user_id: int) -> List[int]:
+    """Notes visible to a user: their own plus those from before ownership was tracked."""
+    return [i for (i,) in db.query(Note.id).filter((Note.user_id == user_id) | (Note.user_id.is_(None)))]
+
+
+def owned_message_ids(db: Session, user_id: int) -> List[int]:
+    return [
+        i for (i,) in db.query(Message.id)
+        .join(Conversation, Conversation.id == Message.conversation_id)
+        .filter(Conversation.user_id == user_id)
+    ]
+
+
+_index: Optional[SemanticIndex] = None
+
+
+def get_semantic_index() -> SemanticIndex:
+    global _index
+    if _index is None:
+        _index = SemanticIndex()
+    return _index
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintain the semantic note/message index")
+    parser.add_argument("--reconcile", action="store_true", help="drop deleted rows and re-embed edited notes")
+    parser.add_argument("--compact", action="store_true", help="rewrite the stores without tombstoned rows")
+    parser.add_argument("--rebuild", action="store_true", help="discard the stores and embed everything again")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if not available():
+        raise SystemExit("numpy and sentence-transformers are required for the semantic index")
+    index = get_semantic_index()
+    if args.rebuild:
+        for kind in SemanticIndex.KINDS:
+            store = index.store(kind)
+            if store is not None:
+                store.clear()
+    session = SessionLocal()
+    try:
+        print(index.sync(session, reconcile=args.reconcile))
+    finally:
+        session.close()
+    if args.compact:
+        for kind in SemanticIndex.KINDS:
+            store = index.store(kind)
+            if store is not None:
+                store.compact(force=True)
+    print(json.dumps(index.stats(), indent=2))
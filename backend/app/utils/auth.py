@@ -40,36 +40,29 @@ def verify_token(token: str) -> dict:
 
 
 def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
+    auth = request.headers.get("Authorization", "")
+    token = auth.split(" ", 1)[1] if auth.startswith("Bearer ") else None
+    return user_from_token(db, token)
+
+
+def user_from_token(db: Session, token: Optional[str]) -> User:
+    """Resolve the user for a bearer token (None when the request carried none)."""
     from app.config import settings as _settings
     # Check for development mode flag and allow_demo_auth setting
     is_dev = (getattr(_settings, "debug", False)) or (getattr(_settings, "buddy_dev_mode", False))
     allow_demo = getattr(_settings, "allow_demo_auth", False)
 
-    auth = request.headers.get("Authorization", "")
-    if not auth.startswith("Bearer "):
+    if not token:
         # For demo purposes in dev mode, allow unauthenticated requests with a demo user
         if is_dev and allow_demo:
-            user = db.query(User).filter(User.email == "demo@buddy.local").first()
-            if not user:
-                user = User(google_id="demo", email="demo@buddy.local", username="demo", name="Demo User")
-                db.add(user)
-                db.commit()
-                db.refresh(user)
-            return user
+            return _demo_user(db)
         raise HTTPException(status_code=401, detail="Not authenticated")
-    token = auth.split(" ", 1)[1]
     try:
         payload = verify_token(token)
     except Exception:
         # Allow demo mode fallback if token verification fails in dev
         if is_dev and allow_demo:
-            user = db.query(User).filter(User.email == "demo@buddy.local").first()
-            if not user:
-                user = User(google_id="demo", email="demo@buddy.local", username="demo", name="Demo User")
-                db.add(user)
-                db.commit()
-                db.refresh(user)
-            return user
+            return _demo_user(db)
         raise HTTPException(status_code=401, detail="Invalid token")
     
     sub = payload.get("sub") if isinstance(payload, dict) else None
@@ -82,6 +75,21 @@ def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
     return user
 
 
+def is_admin(user: Optional[User]) -> bool:
+    admins = {e.strip().lower() for e in settings.admin_emails.split(",") if e.strip()}
+    return bool(user is not None and user.email and user.email.lower() in admins)
+
+
+def _demo_user(db: Session) -> User:
+    user = db.query(User).filter(User.email == "demo@buddy.local").first()
+    if not user:
+        user = User(google_id="demo", email="demo@buddy.local", username="demo", name="Demo User")
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+    return user
+
+
 def verify_google_id_token(credential: str) -> Dict[str, Any]:
     if not settings.google_client_id:
         raise HTTPException(status_code=500, detail="GOOGLE_CLIENT_ID not configured")
@@ -0,0 +1,139 @@
+"""
+Shared multi-pattern keyword matcher.
+
+All terms of a matcher are compiled once into a single trie-shaped regular
+expression, so a message is scanned in one pass whose cost depends on the
+text length rather than on how many terms there are. Matching is
+case-insensitive with word-boundary semantics (a term never matches inside a
+longer word) and any run of whitespace matches a space inside a phrase.
+
+Every match reports the categories of its term. Terms that occur inside a
+longer matched phrase ("what" inside "what if") are reported as well, so the
+result is the same as scanning for each term separately.
+
+This module only depends on the standard library so the root-level scripts
+can import it as `backend.app.utils.text_matcher`.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+_SPACE = re.compile(r"\s+")
+
+
+@dataclass(frozen=True)
+class Match:
+    term: str
+    categories: Tuple[str, ...]
+    start: int
+    end: int
+
+
+def _normalize(term: str) -> str:
+    return _SPACE.sub(" ", term.strip().lower())
+
+
+def _is_word(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+def _trie_pattern(terms: Iterable[str]) -> str:
+    trie: dict = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node: dict) -> str:
+        alts = [(r"\s+" if ch == " " else re.escape(ch)) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        # Greedy optional: the longest term wins, shorter ones are the backtrack
+        return "(?:" + body + ")?" if "" in node else body
+
+    return build(trie)
+
+
+class TextMatcher:
+    """Match a category -> terms vocabulary against text in a single pass."""
+
+    def __init__(self, vocabulary: Mapping[str, Iterable[str]]) -> None:
+        cats: Dict[str, List[str]] = {}
+        for category, terms in vocabulary.items():
+            for term in terms:
+                t = _normalize(term)
+                if t and category not in cats.setdefault(t, []):
+                    cats[t].append(category)
+        self._categories: Dict[str, Tuple[str, ...]] = {t: tuple(c) for t, c in cats.items()}
+
+        # Boundary guards only apply on sides where the term has a word character
+        groups: Dict[Tuple[bool, bool], List[str]] = {}
+        for t in self._categories:
+            groups.setdefault((_is_word(t[0]), _is_word(t[-1])), []).append(t)
+        parts = []
+        for (word_start, word_end), terms in sorted(groups.items()):
+            parts.append(("(?<!\\w)" if word_start else "") + _trie_pattern(terms) + ("(?!\\w)" if word_end else ""))
+        self._regex: Optional[re.Pattern] = re.compile("|".join(parts), re.IGNORECASE) if parts else None
+
+        # Terms contained in longer terms at word boundaries, with their offsets
+        self._nested: Dict[str, List[Tuple[str, int]]] = {}
+        for outer in self._categories:
+            for inner in self._categories:
+                if inner == outer or len(inner) >= len(outer):
+                    continue
+                pos = outer.find(inner)
+                while pos != -1:
+                    end = pos + len(inner)
+                    left_ok = pos == 0 or not (_is_word(inner[0]) and _is_word(outer[pos - 1]))
+                    right_ok = end == len(outer) or not (_is_word(inner[-1]) and _is_word(outer[end]))
+                    if left_ok and right_ok:
+                        self._nested.setdefault(outer, []).append((inner, pos))
+                    pos = outer.find(inner, pos + 1)
+
+    @property
+    def terms(self) -> List[str]:
+        return list(self._categories)
+
+    def _outer(self, text: str):
+        if not text or self._regex is None:
+            return
+        for m in self._regex.finditer(text):
+            yield m, _normalize(m.group(0))
+
+    def find_all(self, text: str) -> List[Match]:
+        """All term occurrences, including terms nested inside longer matched phrases."""
+        out: List[Match] = []
+        for m, term in self._outer(text):
+            out.append(Match(term, self._categories[term], m.start(), m.end()))
+            for inner, offset in self._nested.get(term, ()):
+                # Offsets are exact unless the phrase matched with extra whitespace
+                start = m.start() + offset
+                out.append(Match(inner, self._categories[inner], start, start + len(inner)))
+        out.sort(key=lambda x: (x.start, -x.end))
+        return out
+
+    def categories(self, text: str) -> Dict[str, Set[str]]:
+        """category -> distinct terms of that category found in `text`."""
+        found: Dict[str, Set[str]] = {}
+        for match in self.find_all(text):
+            for category in match.categories:
+                found.setdefault(category, set()).add(match.term)
+        return found
+
+    def contains(self, text: str, category: Optional[str] = None) -> bool:
+        for m, term in self._outer(text):
+            if category is None or category in self._categories[term]:
+                return True
+            if any(category in self._categories[inner] for inner, _ in self._nested.get(term, ())):
+                return True
+        return False
+
+    def redact(self, text: str, replacement: str) -> str:
+        """Replace every (outermost) match with `replacement`."""
+        if not text or self._regex is None:
+            return text
+        return self._regex.sub(replacement, text)
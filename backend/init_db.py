@@ -1,7 +1,9 @@
 from app.database import Base, engine
-from app.models import user, note, conversation, message  # ensure models imported
+from app.models import user, note, conversation, message, job, usage, organize, keyphrase, dedup, emotion  # ensure models imported
 
 if __name__ == "__main__":
     print("Creating database tables...")
     Base.metadata.create_all(bind=engine)
+    from app.services.search_index import ensure_search_schema
+    ensure_search_schema(engine)
     print("Done.")
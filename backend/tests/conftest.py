@@ -0,0 +1,36 @@
+"""
+Tests run against a throwaway SQLite database: DATABASE_URL is pointed at a
+temp file before anything imports app.config, and the schema is created once.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND))
+
+_tmp = tempfile.mkdtemp(prefix="buddy-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/test.db"
+os.environ.setdefault("VECTOR_INDEX_ENABLED", "false")
+
+
+@pytest.fixture(scope="session")
+def engine():
+    from app.database import Base, engine
+    import init_db  # noqa: F401  registers every model on Base.metadata
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+@pytest.fixture
+def db(engine):
+    from app.database import SessionLocal
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
@@ -0,0 +1,111 @@
+import asyncio
+import io
+import zipfile
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.models.note import Note
+from app.models.user import User
+from app.routers import notes
+from app.services.bulk_import import BulkImporter, expand_upload
+from app.services.ingest import UploadTooLarge
+from app.utils.auth import get_current_user
+
+
+def _zip(members):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    return buf.getvalue()
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    monkeypatch.setattr(settings, "import_max_file_bytes", 1000)
+    monkeypatch.setattr(settings, "import_max_upload_bytes", 10_000)
+    monkeypatch.setattr(settings, "import_max_total_bytes", 2500)
+    monkeypatch.setattr(settings, "import_max_files", 3)
+
+
+def test_plain_upload_is_one_file(limits):
+    assert expand_upload("a.md", b"hello") == [("a.md", b"hello")]
+    with pytest.raises(UploadTooLarge):
+        expand_upload("a.md", b"x" * 1001)
+
+
+def test_zip_keeps_text_members_only(limits):
+    raw = _zip([("a.md", b"one"), ("dir/b.txt", b"two"), ("img.png", b"\x89PNG"), ("__MACOSX/._a.md", b"junk"), (".hidden.md", b"h")])
+    assert expand_upload("notes.zip", raw) == [("a.md", b"one"), ("dir/b.txt", b"two")]
+
+
+def test_zip_stops_at_the_file_allowance(limits):
+    raw = _zip([(f"{i}.md", b"x") for i in range(100)])
+    with pytest.raises(UploadTooLarge):
+        expand_upload("many.zip", raw, max_files=3)
+
+
+def test_zip_stops_at_the_byte_budget(limits):
+    # Highly compressible members: a few hundred bytes of zip, far more unpacked
+    raw = _zip([(f"{i}.md", b"a" * 1000) for i in range(15)])
+    assert len(raw) < 2500
+    with pytest.raises(UploadTooLarge):
+        expand_upload("bomb.zip", raw, max_bytes=2500, max_files=100)
+    assert len(expand_upload("bomb.zip", _zip([("a.md", b"a" * 1000), ("b.md", b"b" * 1000)]), max_bytes=2500)) == 2
+
+
+def test_oversized_member_is_rejected(limits):
+    with pytest.raises(ValueError):
+        expand_upload("big.zip", _zip([("a.md", b"a" * 1001)]), max_bytes=10_000)
+
+
+@pytest.fixture
+def client(limits):
+    app = FastAPI()
+    app.include_router(notes.router)
+    app.dependency_overrides[get_current_user] = lambda: User(id=7, email="u@example.com")
+    return TestClient(app)
+
+
+def test_import_bulk_rejects_archives_over_the_total(client):
+    files = [("files", ("a.zip", _zip([(f"{i}.md", b"a" * 900) for i in range(2)]), "application/zip")),
+             ("files", ("b.zip", _zip([("c.md", b"c" * 900)]), "application/zip"))]
+    r = client.post("/api/notes/import/bulk", files=files)
+    assert r.status_code == 413
+    assert "left for this import" in r.json()["detail"]
+
+
+def test_import_bulk_rejects_uploads_once_the_budget_is_spent(client, monkeypatch):
+    monkeypatch.setattr(settings, "import_max_total_bytes", 1000)
+    files = [("files", ("a.md", b"a" * 1000, "text/markdown")), ("files", ("b.md", b"b", "text/markdown"))]
+    r = client.post("/api/notes/import/bulk", files=files)
+    assert r.status_code == 413
+    assert r.json()["detail"] == "Import exceeds 1000 bytes in total"
+
+
+def test_import_bulk_rejects_too_many_files(client):
+    files = [("files", (f"{i}.md", b"x", "text/markdown")) for i in range(4)]
+    r = client.post("/api/notes/import/bulk", files=files)
+    assert r.status_code == 413
+    assert r.json()["detail"] == "At most 3 files per import"
+
+
+def test_job_organizes_and_saves_every_file(db):
+    importer = BulkImporter(concurrency=2, batch_size=2)
+    files = [(f"job{i}.md", f"Bulk import note {i} about gardening, tomatoes and compost.".encode()) for i in range(3)]
+    files.append(("empty.md", b"   "))
+
+    async def run():
+        job = importer.submit(files, None, user_id=4242)
+        await job.task
+        return job
+
+    job = asyncio.run(run())
+    assert (job.status, job.processed, job.succeeded, job.failed) == ("done", 4, 3, 1)
+    assert job.results[3]["error"] == "empty file"
+    saved = {r["note_id"] for r in job.results[:3]}
+    assert {n.id for n in db.query(Note).filter(Note.user_id == 4242)} == saved
+    assert job.files == []
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from app.models.conversation import Conversation
+from app.models.message import Message
+from app.services.chat_persistence import ChatStore
+from app.services.context_builder import TurnMessage
+
+
+def _turn(text="hi", reply="hello"):
+    return [TurnMessage("user", text, 1), TurnMessage("assistant", reply, 1)]
+
+
+def _contents(db, conversation_id):
+    db.expire_all()
+    return [m.content for m in db.query(Message).filter(Message.conversation_id == conversation_id).order_by(Message.id)]
+
+
+def test_first_turn_creates_the_conversation(db):
+    store = ChatStore(write_behind=False)
+    turn = _turn()
+    cid = asyncio.run(store.save_turn(db, None, turn, user_id=101))
+    assert db.get(Conversation, cid).user_id == 101
+    assert _contents(db, cid) == ["hi", "hello"]
+    assert all(m.id is not None for m in turn)
+
+
+def test_turn_into_another_users_conversation_is_refused(db):
+    store = ChatStore(write_behind=False)
+    cid = asyncio.run(store.save_turn(db, None, _turn(), user_id=102))
+    turn = _turn("mine?", "no")
+    with pytest.raises(PermissionError):
+        asyncio.run(store.save_turn(db, cid, turn, user_id=103))
+    assert [m.id for m in turn] == [None, None]
+    # The session was rolled back and is still usable
+    assert _contents(db, cid) == ["hi", "hello"]
+    with pytest.raises(PermissionError):
+        store.open_conversation(db, cid, 103)
+
+
+def test_open_conversation_commits_a_new_one(db):
+    store = ChatStore(write_behind=False)
+    cid = store.open_conversation(db, None, 104)
+    assert store.open_conversation(db, cid, 104) == cid
+    assert db.get(Conversation, cid).user_id == 104
+
+
+def test_write_behind_flushes_in_batches_and_drains_on_stop(db):
+    store = ChatStore(write_behind=True, max_queue=10, batch_size=8, flush_interval_ms=20)
+    turns = [_turn(f"q{i}", f"a{i}") for i in range(3)]
+
+    async def run():
+        await store.start()
+        cid = await store.save_turn(db, None, turns[0], user_id=105)
+        for turn in turns[1:]:
+            assert await store.save_turn(db, cid, turn, user_id=105) == cid
+        await store.stop()
+        return cid
+
+    cid = asyncio.run(run())
+    assert not store.running
+    assert _contents(db, cid) == ["q0", "a0", "q1", "a1", "q2", "a2"]
+    assert store.flushed_messages == 6 and store.flushed_batches == 1
+    assert all(m.id is not None for turn in turns for m in turn)
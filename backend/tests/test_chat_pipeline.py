@@ -0,0 +1,98 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.models.message import Message
+from app.services.chat_pipeline import (
+    ChatPipeline, ChatTurn, ContextStage, CrisisStage, EmotionStage, LLMStage, Parallel, PersistStage, Stage,
+)
+from app.services.response_cache import ResponseCache
+
+
+class FakeLLM:
+    model = "fake-model"
+
+    def __init__(self, reply="hello", fail=False) -> None:
+        self.reply = reply
+        self.fail = fail
+        self.calls = 0
+
+    async def complete(self, messages, prefer=None, **params):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("provider down")
+        return SimpleNamespace(content=self.reply, model=self.model, provider="fake", latency_ms=1, hedged=False)
+
+
+class FakePhi2:
+    async def detect_emotion(self, text):
+        await asyncio.sleep(0.01)
+        return {"emotion": "joy"}
+
+
+def _pipeline():
+    return ChatPipeline([ContextStage(), Parallel(LLMStage(), EmotionStage(), CrisisStage(), name="respond"), PersistStage()])
+
+
+def test_turn_runs_every_stage_and_is_saved(db):
+    turn = ChatTurn(message="I feel great", system_prompt="sys", db=db, llm=FakeLLM(), phi2=FakePhi2(), user_id=201)
+    asyncio.run(_pipeline().run(turn))
+    assert (turn.response, turn.model, turn.emotion, turn.crisis) == ("hello", "fake-model", {"emotion": "joy"}, False)
+    assert turn.messages[0] == {"role": "system", "content": "sys"} and turn.prompt_tokens > 0
+    assert set(turn.timings) == {"context", "llm", "emotion", "crisis", "respond", "persist", "total"}
+    assert turn.server_timing().startswith("context;dur=")
+    saved = db.query(Message).filter(Message.conversation_id == turn.conversation_id).order_by(Message.id).all()
+    assert [(m.role, m.content) for m in saved] == [("user", "I feel great"), ("assistant", "hello")]
+
+
+def test_cached_reply_skips_the_llm(db):
+    cache = ResponseCache(max_entries=10, ttl_s=60, semantic=False)
+    llm = FakeLLM()
+    for _ in range(2):
+        turn = ChatTurn(message="hi", system_prompt="sys", db=db, llm=llm, cache=cache, persist=False)
+        asyncio.run(ChatPipeline([ContextStage(history=False), LLMStage()]).run(turn))
+    assert llm.calls == 1 and turn.cached and turn.response == "hello"
+
+
+def test_llm_failure_becomes_the_error_text_when_given(db):
+    turn = ChatTurn(message="hi", system_prompt="sys", db=db, llm=FakeLLM(fail=True), persist=False)
+    asyncio.run(ChatPipeline([ContextStage(history=False), LLMStage(error_text="Error: {error}")]).run(turn))
+    assert turn.response == "Error: provider down"
+
+    turn = ChatTurn(message="hi", system_prompt="sys", db=db, llm=FakeLLM(fail=True), persist=False)
+    with pytest.raises(RuntimeError):
+        asyncio.run(ChatPipeline([ContextStage(history=False), LLMStage()]).run(turn))
+    assert "total" in turn.timings
+
+
+def test_missing_llm_replies_with_the_unavailable_text(db):
+    turn = ChatTurn(message="hi", system_prompt="sys", db=db, persist=False)
+    asyncio.run(ChatPipeline([LLMStage(unavailable_text="offline")]).run(turn))
+    assert (turn.response, turn.model) == ("offline", "unavailable")
+
+
+def test_parallel_failure_cancels_the_other_stages():
+    cancelled = []
+
+    class Slow(Stage):
+        name = "slow"
+
+        async def run(self, turn):
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+    class Broken(Stage):
+        name = "broken"
+
+        async def run(self, turn):
+            raise ValueError("bad stage")
+
+    turn = ChatTurn(message="hi", system_prompt="sys", db=None)
+    with pytest.raises(ValueError):
+        asyncio.run(Parallel(Slow(), Broken()).run(turn))
+    assert cancelled == [True]
+    assert "broken" in turn.timings
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from app.models.conversation import Conversation, ConversationSummary
+from app.models.message import Message
+from app.services.context_builder import ContextBuilder
+from app.services.tokens import TokenCounter
+
+
+class WordCounter(TokenCounter):
+    """One token per word, so budgets can be worked out by hand."""
+
+    def __init__(self) -> None:
+        super().__init__(path="/nonexistent/tokenizer.json", cache_size=0)
+
+    def _count(self, text: str) -> int:
+        return len(text.split())
+
+
+@pytest.fixture
+def builder():
+    # history budget 50; "sys" + "hi" leave 50 tokens for history in build()
+    return ContextBuilder(counter=WordCounter(), max_tokens=60, summary_max_tokens=10)
+
+
+def _conversation(db, user_id=1, turns=8, summary=None):
+    conv = Conversation(user_id=user_id)
+    db.add(conv)
+    db.flush()
+    msgs = [Message(conversation_id=conv.id, role="user" if i % 2 == 0 else "assistant", content=f"m{i} two three four five six") for i in range(turns)]
+    db.add_all(msgs)
+    db.flush()
+    if summary is not None:
+        db.add(ConversationSummary(conversation_id=conv.id, summary=summary, upto_message_id=msgs[1].id, tokens=len(summary.split())))
+    db.commit()
+    return conv.id, [m.id for m in msgs]
+
+
+def _history(messages):
+    return [m["content"].split()[0] for m in messages[1:-1] if m["role"] != "system"]
+
+
+def test_new_conversation_is_system_and_message(db, builder):
+    assert builder.build(db, None, "sys", "hi") == [{"role": "system", "content": "sys"}, {"role": "user", "content": "hi"}]
+
+
+def test_history_fills_the_budget_newest_first(db, builder):
+    cid, _ = _conversation(db)
+    messages = builder.build(db, cid, "sys", "hi")
+    # 10 tokens per message (6 words + overhead): exactly five fit
+    assert _history(messages) == ["m3", "m4", "m5", "m6", "m7"]
+    assert messages[-1] == {"role": "user", "content": "hi"}
+
+
+def test_summary_is_sent_and_spends_budget(db, builder):
+    cid, _ = _conversation(db, summary="one")
+    messages = builder.build(db, cid, "sys", "hi")
+    assert messages[1]["role"] == "system" and messages[1]["content"].endswith("\none")
+    # Only the tail after the summary is loaded; header and summary cost one message worth
+    assert _history(messages) == ["m4", "m5", "m6", "m7"]
+
+
+def test_appended_turns_join_the_cached_tail(db, builder):
+    cid, _ = _conversation(db, turns=2)
+    builder.build(db, cid, "sys", "hi")
+    builder.append(cid, [builder.message("user", "m2 two"), builder.message("assistant", "m3 two")])
+    assert _history(builder.build(db, cid, "sys", "hi")) == ["m0", "m1", "m2", "m3"]
+
+
+def test_authorize_checks_the_owner(db, builder):
+    mine, _ = _conversation(db, user_id=1, turns=0)
+    anonymous, _ = _conversation(db, user_id=None, turns=0)
+    assert builder.authorize(db, mine, 1) == mine
+    assert builder.authorize(db, mine, 2) is None
+    assert builder.authorize(db, mine, None) is None
+    assert builder.authorize(db, anonymous, None) == anonymous
+    assert builder.authorize(db, anonymous, 1) is None
+    assert builder.authorize(db, 999_999, 1) is None
+    assert builder.authorize(db, None, 1) is None
+
+
+def test_fold_summarises_the_oldest_turns(db, builder):
+    cid, ids = _conversation(db)
+    builder.build(db, cid, "sys", "hi")
+
+    async def fold():
+        builder.maybe_fold(cid)
+        await asyncio.gather(*builder._tasks)
+
+    asyncio.run(fold())
+    # 80 tokens of tail over a budget of 50: fold down to 25, i.e. keep two messages
+    assert _history(builder.build(db, cid, "sys", "hi"))[-2:] == ["m6", "m7"]
+    db.expire_all()
+    row = db.get(ConversationSummary, cid)
+    assert row.upto_message_id == ids[5]
+    assert row.summary
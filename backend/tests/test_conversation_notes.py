@@ -0,0 +1,57 @@
+import asyncio
+import threading
+
+from app.models.conversation import Conversation
+from app.models.message import Message
+from app.models.note import Note
+from app.services import conversation_notes
+from app.services.topic_repository import TopicRepository
+
+
+class FakeLLM:
+    def __init__(self, reply):
+        self.reply = reply
+        self.prompts = []
+
+    async def chat_completion(self, messages, **params):
+        self.prompts.append(messages)
+        return self.reply
+
+
+def test_notes_are_saved_for_the_owner_off_the_event_loop(db, monkeypatch):
+    conv = Conversation(user_id=5150)
+    db.add(conv)
+    db.flush()
+    db.add_all([Message(conversation_id=conv.id, role="user", content="My sister Maya lives in Pune"),
+                Message(conversation_id=conv.id, role="assistant", content="Tell me more about Maya")])
+    db.commit()
+
+    threads = []
+    save_notes = TopicRepository.save_notes
+
+    def recording(self, *args, **kwargs):
+        threads.append(threading.current_thread())
+        return save_notes(self, *args, **kwargs)
+
+    monkeypatch.setattr(TopicRepository, "save_notes", recording)
+    llm = FakeLLM("# Family Tree\n- Maya: sister, lives in Pune")
+    asyncio.run(conversation_notes.generate_conversation_notes(llm, conv.id))
+
+    assert "user: My sister Maya lives in Pune\nassistant: Tell me more about Maya" in llm.prompts[0][1]["content"]
+    assert threads and threads[0] is not threading.main_thread()
+    (note,) = db.query(Note).filter(Note.user_id == 5150).all()
+    assert note.content.startswith("# Family Tree")
+
+
+def test_nothing_is_saved_without_messages_or_reply(db):
+    conv = Conversation(user_id=5151)
+    db.add(conv)
+    db.commit()
+    llm = FakeLLM("")
+    asyncio.run(conversation_notes.generate_conversation_notes(llm, conv.id))
+    assert llm.prompts == []
+    db.add(Message(conversation_id=conv.id, role="user", content="hi"))
+    db.commit()
+    asyncio.run(conversation_notes.generate_conversation_notes(llm, conv.id))
+    assert len(llm.prompts) == 1
+    assert db.query(Note).filter(Note.user_id == 5151).count() == 0
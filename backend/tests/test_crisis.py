@@ -0,0 +1,49 @@
+import pytest
+
+from app.services.chat_pipeline import ChatTurn, CrisisStage, is_crisis
+
+
+@pytest.mark.parametrize("text", [
+    "I overdosed last night",
+    "she overdoses every weekend",
+    "thinking about an overdose",
+    "I feel suicidal",
+    "suicide is on my mind",
+    "I keep thinking about killing myself",
+    "I want to kill myself",
+    "I've been harming myself again",
+    "I might harm myself",
+    "I hurt myself on purpose",
+    "self-harm helps me cope",
+    "I just want to end it all",
+    "I can't go on like this",
+    "I can’t go on",
+    "I CANNOT GO ON",
+    "sometimes I want to die",
+])
+def test_crisis_phrases_are_flagged(text):
+    assert is_crisis(text)
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "I had a great day at work",
+    "let's spend it on something nice",
+    "my friend is killing it at the gym",
+    "that meeting was harmless",
+])
+def test_ordinary_messages_are_not_flagged(text):
+    assert not is_crisis(text)
+
+
+async def _run(stage, turn):
+    await stage(turn)
+    return turn
+
+
+def test_crisis_stage_sets_flag():
+    import asyncio
+    turn = ChatTurn(message="I overdosed last night", system_prompt="", db=None)
+    asyncio.run(_run(CrisisStage(), turn))
+    assert turn.crisis
+    assert "crisis" in turn.timings
@@ -0,0 +1,153 @@
+import itertools
+
+import pytest
+
+from app.models.dedup import NoteSignature
+from app.models.note import Note, Topic, note_topic
+from app.services.dedup import BANDS, NUM_PERM, Signature, get_deduplicator, unpack
+from app.services.topic_repository import TopicRepository
+
+_users = itertools.count(1000)
+
+
+@pytest.fixture
+def user_id():
+    # Saves commit, so every test files its notes under a user of its own
+    return next(_users)
+
+
+@pytest.fixture
+def repo():
+    return TopicRepository()
+
+
+def _text(seed: int, words: int = 60) -> str:
+    return " ".join(f"w{(i * 7 + seed) % 97}x{seed}" for i in range(words))
+
+
+def _near(text: str) -> str:
+    return text.rsplit(" ", 1)[0] + " changed"
+
+
+def _notes(db, user_id):
+    return db.query(Note).filter(Note.user_id == user_id).order_by(Note.id).all()
+
+
+def _topics(db, note_id):
+    return {n for (n,) in db.query(Topic.name).join(note_topic, note_topic.c.topic_id == Topic.id).filter(note_topic.c.note_id == note_id)}
+
+
+def _root(db, note_id):
+    return db.query(NoteSignature.version_of).filter(NoteSignature.note_id == note_id).scalar()
+
+
+# -- MinHash / LSH ---------------------------------------------------------------
+
+def test_signature_round_trip():
+    sig = Signature.of(_text(1))
+    assert len(sig.minhash) == NUM_PERM
+    assert len(sig.buckets) == BANDS
+    assert unpack(sig.packed()) == sig.minhash
+    assert Signature.of(_text(1)) == sig
+
+
+def test_signature_normalises_case_and_punctuation():
+    assert Signature.of("Hello, World! How are you?").content_hash == Signature.of("hello world how are you").content_hash
+
+
+def test_similarity_estimates_jaccard():
+    sig = Signature.of(_text(1))
+    assert sig.similarity(Signature.of(_near(_text(1))).minhash) >= 0.8
+    assert sig.similarity(Signature.of(_text(2)).minhash) < 0.2
+
+
+def test_find_looks_up_buckets_of_the_users_notes(db, user_id):
+    note = Note(path=None, content=_text(3), user_id=user_id)
+    db.add(note)
+    db.flush()
+    get_deduplicator().index(db, [(note.id, user_id, Signature.of(note.content), None)])
+    db.commit()
+
+    exact, near, other = get_deduplicator().find(
+        db, user_id, [Signature.of(_text(3)), Signature.of(_near(_text(3))), Signature.of(_text(4))], 0.8,
+    )
+    assert (exact.note_id, exact.similarity, exact.root) == (note.id, 1.0, note.id)
+    assert near.note_id == note.id and 0.8 <= near.similarity < 1.0
+    assert other is None
+    assert get_deduplicator().find(db, user_id + 10_000, [Signature.of(_text(3))], 0.8) == [None]
+
+
+# -- TopicRepository.save_notes ----------------------------------------------------
+
+def test_skip_keeps_the_stored_note(db, repo, user_id):
+    first = repo.save_notes(db, [("a.md", _text(5), ["Work"])], user_id=user_id, policy="skip", threshold=0.8)[0]
+    again = repo.save_notes(db, [("b.md", _near(_text(5)), ["Home"])], user_id=user_id, policy="skip", threshold=0.8)[0]
+    assert first.action == "created"
+    assert (again.action, again.duplicate_of, again.note.id) == ("skipped", first.note.id, first.note.id)
+    assert [n.content for n in _notes(db, user_id)] == [_text(5)]
+    assert _topics(db, first.note.id) == {"Work"}
+
+
+def test_merge_takes_new_content_and_topics(db, repo, user_id):
+    first = repo.save_notes(db, [("a.md", _text(6), ["Work"])], user_id=user_id, policy="merge", threshold=0.8)[0]
+    merged = repo.save_notes(db, [("b.md", _near(_text(6)), ["Home"])], user_id=user_id, policy="merge", threshold=0.8)[0]
+    assert (merged.action, merged.duplicate_of) == ("merged", first.note.id)
+    notes = _notes(db, user_id)
+    assert [(n.id, n.path, n.content) for n in notes] == [(first.note.id, "b.md", _near(_text(6)))]
+    assert _topics(db, first.note.id) == {"Work", "Home"}
+    # The signature follows the merged content
+    exact = get_deduplicator().find(db, user_id, [Signature.of(_near(_text(6)))], 0.8)[0]
+    assert exact.similarity == 1.0
+
+
+def test_versions_share_the_root_of_their_chain(db, repo, user_id):
+    first = repo.save_notes(db, [(None, _text(7), [])], user_id=user_id, policy="version", threshold=0.8)[0]
+    second = repo.save_notes(db, [(None, _near(_text(7)), [])], user_id=user_id, policy="version", threshold=0.8)[0]
+    third = repo.save_notes(db, [(None, _text(7).rsplit(" ", 2)[0] + " edited again", [])], user_id=user_id, policy="version", threshold=0.8)[0]
+    assert (second.action, second.duplicate_of) == ("versioned", first.note.id)
+    assert third.action == "versioned"
+    assert len(_notes(db, user_id)) == 3
+    assert _root(db, first.note.id) is None
+    assert _root(db, second.note.id) == first.note.id
+    assert _root(db, third.note.id) == first.note.id
+
+
+def test_duplicates_within_a_batch_point_at_the_earlier_item(db, repo, user_id):
+    saved = repo.save_notes(
+        db, [(None, _text(8), ["A"]), (None, _near(_text(8)), ["B"]), (None, _text(9), [])],
+        user_id=user_id, policy="skip", threshold=0.8,
+    )
+    assert [s.action for s in saved] == ["created", "skipped", "created"]
+    assert saved[1].duplicate_of == saved[0].note.id
+    assert len(_notes(db, user_id)) == 2
+
+
+def test_merge_within_a_batch_writes_one_note(db, repo, user_id):
+    saved = repo.save_notes(
+        db, [("a.md", _text(10), ["A"]), (None, _near(_text(10)), ["B"])],
+        user_id=user_id, policy="merge", threshold=0.8,
+    )
+    assert [s.action for s in saved] == ["created", "merged"]
+    notes = _notes(db, user_id)
+    assert [(n.path, n.content) for n in notes] == [("a.md", _near(_text(10)))]
+    assert _topics(db, notes[0].id) == {"A", "B"}
+
+
+def test_version_within_a_batch_roots_at_the_first_item(db, repo, user_id):
+    saved = repo.save_notes(
+        db, [(None, _text(11), []), (None, _near(_text(11)), [])],
+        user_id=user_id, policy="version", threshold=0.8,
+    )
+    assert [s.action for s in saved] == ["created", "versioned"]
+    assert _root(db, saved[1].note.id) == saved[0].note.id
+
+
+def test_off_saves_everything(db, repo, user_id):
+    saved = repo.save_notes(db, [(None, _text(12), []), (None, _text(12), [])], user_id=user_id, policy="off")
+    assert [s.action for s in saved] == ["created", "created"]
+    assert len(_notes(db, user_id)) == 2
+
+
+def test_unknown_policy_is_rejected(db, repo, user_id):
+    with pytest.raises(ValueError):
+        repo.save_notes(db, [(None, _text(13), [])], user_id=user_id, policy="drop")
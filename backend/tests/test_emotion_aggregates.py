@@ -0,0 +1,78 @@
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import create_engine
+
+from app.models.emotion import EmotionDaily
+from app.services.emotion_store import EmotionStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return EmotionStore(create_engine(f"sqlite:///{tmp_path}/emotion.db"))
+
+
+def _daily(store):
+    db = store._session()
+    try:
+        return sorted(
+            (r.user_key, r.day, r.emotion, r.feeling, r.entries, r.intensity_sum, r.intensity_n, r.confidence_sum, r.confidence_n)
+            for r in db.query(EmotionDaily)
+        )
+    finally:
+        db.close()
+
+
+def test_append_updates_cached_aggregates(store):
+    store.append("ann", {"emotion": "Joy", "confidence": 80, "intensity": "high"}, "good day", ["Feelings/happy"], datetime(2024, 5, 1, 9))
+    agg = store.aggregates("ann")
+    store.append("ann", {"emotion": "joy", "confidence": 60, "intensity": "low"}, "still good", [], datetime(2024, 5, 1, 18))
+    store.append("ann", {"emotion": "sadness"}, "tired", [], datetime(2024, 5, 2, 8))
+
+    assert store.aggregates("ann") is agg
+    assert agg.entries == 3 and agg.has_feelings
+    joy = agg.by_day[date(2024, 5, 1)]["joy"]
+    assert (joy.feeling, joy.entries, joy.intensity_sum, joy.intensity_n, joy.confidence_sum, joy.confidence_n) == ("happy", 2, 4, 2, 140.0, 2)
+    assert store.aggregate_stats()["loads"] == 1
+
+
+def test_feelings_summary_reads_the_counters(store):
+    assert store.feelings_summary("ann", date(2024, 1, 1)) is None
+    store.append("ann", {"emotion": "joy"}, "a", ["Feelings/happy"], datetime(2024, 5, 1, 9))
+    store.append("ann", {"emotion": "joy"}, "b", ["Feelings/happy"], datetime(2024, 5, 3, 9))
+    store.append("ann", {"emotion": "fear"}, "c", ["Feelings/anxious"], datetime(2024, 5, 3, 10))
+    assert store.feelings_summary("ann", date(2024, 5, 2)) == {"happy": 1, "anxious": 1}
+
+
+def test_rebuild_matches_incremental_counters(store):
+    store.append("ann", {"emotion": "joy", "confidence": 80, "intensity": "high"}, "a", ["Feelings/happy", "Work"], datetime(2024, 5, 1, 9))
+    store.append("ann", {"emotion": "joy", "confidence": 70}, "b", ["Work"], datetime(2024, 5, 1, 10))
+    store.append("bob", {"emotion": "anger", "intensity": "medium"}, "c", [], datetime(2024, 5, 3, 11))
+    incremental = _daily(store)
+
+    assert store.rebuild_aggregates() == 2
+    assert _daily(store) == incremental
+    assert store.rebuild_aggregates("bob") == 1
+    assert _daily(store) == incremental
+
+
+def test_rebuild_drops_the_cached_user(store):
+    store.append("ann", {"emotion": "joy"}, "a", [], datetime(2024, 5, 1, 9))
+    cached = store.aggregates("ann")
+    store.rebuild_aggregates("ann")
+    assert store.aggregates("ann") is not cached
+    assert store.aggregates("ann").entries == 1
+
+
+def test_trends_over_the_counters(store):
+    pytest.importorskip("numpy")
+    from app.services.emotion_trends import emotion_trends
+
+    for day, emotion in [(1, "joy"), (2, "joy"), (2, "joy"), (3, "fear"), (5, "joy")]:
+        store.append("ann", {"emotion": emotion, "confidence": 50}, "x", [], datetime(2024, 5, day, 9))
+    trends = emotion_trends(store.aggregates("ann"), days=5, window=2, today=date(2024, 5, 5))
+    assert trends["histogram"] == {"fear": [0, 0, 1, 0, 0], "joy": [1, 2, 0, 0, 1]}
+    assert trends["moving_average_total"] == [1.0, 1.5, 1.5, 0.5, 0.5]
+    assert trends["dominant"] == ["joy", "joy", "fear", None, "joy"]
+    assert [(s["emotion"], s["days"]) for s in trends["streaks"]] == [("joy", 2), ("fear", 1), ("joy", 1)]
+    assert trends["current_streak"]["end"] == "2024-05-05"
@@ -0,0 +1,51 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+
+from app.services.emotion_search import pack_offsets, parse_query, tokenize, unpack_offsets
+from app.services.emotion_store import EmotionStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return EmotionStore(create_engine(f"sqlite:///{tmp_path}/emotion.db"))
+
+
+@pytest.mark.parametrize("offsets", [[], [0], [3, 9, 127], [0, 128, 16_384, 16_385, 2_000_000]])
+def test_offsets_round_trip(offsets):
+    assert unpack_offsets(pack_offsets(offsets)) == offsets
+
+
+def test_small_deltas_take_one_byte_each():
+    assert len(pack_offsets([5, 10, 100])) == 3
+
+
+def test_tokenize_keeps_every_offset():
+    assert tokenize("Stress, more stress") == {"stress": [0, 13], "more": [8]}
+
+
+def test_parse_query():
+    assert parse_query("Deadline stress* OR exam | ") == [["deadline", "stress*"], ["exam"]]
+
+
+def test_search_ands_terms_and_matches_prefixes(store):
+    store.append("ann", {"emotion": "fear", "confidence": 70}, "exam deadline tomorrow", ["School"], datetime(2024, 5, 1, 9))
+    store.append("ann", {"emotion": "fear", "confidence": 70}, "job interview stressful", ["Work"], datetime(2024, 5, 2, 9))
+    store.append("bob", {"emotion": "fear", "confidence": 70}, "exam deadline", ["School"], datetime(2024, 5, 1, 9))
+
+    assert [r["file"] for r in store.search("ann", "exam deadline")] == ["School/2024-05-01.txt"]
+    assert store.search("ann", "exam interview") == []
+    assert {r["file"] for r in store.search("ann", "exam OR interview")} == {"School/2024-05-01.txt", "Work/2024-05-02.txt"}
+    assert [r["file"] for r in store.search("ann", "stress*")] == ["Work/2024-05-02.txt"]
+    assert [r["file"] for r in store.search("ann", "exam OR interview", category="Work")] == ["Work/2024-05-02.txt"]
+    hit = store.search("ann", "deadline")[0]
+    assert "deadline" in hit["preview"] and hit["matches"] == 1
+
+
+def test_rebuilt_index_answers_the_same(store):
+    store.append("ann", {"emotion": "joy", "confidence": 70}, "sunny walk in the park", ["Life"], datetime(2024, 5, 1, 9))
+    store.append("ann", {"emotion": "joy", "confidence": 70}, "park again", ["Life"], datetime(2024, 5, 4, 9))
+    before = store.search("ann", "park")
+    assert store.rebuild_search_index("ann") == 2
+    assert store.search("ann", "park") == before
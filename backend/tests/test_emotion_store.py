@@ -0,0 +1,59 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+
+from app.services.emotion_store import EmotionStore, render_entry
+
+
+@pytest.fixture
+def store(tmp_path):
+    return EmotionStore(create_engine(f"sqlite:///{tmp_path}/emotion.db"))
+
+
+def test_entries_without_categories_are_stored(store):
+    entry_id = store.append("ann", {"emotion": "neutral"}, "nothing much", [], datetime(2024, 5, 1, 9))
+    assert entry_id > 0
+    assert store.category_list("ann") == []
+    assert store.aggregates("ann").entries == 1
+
+
+def test_day_files_render_the_old_text_layout(store):
+    when = datetime(2024, 5, 1, 9, 30, 5)
+    store.append("ann", {"emotion": "joy", "confidence": 80}, "good day", ["Feelings/happy", "Work"], when)
+    store.append("ann", {"emotion": "joy", "confidence": 70}, "lunch", ["Work"], datetime(2024, 5, 1, 12))
+    db = store._session()
+    try:
+        files = {f.name: f.text for f in store.render_files(db, "ann")}
+        work_only = [f.name for f in store.render_files(db, "ann", category="Work")]
+    finally:
+        db.close()
+    assert set(files) == {"Feelings/happy/2024-05-01.txt", "Work/2024-05-01.txt"}
+    assert files["Work/2024-05-01.txt"] == render_entry(when, "joy", "80", "good day") + render_entry(datetime(2024, 5, 1, 12), "joy", "70", "lunch")
+    assert work_only == ["Work/2024-05-01.txt"]
+
+
+def test_category_list_counts_day_files_per_top_level(store):
+    store.append("ann", {"emotion": "joy"}, "a", ["Feelings/happy"], datetime(2024, 5, 1, 9))
+    store.append("ann", {"emotion": "fear"}, "b", ["Feelings/anxious"], datetime(2024, 5, 2, 9))
+    store.append("bob", {"emotion": "joy"}, "c", ["Work"], datetime(2024, 5, 2, 9))
+    (feelings,) = store.category_list("ann")
+    assert (feelings["name"], feelings["file_count"]) == ("Feelings", 2)
+    assert feelings["last_modified"] == "2024-05-02T09:00:00"
+
+
+def test_export_and_migrate_round_trip(store, tmp_path):
+    store.append("ann", {"emotion": "joy", "confidence": 80}, "good day\nreally", ["Feelings/happy", "Work"], datetime(2024, 5, 1, 9))
+    store.append("ann", {"emotion": "anger", "confidence": 55}, "traffic", ["Work"], datetime(2024, 5, 2, 18))
+    assert store.export(tmp_path / "out") == 3
+
+    copy = EmotionStore(create_engine(f"sqlite:///{tmp_path}/copy.db"))
+    # The entry filed under two categories comes back as one entry
+    assert copy.migrate(tmp_path / "out") == {"files": 3, "entries": 2, "skipped": 0}
+    assert copy.migrate(tmp_path / "out") == {"files": 3, "entries": 0, "skipped": 2}
+    db, copy_db = store._session(), copy._session()
+    try:
+        assert sorted((f.name, f.text) for f in copy.render_files(copy_db, "ann")) == sorted((f.name, f.text) for f in store.render_files(db, "ann"))
+    finally:
+        db.close()
+        copy_db.close()
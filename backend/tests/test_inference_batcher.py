@@ -0,0 +1,81 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services.inference_batcher import MicroBatcher
+
+
+def test_concurrent_submits_share_a_batch():
+    seen = []
+
+    def fn(items):
+        seen.append(list(items))
+        return [i * 2 for i in items]
+
+    async def run():
+        batcher = MicroBatcher(fn, max_batch=4, max_wait_ms=20)
+        try:
+            return await asyncio.gather(*(batcher.submit(i) for i in range(6))), batcher.stats()
+        finally:
+            await batcher.close()
+
+    results, stats = asyncio.run(run())
+    assert results == [0, 2, 4, 6, 8, 10]
+    assert seen == [[0, 1, 2, 3], [4, 5]]
+    assert (stats["batches"], stats["items"], stats["max_batch_size"]) == (2, 6, 4)
+
+
+@pytest.mark.parametrize("fn", [lambda items: items[:-1], lambda items: 1 / 0])
+def test_every_caller_fails_when_the_batch_does(fn):
+    async def run():
+        batcher = MicroBatcher(fn, max_batch=4, max_wait_ms=20)
+        try:
+            return await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+        finally:
+            await batcher.close()
+
+    results = asyncio.run(asyncio.wait_for(run(), 5))
+    assert len(results) == 3 and all(isinstance(r, Exception) for r in results)
+
+
+def test_close_fails_queued_and_running_callers():
+    started, release = threading.Event(), threading.Event()
+
+    def fn(items):
+        started.set()
+        release.wait(5)
+        return items
+
+    async def run():
+        batcher = MicroBatcher(fn, max_batch=1, max_wait_ms=0)
+        calls = [asyncio.ensure_future(batcher.submit(i)) for i in range(3)]
+        await asyncio.to_thread(started.wait, 5)
+        await batcher.close()
+        release.set()
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    results = asyncio.run(asyncio.wait_for(run(), 5))
+    assert [str(r) for r in results] == ["batcher closed"] * 3
+
+
+def test_cancelled_callers_are_dropped_before_inference():
+    seen = []
+
+    def fn(items):
+        seen.extend(items)
+        return items
+
+    async def run():
+        batcher = MicroBatcher(fn, max_batch=8, max_wait_ms=30)
+        try:
+            gone = asyncio.ensure_future(batcher.submit("gone"))
+            kept = asyncio.ensure_future(batcher.submit("kept"))
+            await asyncio.sleep(0)
+            gone.cancel()
+            return await kept
+        finally:
+            await batcher.close()
+
+    assert asyncio.run(run()) == "kept"
+    assert seen == ["kept"]
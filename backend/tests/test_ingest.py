@@ -0,0 +1,56 @@
+import asyncio
+import io
+
+import pytest
+from fastapi import UploadFile
+
+from app.services import ingest
+from app.services.ingest import UploadTooLarge, decode_bytes, detect_encoding, read_upload, read_upload_text, split_sections
+
+
+def _upload(data: bytes) -> UploadFile:
+    return UploadFile(io.BytesIO(data), filename="note.txt")
+
+
+@pytest.mark.parametrize("raw, encoding", [
+    ("héllo".encode("utf-8-sig"), "utf-8-sig"),
+    ("héllo".encode("utf-16"), "utf-16"),
+    ("hello world".encode("utf-16-le"), "utf-16-le"),
+    ("hello world".encode("utf-16-be"), "utf-16-be"),
+    ("héllo".encode("utf-8"), "utf-8"),
+    ("héllo".encode("cp1252"), "cp1252"),
+])
+def test_detect_encoding(raw, encoding):
+    assert detect_encoding(raw) == encoding
+
+
+def test_multibyte_character_cut_at_the_sample_edge_is_still_utf8():
+    assert detect_encoding("aé".encode("utf-8")[:-1]) == "utf-8"
+
+
+def test_read_upload_stops_past_the_limit(monkeypatch):
+    monkeypatch.setattr(ingest, "CHUNK_SIZE", 4)
+    assert asyncio.run(read_upload(_upload(b"12345678"), 8)) == b"12345678"
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(read_upload(_upload(b"123456789"), 8))
+
+
+def test_streamed_text_matches_whole_buffer_decoding(monkeypatch):
+    monkeypatch.setattr(ingest, "CHUNK_SIZE", 5)
+    monkeypatch.setattr(ingest, "SAMPLE_SIZE", 7)
+    for text, encoding in (("naïve café résumé " * 3, "utf-8"), ("plain text " * 3, "utf-16"), ("", "utf-8")):
+        raw = text.encode(encoding)
+        assert asyncio.run(read_upload_text(_upload(raw), 1000)) == decode_bytes(raw) == text
+
+
+def test_short_text_is_one_section():
+    assert split_sections("short", 100) == ["short"]
+
+
+def test_sections_follow_headings_and_stay_under_the_limit():
+    text = "# One\n\n" + "alpha " * 10 + "\n\n# Two\n\n" + "beta. " * 30
+    sections = split_sections(text, 80)
+    assert all(len(s) <= 80 for s in sections)
+    assert sections[0].startswith("# One") and any(s.startswith("# Two") for s in sections)
+    # Nothing is lost but whitespace
+    assert "".join(sections).replace(" ", "").replace("\n", "") == text.replace(" ", "").replace("\n", "")
@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.job_queue import JobQueue
+
+
+@pytest.fixture(autouse=True)
+def schema(engine):
+    return engine
+
+
+def _recorder():
+    calls = []
+
+    async def handler(payload):
+        calls.append(payload)
+    return calls, handler
+
+
+def test_notifications_coalesce_into_one_run():
+    calls, handler = _recorder()
+    queue = JobQueue(workers=1, checkpoint_s=60)
+    queue.register("jq_every", handler, every=3, idle_s=60)
+
+    async def run():
+        await queue.start()
+        for turn in range(5):
+            queue.notify("jq_every", 1, {"turn": turn})
+            await asyncio.sleep(0.02)
+        await asyncio.sleep(0.05)
+        await queue.stop()
+
+    asyncio.run(run())
+    # Due on the third notification; the remaining two wait for the idle timer
+    assert calls == [{"turn": 2}]
+    stats = queue.stats()
+    assert (stats["notified"], stats["coalesced"], stats["completed"], stats["pending"]) == (5, 3, 1, 1)
+
+
+def test_idle_key_runs_after_the_delay():
+    calls, handler = _recorder()
+    queue = JobQueue(workers=1, checkpoint_s=60)
+    queue.register("jq_idle", handler, every=10, idle_s=0.05)
+
+    async def run():
+        await queue.start()
+        queue.notify("jq_idle", 1, {"n": 1})
+        await asyncio.sleep(0.02)
+        assert calls == []
+        await asyncio.sleep(0.1)
+        await queue.stop()
+
+    asyncio.run(run())
+    assert calls == [{"n": 1}]
+
+
+def test_workers_wait_for_spare_capacity_and_count_failures():
+    async def broken(payload):
+        raise RuntimeError("boom")
+
+    queue = JobQueue(workers=1, checkpoint_s=60)
+    queue.register("jq_fail", broken)
+    busy = [True]
+    queue.capacity_check = lambda: not busy[0]
+
+    async def run():
+        await queue.start()
+        queue.notify("jq_fail", 1, {})
+        await asyncio.sleep(0.05)
+        assert queue.stats()["running"] == 1 and queue.failed == 0
+        busy[0] = False
+        await asyncio.sleep(1.1)
+        await queue.stop()
+
+    asyncio.run(run())
+    assert queue.failed == 1 and queue.stats()["running"] == 0
+
+
+def test_pending_jobs_survive_a_restart():
+    _, handler = _recorder()
+    first = JobQueue(workers=1, checkpoint_s=60)
+    first.register("jq_restore", handler, every=5, idle_s=3600)
+
+    async def run_first():
+        await first.start()
+        first.notify("jq_restore", 9, {"conversation_id": 9})
+        await first.stop()
+
+    asyncio.run(run_first())
+
+    calls, handler = _recorder()
+    second = JobQueue(workers=1, checkpoint_s=60)
+    second.register("jq_restore", handler, every=5, idle_s=3600)
+
+    async def run_second():
+        await second.start()
+        assert second.stats()["pending"] == 1
+        second._pending["jq_restore:9"].due_at = time.time()  # the idle delay has passed
+        second._wakeup.set()
+        await asyncio.sleep(0.05)
+        await second.stop()
+
+    asyncio.run(run_second())
+    assert calls == [{"conversation_id": 9}]
+    # Finished jobs are removed from the checkpoint table
+    assert all(j.key != "jq_restore:9" for j in JobQueue._load())
+
+
+def test_unknown_kind_is_rejected():
+    with pytest.raises(KeyError):
+        JobQueue().notify("jq_missing", 1, {})
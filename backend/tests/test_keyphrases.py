@@ -0,0 +1,72 @@
+import pytest
+
+from app.config import settings
+from app.models.note import Note
+from app.services import keyphrases
+from app.services.keyphrases import KeyphraseEngine, candidate_phrases, document_terms
+
+
+def test_candidates_split_at_stopwords_and_punctuation():
+    text = "Buy fresh tomato seeds, then plant them in the raised garden bed at https://example.com/x today."
+    assert candidate_phrases(text) == [("buy", "fresh", "tomato"), ("seeds",), ("plant",), ("raised", "garden", "bed")]
+    assert document_terms("Garden garden GARDEN") == {"garden"}
+
+
+def test_corpus_is_bootstrapped_from_existing_notes(db):
+    db.add_all([Note(content=f"Morning journal entry number {i} about work", user_id=501) for i in range(3)])
+    db.commit()
+    engine = KeyphraseEngine()
+    result = engine.extract("Journal entry about sourdough starter hydration", user_id=501)
+    assert result.documents == 3
+    # Words in every note sink below the distinctive ones
+    assert result.topics[0] == "sourdough starter hydration"
+    # Another engine reads the stored statistics instead of rescanning
+    assert KeyphraseEngine()._load(501).df["journal"] == 3
+
+
+def test_recorded_notes_update_the_statistics(db):
+    engine = KeyphraseEngine()
+    engine.extract("anything", user_id=502)
+    delta = engine.record(db, 502, ["Sourdough bread baking", "Sourdough starter care"])
+    db.commit()
+    engine.apply(delta)
+    corpus = engine._corpus(502)
+    assert (corpus.documents, corpus.df["sourdough"], corpus.df["bread"]) == (2, 2, 1)
+    assert KeyphraseEngine()._load(502).df == corpus.df
+
+    delta = engine.record(db, 502, [], removed=["Sourdough bread baking"])
+    db.commit()
+    engine.apply(delta)
+    assert (corpus.documents, corpus.df["sourdough"], "bread" in corpus.df) == (1, 1, False)
+
+
+def test_results_are_cached_until_the_corpus_grows(db):
+    engine = KeyphraseEngine()
+    text = "Tomato blight prevention with copper spray"
+    first = engine.extract(text, user_id=503)
+    assert engine.extract(text, user_id=503) is first and engine.cache_hits == 1
+    delta = engine.record(db, 503, [f"Garden note {i}" for i in range(3)])
+    db.commit()
+    engine.apply(delta)
+    assert engine.extract(text, user_id=503).documents == 3
+
+
+def test_confidence_needs_a_corpus_and_enough_phrases(db, monkeypatch):
+    monkeypatch.setattr(settings, "keyphrase_min_corpus_docs", 2)
+    engine = KeyphraseEngine()
+    text = "Tomato blight. Copper spray. Raised beds. Drip irrigation."
+    assert not engine.extract(text, user_id=504).confident
+    delta = engine.record(db, 504, ["one note", "another note", "third note"])
+    db.commit()
+    engine.apply(delta)
+    assert engine.extract(text, user_id=504).confident
+    assert not engine.extract("Tomato blight", user_id=504).confident
+
+
+@pytest.mark.skipif(keyphrases.np is None, reason="numpy not installed")
+def test_vectorized_and_pure_python_scores_agree(monkeypatch):
+    phrases = candidate_phrases("Raised garden bed. Garden hose. Raised garden bed again. Compost bin.")
+    corpus = keyphrases._Corpus(10, {"garden": 8, "compost": 1})
+    vectorized = keyphrases._score(phrases, corpus)
+    monkeypatch.setattr(keyphrases, "np", None)
+    assert keyphrases._score(phrases, corpus) == pytest.approx(vectorized)
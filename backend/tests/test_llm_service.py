@@ -0,0 +1,97 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.llm_service import LLMService
+
+
+class FakeStream:
+    def __init__(self, chunks) -> None:
+        self.chunks = chunks
+        self.closed = False
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+class FakeClient:
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self.streams = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, stream=False, **params):
+        self.calls.append(params)
+        if stream:
+            self.streams.append(FakeStream(["a", "b", "c"]))
+            return self.streams[-1]
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=params["messages"][-1]["content"]))])
+
+
+def _message(text):
+    return [{"role": "user", "content": text}]
+
+
+def test_missing_client_names_the_key():
+    service = LLMService(None, "m", 1)
+    service.api_key_env = "FAKE_API_KEY"
+    with pytest.raises(RuntimeError, match="FAKE_API_KEY"):
+        asyncio.run(service.chat_completion(_message("hi")))
+
+
+def test_only_given_sampling_params_are_sent():
+    client = FakeClient()
+    service = LLMService(client, "m", 1)
+    asyncio.run(service.chat_completion(_message("hi"), temperature=0.5))
+    assert client.calls == [{"model": "m", "messages": _message("hi"), "temperature": 0.5}]
+
+
+def test_identical_requests_share_one_upstream_call():
+    client = FakeClient(delay=0.05)
+    service = LLMService(client, "m", 4)
+
+    async def burst():
+        return await asyncio.gather(*(service.chat_completion(_message("same")) for _ in range(3)))
+
+    assert asyncio.run(burst()) == ["same"] * 3
+    assert len(client.calls) == 1
+
+
+def test_limiter_caps_concurrent_upstream_calls():
+    client = FakeClient(delay=0.02)
+    service = LLMService(client, "m", 2)
+
+    async def burst():
+        return await asyncio.gather(*(service.chat_completion(_message(f"q{i}")) for i in range(6)))
+
+    assert asyncio.run(burst()) == [f"q{i}" for i in range(6)]
+    assert client.peak == 2
+
+
+def test_closing_a_stream_closes_upstream_and_frees_the_slot():
+    client = FakeClient()
+    service = LLMService(client, "m", 1)
+
+    async def consume():
+        stream = await service.chat_completion(_message("hi"), stream=True)
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first
+
+    assert asyncio.run(consume()) == "a"
+    assert client.streams[0].closed
+    assert not service._limiter.locked()
@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+import pytest
+
+from app.config import settings
+from app.schemas.note import Heading
+from app.services.note_organizer import NoteOrganizer, OrganizeOutcome, merge_outcomes, parse_organize
+
+
+class FakeLLM:
+    model = "fake-model"
+
+    def __init__(self, reply) -> None:
+        self.reply = reply
+        self.calls = 0
+
+    async def chat_completion(self, messages, **params):
+        self.calls += 1
+        return self.reply
+
+
+@pytest.fixture(autouse=True)
+def ask_the_llm(monkeypatch):
+    monkeypatch.setattr(settings, "organize_prefer_local", False)
+
+
+REPLY = json.dumps({
+    "headings": [{"level": 1, "text": "Plan"}],
+    "topics": ["garden", "tomatoes"],
+    "categories": ["personal", "Gardening"],
+})
+
+
+def test_parse_organize_cleans_up_the_reply():
+    parsed = parse_organize('Sure! ```json\n{"headings": [{"level": 7, "text": " Intro "}, {"text": ""}], '
+                            '"topics": "a, b, a", "categories": ["WORK", "Nope"]}\n```')
+    assert parsed == {"headings": [Heading(level=3, text="Intro")], "topics": ["a", "b"], "categories": ["Work"]}
+    assert parse_organize("no json here") is None
+    assert parse_organize("{not json}") is None
+
+
+def test_llm_result_is_cached_by_content(db):
+    organizer = NoteOrganizer()
+    llm = FakeLLM(REPLY)
+    text = "Plant tomatoes along the south fence in early May."
+    first = asyncio.run(organizer.organize(db, llm, text))
+    assert (first.topics, first.categories, first.source, first.cached) == (["garden", "tomatoes"], ["Personal"], "llm", False)
+    second = asyncio.run(organizer.organize(db, llm, text))
+    assert second.cached and second.topics == first.topics
+    assert llm.calls == 1
+    assert organizer.stats()["cache_hits"] == 1
+
+
+def test_bad_reply_falls_back_to_heuristics_and_is_not_cached(db):
+    organizer = NoteOrganizer()
+    llm = FakeLLM("I cannot do that")
+    text = "Meeting notes: budget review with the project team."
+    for _ in range(2):
+        outcome = asyncio.run(organizer.organize(db, llm, text))
+        assert outcome.source == "heuristic" and outcome.topics
+    assert llm.calls == 2 and organizer.fallbacks == 2
+
+
+def test_confident_local_result_skips_the_llm(db, monkeypatch):
+    monkeypatch.setattr(settings, "organize_prefer_local", True)
+    monkeypatch.setattr("app.services.note_organizer.organize_local", lambda text, user_id: (OrganizeOutcome([], ["x"], ["Work"], "local"), True))
+    llm = FakeLLM(REPLY)
+    outcome = asyncio.run(NoteOrganizer().organize(db, llm, "anything"))
+    assert (outcome.source, outcome.topics, llm.calls) == ("local", ["x"], 0)
+
+
+def test_merge_ranks_topics_by_how_many_sections_mention_them():
+    merged = merge_outcomes([
+        OrganizeOutcome([Heading(level=1, text="A")], ["x", "y"], ["Work"], "local"),
+        OrganizeOutcome([Heading(level=1, text="A"), Heading(level=2, text="B")], ["y"], ["Work", "Ideas"], "llm", cached=True),
+    ])
+    assert [h.text for h in merged.headings] == ["A", "B"]
+    assert merged.topics == ["y", "x"] and merged.categories == ["Work", "Ideas"]
+    assert (merged.source, merged.cached) == ("llm", False)
@@ -0,0 +1,183 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.services.provider_router import CLOSED, HALF_OPEN, OPEN, ProviderRouter
+
+
+class FakeProvider:
+    def __init__(self, name: str, delay: float = 0.0, fail: bool = False) -> None:
+        self.model = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = 0
+
+    async def chat_completion(self, messages, **params):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise RuntimeError(f"{self.model} is down")
+        return f"reply from {self.model}"
+
+
+@pytest.fixture(autouse=True)
+def fast_settings(monkeypatch):
+    monkeypatch.setattr(settings, "llm_breaker_failure_threshold", 3)
+    monkeypatch.setattr(settings, "llm_breaker_cooldown_s", 30.0)
+    monkeypatch.setattr(settings, "llm_default_latency_ms", 20.0)
+    monkeypatch.setattr(settings, "llm_hedge_min_delay_ms", 10.0)
+    monkeypatch.setattr(settings, "llm_hedge_max_delay_ms", 50.0)
+
+
+def _router(*providers, hedge=False):
+    router = ProviderRouter(hedge=hedge)
+    for p in providers:
+        router.register(p.model, p)
+    return router
+
+
+def _state(router, name):
+    return next(p for p in router._providers if p.name == name)
+
+
+def test_fails_over_to_the_next_provider():
+    down, up = FakeProvider("a", fail=True), FakeProvider("b")
+    router = _router(down, up)
+    result = asyncio.run(router.complete([]))
+    assert (result.provider, result.content, result.hedged) == ("b", "reply from b", False)
+    assert _state(router, "a").failures == 1
+    assert _state(router, "b").successes == 1
+
+
+def test_breaker_opens_after_consecutive_failures():
+    down = FakeProvider("a", fail=True)
+    router = _router(down)
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            asyncio.run(router.complete([]))
+    assert _state(router, "a").state == OPEN
+    # All tripped: still tried as a best effort rather than failing outright
+    with pytest.raises(RuntimeError):
+        asyncio.run(router.complete([]))
+    assert down.calls == 4
+
+
+def test_open_provider_is_skipped_while_another_is_healthy():
+    down, up = FakeProvider("a", fail=True), FakeProvider("b", delay=0.01)
+    router = _router(down, up)
+    _state(router, "b").latency_ewma = 5000.0  # ranked last while "a" is healthy
+    for _ in range(3):
+        assert asyncio.run(router.complete([])).provider == "b"
+    assert _state(router, "a").state == OPEN
+    assert asyncio.run(router.complete([])).provider == "b"
+    assert down.calls == 3
+
+
+def test_half_open_lets_one_trial_through_and_closes_on_success(monkeypatch):
+    flaky = FakeProvider("a", fail=True)
+    router = _router(flaky)
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            asyncio.run(router.complete([]))
+    provider = _state(router, "a")
+    assert not router.has_spare_capacity()
+    assert provider.state == OPEN  # capacity checks never start the recovery probe
+
+    monkeypatch.setattr(settings, "llm_breaker_cooldown_s", 0.0)
+    assert provider.available(provider.opened_at)
+    assert provider.state == HALF_OPEN
+    provider.trial_in_flight = True
+    assert not provider.available(provider.opened_at)
+    provider.trial_in_flight = False
+
+    flaky.fail = False
+    assert asyncio.run(router.complete([])).content == "reply from a"
+    assert provider.state == CLOSED and provider.consecutive_failures == 0
+
+
+def test_failed_trial_reopens_the_breaker(monkeypatch):
+    down = FakeProvider("a", fail=True)
+    router = _router(down)
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            asyncio.run(router.complete([]))
+    monkeypatch.setattr(settings, "llm_breaker_cooldown_s", 0.0)
+    with pytest.raises(RuntimeError):
+        asyncio.run(router.complete([]))
+    assert _state(router, "a").state == OPEN
+
+
+def test_hedge_races_a_second_provider_after_the_delay():
+    slow, fast = FakeProvider("a", delay=1.0), FakeProvider("b")
+    router = _router(slow, fast, hedge=True)
+    result = asyncio.run(router.complete([]))
+    assert (result.provider, result.hedged) == ("b", True)
+    assert result.latency_ms < 1000
+    # The loser is cancelled, which says nothing about its health
+    assert slow.cancelled == 1
+    assert _state(router, "a").failures == 0
+    assert _state(router, "a").inflight == 0
+
+
+def test_no_hedge_when_the_first_answer_is_quick():
+    quick, other = FakeProvider("a"), FakeProvider("b")
+    router = _router(quick, other, hedge=True)
+    result = asyncio.run(router.complete([]))
+    assert (result.provider, result.hedged) == ("a", False)
+    assert other.calls == 0
+
+
+def test_hedging_disabled_waits_for_the_first_provider():
+    slow, fast = FakeProvider("a", delay=0.1), FakeProvider("b")
+    router = _router(slow, fast, hedge=False)
+    result = asyncio.run(router.complete([]))
+    assert (result.provider, result.hedged) == ("a", False)
+    assert fast.calls == 0
+
+
+class FakeStreamer(FakeProvider):
+    async def chat_completion(self, messages, stream=False, **params):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError(f"{self.model} is down")
+
+        async def chunks():
+            for word in ("hello", " ", "there"):
+                yield word
+        return chunks()
+
+
+def test_streams_count_as_inflight_until_they_end():
+    down, up = FakeStreamer("a", fail=True), FakeStreamer("b")
+    router = _router(down, up)
+
+    async def consume():
+        stream = await router.chat_completion([], stream=True)
+        first = await stream.__anext__()
+        during = {p.name: p.inflight for p in router._providers}
+        rest = [chunk async for chunk in stream]
+        return first, during, rest
+
+    first, during, rest = asyncio.run(consume())
+    assert first + "".join(rest) == "hello there"
+    assert during == {"a": 0, "b": 1}
+    assert [p.inflight for p in router._providers] == [0, 0]
+    assert _state(router, "a").failures == 1
+
+
+def test_closing_a_stream_early_releases_the_slot():
+    router = _router(FakeStreamer("a"))
+
+    async def consume():
+        stream = await router.chat_completion([], stream=True)
+        await stream.__anext__()
+        await stream.aclose()
+
+    asyncio.run(consume())
+    assert _state(router, "a").inflight == 0
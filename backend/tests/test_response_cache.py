@@ -0,0 +1,82 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services import embeddings
+from app.services.response_cache import SHARED_SCOPE, ResponseCache, normalize
+
+
+def _msgs(prompt, system="sys"):
+    return [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
+
+
+def _lookup(cache, prompt, scope=SHARED_SCOPE, model="m", system="sys"):
+    return asyncio.run(cache.lookup(_msgs(prompt, system), model=model, scope=scope))
+
+
+@pytest.fixture
+def fake_embeddings(monkeypatch):
+    # Prompts about the weather point one way, everything else another
+    def vector(text):
+        return np.array([1.0, 0.0] if "weather" in text else [0.0, 1.0], dtype=np.float32)
+
+    async def embed(texts):
+        return np.stack([vector(t) for t in texts])
+
+    monkeypatch.setattr(embeddings, "available", lambda: True)
+    monkeypatch.setattr(embeddings, "embed", embed)
+
+
+def test_normalize_ignores_case_punctuation_and_spacing():
+    assert normalize("  Hello,   World!! ") == "hello world"
+
+
+def test_exact_hit_after_normalisation():
+    cache = ResponseCache(max_entries=10, ttl_s=60, semantic=False)
+    miss = _lookup(cache, "Hi there!")
+    assert miss.hit is None
+    cache.store(miss, "hello")
+    hit = _lookup(cache, "hi   THERE")
+    assert (hit.hit, hit.response) == ("exact", "hello")
+    assert cache.stats()["hits_exact"] == 1
+
+
+def test_context_model_and_scope_are_part_of_the_key():
+    cache = ResponseCache(max_entries=10, ttl_s=60, semantic=False)
+    cache.store(_lookup(cache, "hi"), "hello")
+    assert _lookup(cache, "hi", system="other").hit is None
+    assert _lookup(cache, "hi", model="other").hit is None
+    assert _lookup(cache, "hi", scope="user:1").hit is None
+
+
+def test_expired_entries_miss():
+    cache = ResponseCache(max_entries=10, ttl_s=60, semantic=False)
+    cache.store(_lookup(cache, "hi"), "hello")
+    cache._entries[next(iter(cache._entries))].expires_at = 0
+    assert _lookup(cache, "hi").hit is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_entries=2, ttl_s=60, semantic=False)
+    for prompt in ("a", "b"):
+        cache.store(_lookup(cache, prompt), prompt.upper())
+    assert _lookup(cache, "a").hit == "exact"  # "b" is now the oldest
+    cache.store(_lookup(cache, "c"), "C")
+    assert _lookup(cache, "b").hit is None
+    assert _lookup(cache, "a").hit == "exact" and _lookup(cache, "c").hit == "exact"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_semantic_hit_within_a_user_scope(fake_embeddings):
+    cache = ResponseCache(max_entries=10, ttl_s=60, similarity=0.9, semantic=True)
+    cache.store(_lookup(cache, "what is the weather", scope="user:1"), "sunny")
+    near = _lookup(cache, "how is the weather today", scope="user:1")
+    assert (near.hit, near.response, near.similarity) == ("semantic", "sunny", 1.0)
+    assert _lookup(cache, "tell me a joke", scope="user:1").hit is None
+
+
+def test_shared_scope_is_exact_only(fake_embeddings):
+    cache = ResponseCache(max_entries=10, ttl_s=60, similarity=0.9, semantic=True)
+    cache.store(_lookup(cache, "what is the weather"), "sunny")
+    assert _lookup(cache, "how is the weather today").hit is None
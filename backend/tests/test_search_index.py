@@ -0,0 +1,48 @@
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session
+
+from app.services.search_index import build_match, ensure_search_schema, search_messages, search_notes
+
+
+def _legacy_engine(tmp_path):
+    # A database from before notes had owners, with rows already in it
+    engine = create_engine(f"sqlite:///{tmp_path}/legacy.db")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE notes (id INTEGER PRIMARY KEY, path VARCHAR, content TEXT NOT NULL, created_at DATETIME)"))
+        conn.execute(text("CREATE TABLE conversations (id INTEGER PRIMARY KEY, user_id INTEGER)"))
+        conn.execute(text("CREATE TABLE messages (id INTEGER PRIMARY KEY, conversation_id INTEGER, role VARCHAR, content TEXT, created_at DATETIME)"))
+        conn.execute(text("INSERT INTO notes (path, content, created_at) VALUES ('garden/tomatoes.md', 'Water the tomatoes every morning', '2024-05-01 09:00:00')"))
+        conn.execute(text("INSERT INTO conversations (id, user_id) VALUES (1, 5)"))
+        conn.execute(text("INSERT INTO messages (conversation_id, role, content, created_at) VALUES (1, 'user', 'how often should tomatoes be watered', '2024-05-01 10:00:00')"))
+    return engine
+
+
+def test_schema_is_applied_to_the_given_engine(tmp_path):
+    engine = _legacy_engine(tmp_path)
+    assert ensure_search_schema(engine) is True
+    assert "user_id" in {c["name"] for c in inspect(engine).get_columns("notes")}
+    # Existing rows were indexed by the rebuild; a second call changes nothing
+    assert ensure_search_schema(engine) is False
+    with Session(engine) as db:
+        (note,) = search_notes(db, build_match("tomato"), user_id=5)
+        (message,) = search_messages(db, build_match("watered"), user_id=5)
+        assert search_messages(db, build_match("watered"), user_id=6) == []
+    assert note.extra["path"] == "garden/tomatoes.md" and "<mark>tomatoes</mark>" in note.snippet
+    assert message.extra == {"conversation_id": 1, "role": "user"}
+
+
+def test_triggers_keep_the_index_in_sync(tmp_path):
+    engine = _legacy_engine(tmp_path)
+    ensure_search_schema(engine)
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE notes SET content = 'Prune the roses' WHERE id = 1"))
+    with Session(engine) as db:
+        assert search_notes(db, build_match("morning")) == []
+        assert [h.id for h in search_notes(db, build_match("roses"))] == [1]
+
+
+def test_build_match_quotes_user_input():
+    assert build_match("") is None
+    assert build_match('tom" OR NOT x') == '"tom" AND "OR" AND "NOT" AND "x"*'
+    assert build_match("red apple", mode="phrase") == '"red apple"'
+    assert build_match("red apple", mode="any") == '"red" OR "apple"*'
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from app.services.single_flight import SingleFlight
+
+
+def test_key_is_stable_and_order_independent():
+    assert SingleFlight.key("groq", {"a": 1, "b": 2}) == SingleFlight.key("groq", {"b": 2, "a": 1})
+    assert SingleFlight.key("groq", {"a": 1}) != SingleFlight.key("openrouter", {"a": 1})
+
+
+def test_concurrent_callers_share_one_call():
+    flights = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "answer"
+
+    async def burst():
+        return await asyncio.gather(*(flights.do("k", fetch) for _ in range(4)))
+
+    assert asyncio.run(burst()) == ["answer"] * 4
+    assert len(calls) == 1
+    stats = flights.stats()
+    assert (stats["upstream_calls"], stats["coalesced"], stats["in_flight"]) == (1, 3, 0)
+
+
+def test_followers_get_the_leaders_exception():
+    flights = SingleFlight()
+
+    async def broken():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def burst():
+        return await asyncio.gather(*(flights.do("k", broken) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(burst())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert flights.stats()["failed_flights"] == 1
+
+
+def test_cancelled_follower_does_not_cancel_the_call():
+    flights = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def run():
+        leader = asyncio.create_task(flights.do("k", fetch))
+        follower = asyncio.create_task(flights.do("k", fetch))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader
+
+    assert asyncio.run(run()) == "answer"
+
+
+def test_call_is_cancelled_once_nobody_waits():
+    flights = SingleFlight()
+    cancelled = []
+
+    async def fetch():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def run():
+        caller = asyncio.create_task(flights.do("k", fetch))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        await asyncio.gather(caller, return_exceptions=True)
+        await asyncio.sleep(0)
+        return flights.stats()["in_flight"]
+
+    assert asyncio.run(run()) == 0
+    assert cancelled == [True]
@@ -0,0 +1,72 @@
+import asyncio
+import json
+import zlib
+
+from starlette.requests import Request
+
+from app.config import settings
+from app.services.stream_framing import FrameEncoder, StreamOptions, coalesce
+
+
+def _request(query="", headers=None):
+    raw = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return Request({"type": "http", "method": "POST", "path": "/", "query_string": query.encode(), "headers": raw})
+
+
+async def _tokens(parts, delay=0.0):
+    for part in parts:
+        await asyncio.sleep(delay)
+        yield part
+
+
+async def _collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_defaults_are_one_sse_frame_per_token():
+    options = StreamOptions.from_request(_request())
+    assert (options.format, options.window_ms, options.max_bytes, options.gzip) == ("sse", 0.0, 0, False)
+    assert options.media_type == "text/event-stream"
+
+
+def test_options_from_query_and_headers():
+    options = StreamOptions.from_request(_request("format=ndjson&coalesce=true&window_ms=5000&max_bytes=64", {"Accept-Encoding": "gzip"}))
+    assert (options.format, options.window_ms, options.max_bytes, options.gzip) == ("ndjson", 1000, 64, False)
+    options = StreamOptions.from_request(_request(headers={"X-Stream-Coalesce": "yes", "X-Stream-Compress": "gzip", "Accept-Encoding": "gzip, br"}))
+    assert options.window_ms == settings.stream_coalesce_window_ms and options.gzip
+    assert options.headers()["Content-Encoding"] == "gzip"
+    # gzip is only used when the client accepts it
+    assert not StreamOptions.from_request(_request("compress=gzip")).gzip
+
+
+def test_sse_and_ndjson_frames():
+    sse = FrameEncoder(StreamOptions())
+    assert sse.event({"token": "hé"}) == 'data: {"token":"hé"}\n\n'.encode()
+    assert sse.end() == b"data: [DONE]\n\n"
+    ndjson = FrameEncoder(StreamOptions(format="ndjson"))
+    assert ndjson.event({"token": "a"}) == b'{"token":"a"}\n'
+    assert ndjson.end() == b""
+
+
+def test_gzip_frames_decode_as_they_arrive():
+    encoder = FrameEncoder(StreamOptions(format="ndjson", gzip=True))
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    # Every frame is flushed, so it can be read before the stream ends
+    assert json.loads(decoder.decompress(encoder.event({"token": "a"}))) == {"token": "a"}
+    assert json.loads(decoder.decompress(encoder.event({"token": "b"}))) == {"token": "b"}
+    decoder.decompress(encoder.end())
+    assert decoder.eof
+
+
+def test_no_coalescing_passes_tokens_through():
+    assert asyncio.run(_collect(coalesce(_tokens(["a", "b"]), window_ms=0, max_bytes=0))) == ["a", "b"]
+
+
+def test_chunks_flush_when_the_byte_budget_fills():
+    chunks = asyncio.run(_collect(coalesce(_tokens(["ab", "cd", "ef", "g"]), window_ms=1000, max_bytes=4)))
+    assert chunks == ["abcd", "efg"]
+
+
+def test_chunks_flush_when_the_window_passes_without_a_token():
+    chunks = asyncio.run(_collect(coalesce(_tokens(["a", "b", "c"], delay=0.03), window_ms=10, max_bytes=1000)))
+    assert chunks == ["a", "b", "c"]
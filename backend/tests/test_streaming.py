@@ -0,0 +1,71 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.services.streaming import StreamStats, delta_text, iter_tokens
+
+
+def _chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+class FakeLLM:
+    def __init__(self, parts) -> None:
+        self.parts = parts
+        self.pulled = 0
+        self.closed = False
+
+    async def chat_completion(self, messages, stream=False, **params):
+        async def gen():
+            try:
+                for part in self.parts:
+                    self.pulled += 1
+                    yield _chunk(part)
+            finally:
+                self.closed = True
+        return gen()
+
+
+async def _collect(llm, stats, **kwargs):
+    return [token async for token in iter_tokens(llm, [], stats, **kwargs)]
+
+
+def test_delta_text_skips_chunks_without_content():
+    assert delta_text(_chunk("hi")) == "hi"
+    assert delta_text(SimpleNamespace(choices=[])) is None
+    assert delta_text(SimpleNamespace(choices=[SimpleNamespace(delta=None)])) is None
+
+
+def test_yields_tokens_and_records_stats():
+    llm = FakeLLM(["Hel", None, "lo", ""])
+    stats = StreamStats()
+    assert asyncio.run(_collect(llm, stats)) == ["Hel", "lo"]
+    assert stats.tokens == 2 and not stats.cancelled
+    assert stats.ttft_ms is not None and stats.finished_at is not None
+    assert llm.closed
+
+
+def test_should_stop_ends_the_stream_and_closes_upstream():
+    llm = FakeLLM(["a", "b", "c", "d"])
+    stats = StreamStats()
+
+    async def stop():
+        return stats.tokens >= 2
+
+    assert asyncio.run(_collect(llm, stats, should_stop=stop)) == ["a", "b"]
+    assert stats.cancelled and llm.closed
+    assert llm.pulled == 2  # nothing is read past the consumer
+
+
+def test_abandoned_consumer_closes_upstream():
+    llm = FakeLLM(["a", "b", "c"])
+    stats = StreamStats()
+
+    async def first_only():
+        tokens = iter_tokens(llm, [], stats)
+        token = await tokens.__anext__()
+        await tokens.aclose()
+        return token
+
+    assert asyncio.run(first_only()) == "a"
+    assert llm.closed and llm.pulled == 1
+    assert stats.as_dict()["tokens"] == 1
@@ -0,0 +1,61 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app.models.note import Note, Topic
+from app.services.topic_repository import TopicRepository
+
+
+@contextmanager
+def _statements(engine):
+    seen = []
+
+    def record(conn, cursor, statement, *args):
+        seen.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield seen
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def test_resolve_creates_missing_topics_in_bulk(db, engine):
+    repo = TopicRepository(max_entries=100)
+    db.add(Topic(name="tr-known"))
+    db.flush()
+    names = ["tr-known", " tr-new-1 ", "tr-new-2", "tr-new-1", ""]
+    with _statements(engine) as seen:
+        ids = repo.resolve(db, names)
+    assert set(ids) == {"tr-known", "tr-new-1", "tr-new-2"}
+    # Select the known names, insert the rest, select those back
+    assert len(seen) == 3
+    assert {t.name for t in db.query(Topic).filter(Topic.id.in_(ids.values()))} == set(ids)
+
+
+def test_cached_topics_cost_no_query(db, engine):
+    repo = TopicRepository(max_entries=100)
+    first = repo.resolve(db, ["tr-cached-a", "tr-cached-b"])
+    with _statements(engine) as seen:
+        assert repo.resolve(db, ["tr-cached-b", "tr-cached-a"]) == {"tr-cached-b": first["tr-cached-b"], "tr-cached-a": first["tr-cached-a"]}
+    assert seen == []
+
+
+def test_cache_is_bounded_lru(db):
+    repo = TopicRepository(max_entries=2)
+    repo.resolve(db, ["tr-lru-a", "tr-lru-b"])
+    repo.resolve(db, ["tr-lru-a"])
+    repo.resolve(db, ["tr-lru-c"])
+    assert list(repo._ids) == ["tr-lru-a", "tr-lru-c"]
+    repo.forget(["tr-lru-a"])
+    assert repo.stats()["cached_topics"] == 1
+
+
+def test_add_notes_links_each_topic_once(db):
+    repo = TopicRepository(max_entries=100)
+    notes = repo.add_notes(db, [
+        ("a.md", "Tomato seedlings need warmth and light", ["tr-garden", "tr-garden", "tr-spring"]),
+        ("b.md", "Quarterly budget figures for the sales team", ["tr-work"]),
+    ], user_id=401, policy="off")
+    db.expire_all()
+    linked = {n.path: sorted(t.name for t in db.get(Note, n.id).topics) for n in notes}
+    assert linked == {"a.md": ["tr-garden", "tr-spring"], "b.md": ["tr-work"]}
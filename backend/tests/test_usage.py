@@ -0,0 +1,60 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.models.user import User
+from app.routers import usage as usage_router
+from app.services.chat_persistence import ChatStore
+from app.services.context_builder import TurnMessage
+from app.services.usage import TurnUsage, conversation_usage, daily_usage, record_usage
+from app.utils.auth import get_current_user
+
+
+def test_turns_add_up_per_user_day_and_model(db):
+    record_usage(db, [(301, TurnUsage("m1", 10, 5)), (301, TurnUsage("m1", 20, 7)), (301, TurnUsage("m2", 1, 1))])
+    record_usage(db, [(301, TurnUsage("m1", 99, 99, cached=True))])
+    record_usage(db, [(301, TurnUsage("m1", 3, 3))], day=datetime.utcnow().date() - timedelta(days=40))
+    db.commit()
+    rows = daily_usage(db, user_id=301)
+    assert [(r["model"], r["requests"], r["cached_requests"], r["tokens_in"], r["tokens_out"]) for r in rows] == [
+        ("m1", 3, 1, 30, 12),
+        ("m2", 1, 0, 1, 1),
+    ]
+    assert [r["model"] for r in daily_usage(db, user_id=301, model="m2")] == ["m2"]
+    assert len(daily_usage(db, user_id=301, days=60)) == 3
+
+
+def test_saved_turns_carry_token_counts(db):
+    store = ChatStore(write_behind=False)
+    turn = [TurnMessage("user", "hi", 2), TurnMessage("assistant", "hello there", 3)]
+    cid = asyncio.run(store.save_turn(db, None, turn, user_id=302, usage=TurnUsage("m1", 12, 3)))
+    assert conversation_usage(db, cid) == {"conversation_id": cid, "replies": 1, "tokens_in": 12, "tokens_out": 3}
+    assert daily_usage(db, user_id=302)[0]["tokens_in"] == 12
+
+
+def _client(user):
+    app = FastAPI()
+    app.include_router(usage_router.router)
+    app.dependency_overrides[get_current_user] = lambda: user
+    return TestClient(app)
+
+
+def test_only_admins_read_other_users_usage(db, monkeypatch):
+    record_usage(db, [(303, TurnUsage("m1", 4, 2)), (304, TurnUsage("m1", 8, 1))])
+    db.commit()
+    monkeypatch.setattr(settings, "admin_emails", "boss@example.com")
+    user = _client(User(id=303, email="u@example.com"))
+    assert user.get("/api/usage").json()["totals"]["tokens_in"] == 4
+    assert user.get("/api/usage/daily", params={"user_id": 304}).status_code == 403
+    admin = _client(User(id=1, email="Boss@example.com"))
+    assert admin.get("/api/usage/daily", params={"user_id": 304}).json()["totals"]["tokens_in"] == 8
+
+
+def test_conversation_usage_is_private(db):
+    store = ChatStore(write_behind=False)
+    cid = asyncio.run(store.save_turn(db, None, [TurnMessage("user", "hi", 1)], user_id=305))
+    assert _client(User(id=305, email="a@example.com")).get(f"/api/usage/conversations/{cid}").status_code == 200
+    assert _client(User(id=306, email="b@example.com")).get(f"/api/usage/conversations/{cid}").status_code == 404
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.services.vector_index import VectorStore
+
+DIM = 8
+
+
+def _unit(rows, seed=0):
+    vecs = np.random.default_rng(seed).normal(size=(rows, DIM)).astype(np.float32)
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def _store(tmp_path, dtype="float32"):
+    return VectorStore(tmp_path, "notes", DIM, dtype)
+
+
+def test_search_ranks_by_cosine_similarity(tmp_path):
+    store = _store(tmp_path)
+    vecs = _unit(20)
+    store.append(list(range(1, 21)), list(range(101, 121)), vecs)
+    hits = store.search(vecs[4], k=3)
+    assert hits[0] == (5, 1.0)
+    assert len(hits) == 3 and hits[0][1] >= hits[1][1] >= hits[2][1]
+    assert [k for k, _ in store.search(vecs[4], k=3, allowed=[7, 8])] in ([7, 8], [8, 7])
+    assert 5 not in [k for k, _ in store.search(vecs[4], k=3, exclude=[5])]
+
+
+def test_reembedding_replaces_the_old_row(tmp_path):
+    store = _store(tmp_path)
+    old, new = _unit(2)
+    store.append([1], [11], [old])
+    store.append([1], [12], [new])
+    assert (store.rows, store.live) == (2, 1)
+    assert store.hashes([1]) == {1: 12}
+    assert store.by_hash([11]) == {}
+    np.testing.assert_allclose(store.get([1])[1], new)
+
+
+def test_store_survives_reopen_and_a_torn_append(tmp_path):
+    store = _store(tmp_path)
+    store.append([1, 2, 3], [11, 12, 13], _unit(3))
+    store.delete([2])
+    store.set_high_water(3)
+    with open(tmp_path / "notes.vec", "ab") as f:
+        f.write(b"\0" * 5)  # a crash mid-append
+    reopened = _store(tmp_path)
+    assert (reopened.rows, sorted(reopened.keys()), reopened.high_water) == (3, [1, 3], 3)
+    reopened.append([4], [14], _unit(1, seed=1))
+    assert reopened.get([4])
+
+
+def test_changed_dimension_starts_over(tmp_path):
+    _store(tmp_path).append([1], [11], _unit(1))
+    assert VectorStore(tmp_path, "notes", DIM * 2).rows == 0
+
+
+def test_int8_rows_are_close_to_the_originals(tmp_path):
+    store = _store(tmp_path, "int8")
+    vecs = _unit(10)
+    store.append(list(range(10)), list(range(10)), vecs)
+    np.testing.assert_allclose(store.dense(slice(0, 10)), vecs, atol=0.01)
+    assert store.stats()["bytes"] == 10 * DIM
+
+
+def test_compact_drops_dead_rows(tmp_path):
+    store = _store(tmp_path)
+    vecs = _unit(5)
+    store.append([1, 2, 3, 4, 5], [11, 12, 13, 14, 15], vecs)
+    store.delete([1])
+    assert not store.compact()  # below the dead fraction
+    store.delete([2])
+    assert store.compact()
+    assert (store.rows, store.live, sorted(store.keys())) == (3, 3, [3, 4, 5])
+    assert store.search(vecs[3], k=1) == [(4, 1.0)]
+
+
+def test_coarse_index_still_finds_exact_matches(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "vector_coarse_min_rows", 50)
+    monkeypatch.setattr(settings, "vector_coarse_nprobe", 3)
+    store = _store(tmp_path)
+    vecs = _unit(400)
+    store.append(list(range(400)), list(range(400)), vecs)
+    assert store.search(vecs[123], k=1) == [(123, 1.0)]
+    assert store.stats()["coarse_lists"] == 20
+
+
+def test_unknown_dtype_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        VectorStore(tmp_path, "notes", DIM, "float16")
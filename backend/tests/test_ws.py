@@ -0,0 +1,86 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.models.message import Message
+from app.routers import ws
+
+
+class FakeLLM:
+    model = "fake-model"
+
+    async def chat_completion(self, messages, stream=False, **params):
+        async def chunks():
+            for token in ("Hi", " there"):
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+        return chunks()
+
+
+@pytest.fixture
+def client(engine):
+    app = FastAPI()
+    app.include_router(ws.router)
+    app.state.llm_router = FakeLLM()
+    app.state.phi2 = None
+    return TestClient(app)
+
+
+def _frames_until(socket, kind):
+    frames = []
+    while True:
+        frame = socket.receive_json()
+        frames.append(frame)
+        if frame["type"] in (kind, "error"):
+            return frames
+
+
+def test_turn_streams_tokens_and_persists(client, db):
+    with client.websocket_connect("/ws/chat?token=demo") as socket:
+        assert socket.receive_json()["type"] == "ready"
+        socket.send_json({"type": "chat", "id": "t1", "message": "hello"})
+        frames = _frames_until(socket, "done")
+    assert "".join(f["token"] for f in frames if f["type"] == "token") == "Hi there"
+    done = frames[-1]
+    assert (done["type"], done["id"]) == ("done", "t1")
+    rows = db.query(Message.role, Message.content).filter(Message.conversation_id == int(done["conversation_id"])).order_by(Message.id).all()
+    assert rows == [("user", "hello"), ("assistant", "Hi there")]
+
+
+def test_forbidden_conversation_gets_an_error_frame(client, monkeypatch):
+    class Store:
+        def open_conversation(self, db, conversation_id, user_id=None):
+            raise PermissionError("not yours")
+
+    monkeypatch.setattr(ws, "get_chat_store", lambda: Store())
+    with client.websocket_connect("/ws/chat?token=demo") as socket:
+        socket.receive_json()
+        socket.send_json({"type": "chat", "id": "t2", "message": "hello"})
+        assert socket.receive_json() == {"type": "error", "id": "t2", "detail": "forbidden: conversation belongs to another user"}
+        socket.send_json({"type": "ping"})
+        assert socket.receive_json() == {"type": "pong"}
+
+
+def test_failing_context_gets_an_error_frame(client, monkeypatch):
+    class Builder:
+        def authorize(self, db, conversation_id, user_id):
+            return None
+
+        def build(self, *args):
+            raise RuntimeError("boom")
+
+    monkeypatch.setattr(ws, "get_context_builder", lambda: Builder())
+    with client.websocket_connect("/ws/chat?token=demo") as socket:
+        socket.receive_json()
+        socket.send_json({"type": "chat", "id": "t3", "message": "hello"})
+        assert socket.receive_json() == {"type": "error", "id": "t3", "detail": "could not start turn"}
+
+
+def test_refused_turns(client):
+    with client.websocket_connect("/ws/chat?token=demo") as socket:
+        socket.receive_json()
+        socket.send_json({"type": "chat", "id": "t4", "message": "  "})
+        assert socket.receive_json() == {"type": "error", "id": "t4", "detail": "message is required"}
+        socket.send_json({"type": "bogus"})
+        assert socket.receive_json()["detail"] == "unknown message type 'bogus'"
@@ -7,10 +7,12 @@ from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from typing import Optional
 import time
-import re
 from collections import deque
 import numpy as np
 from functools import wraps
+
+from backend.app.utils.text_matcher import TextMatcher
+
 try:
     import redis
     REDIS_AVAILABLE = True
@@ -28,6 +30,7 @@ except ImportError:
 # Configuration
 MAX_HISTORY = 5
 CACHE_TTL = 3600  # 1 hour
+OUTPUT_FILTER = TextMatcher({"filtered": ["sex", "hate", "violence"]})
 
 app = FastAPI()
 if REDIS_AVAILABLE:
@@ -94,8 +97,7 @@ class BuddyAPI:
         return response
 
     def _post_process(self, text):
-        text = re.sub(r"(?i)\b(sex|hate|violence)\b", "[filtered]", text)
-        return text
+        return OUTPUT_FILTER.redact(text, "[filtered]")
 
 # Initialize at startup
 buddy = BuddyAPI()
@@ -4,6 +4,7 @@ SENTIMENT_MODEL = "distilbert-base-uncased-finetuned-sst-2-english"
 SIMILARITY_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 EMOTION_MODEL = "cardiffnlp/twitter-roberta-base-emotion"
 MAX_HISTORY = 5
-SAFETY_FILTER = r"(?i)\b(sex|violence|hate|suicide|racism)\b"
+# Terms moderated by utils.safety_filter (matched as whole words, case-insensitive)
+SAFETY_FILTER = ("sex", "violence", "hate", "suicide", "racism")
 
 # Device selection moved to core.py
@@ -14,6 +14,8 @@ from functools import wraps
 
 import numpy as np
 
+from backend.app.utils.text_matcher import TextMatcher
+
 # IMPORTANT: If you encounter a DLL loading error (OSError: [WinError 1114]), it's likely due to a corrupted PyTorch installation or a conflict.
 # To fix this, please run the following commands in your terminal to reinstall torch and related libraries:
 # pip uninstall torch torchvision torchaudio -y
@@ -78,6 +80,7 @@ SIMILARITY_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 MAX_HISTORY = 5
 CACHE_TTL = 3600
 RESPONSE_TIME_TARGET = 3
+OUTPUT_FILTER = TextMatcher({"filtered": ["sex", "hate", "violence"]})
 
 # ========== FastAPI & Redis ==========
 if API_AVAILABLE:
@@ -205,7 +208,7 @@ Buddy:"""
             except Exception as e:
                 print(f"Similarity check error: {e}")
         
-        reply = re.sub(r"\b(sex|hate|violence)\b", "[filtered]", reply, flags=re.IGNORECASE)
+        reply = OUTPUT_FILTER.redact(reply, "[filtered]")
         self.response_history.append(reply)
         return reply
 
@@ -1,12 +1,13 @@
 import re
 
+from backend.app.utils.text_matcher import TextMatcher
+from config import SAFETY_FILTER
+
+SAFETY_MATCHER = TextMatcher({"unsafe": SAFETY_FILTER})
+
 def safety_filter(text: str) -> str:
     """Filter inappropriate content"""
-    return re.sub(
-        r"(?i)\b(sex|violence|hate|suicide|racism)\b",
-        "[content moderated]", 
-        text
-    )
+    return SAFETY_MATCHER.redact(text, "[content moderated]")
 
 def truncate_response(text: str, max_sentences: int = 3) -> str:
     """Clean and shorten responses"""